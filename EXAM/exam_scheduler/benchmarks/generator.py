@@ -0,0 +1,149 @@
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+from database.connection import close_pool
+from database.init_db import create_connection
+from database.migrations import migrate
+
+# Named institution sizes used by the benchmark suite
+SCALES = {
+    'small': dict(departments=3, semesters=4, subjects_per_semester=3,
+                  invigilators=40, rooms=24, floors=3, days=15),
+    'medium': dict(departments=6, semesters=8, subjects_per_semester=4,
+                   invigilators=150, rooms=60, floors=5, days=30),
+    'large': dict(departments=12, semesters=8, subjects_per_semester=6,
+                  invigilators=450, rooms=160, floors=8, days=45),
+}
+# Seats per room and how common each room size is
+ROOM_SIZES = ((30, 6), (40, 3), (60, 2), (120, 1))
+
+
+def _remove_database(db_file):
+    close_pool(db_file)
+    for path in (db_file, db_file + "-wal", db_file + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def generate_institution(db_file, departments=3, semesters=4, subjects_per_semester=3,
+                         cohort_size=(30, 120), invigilators=40, rooms=24, floors=3,
+                         start_date="2025-05-05", days=15, electives=0, seed=0):
+    """Populate a scratch database with a synthetic institution.
+
+    Any existing file at db_file is deleted first. Every (department,
+    semester) cohort gets a random number of students, all enrolled in each
+    of the cohort's subjects, plus ``electives`` subjects of their semester
+    taken from other departments. The same seed always produces the same data.
+    Returns a dict with the ``subjects`` (in the format schedule_term()
+    expects), the exam window ``start_date``/``end_date`` and row ``counts``.
+    """
+    rng = random.Random(seed)
+    _remove_database(db_file)
+    conn = create_connection(db_file)
+    try:
+        migrate(conn)
+
+        department_rows = [(f"D{d:02d}", f"Department {d:02d}") for d in range(1, departments + 1)]
+        invigilator_rows = [(f"VS{i:05d}", f"Invigilator {i:05d}", "bench", "invigilator")
+                            for i in range(1, invigilators + 1)]
+        sizes = [size for size, weight in ROOM_SIZES for _ in range(weight)]
+        room_rows = [(f"R{floor}{number:03d}", floor, rng.choice(sizes))
+                     for index in range(rooms)
+                     for floor, number in [(index % floors + 1, index // floors + 1)]]
+
+        student_rows = []
+        enrollment_rows = []
+        subjects = []
+        for dept_code, _ in department_rows:
+            for semester in range(1, semesters + 1):
+                cohort = rng.randint(*cohort_size)
+                cohort_rows = [
+                    (f"RA{dept_code}{semester}{n:05d}", f"Student {dept_code}-{semester}-{n}", dept_code, semester)
+                    for n in range(cohort)
+                ]
+                student_rows.extend(cohort_rows)
+                for number in range(1, subjects_per_semester + 1):
+                    code = f"{dept_code}S{semester}{number:02d}"
+                    subjects.append({
+                        'code': code,
+                        'title': f"{dept_code} Semester {semester} Paper {number}",
+                        'semester': semester,
+                        'department': dept_code,
+                        'num_students': cohort,
+                    })
+                    enrollment_rows.extend((row[0], code) for row in cohort_rows)
+
+        if electives:
+            by_semester = {}
+            for subject in subjects:
+                by_semester.setdefault(subject['semester'], []).append(subject)
+            by_code = {subject['code']: subject for subject in subjects}
+            for ra_number, _, dept_code, semester in student_rows:
+                others = [s for s in by_semester[semester] if s['department'] != dept_code]
+                for subject in rng.sample(others, min(electives, len(others))):
+                    enrollment_rows.append((ra_number, subject['code']))
+                    by_code[subject['code']]['num_students'] += 1
+
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("INSERT INTO departments (code, name) VALUES (?, ?)", department_rows)
+        conn.executemany("INSERT INTO users (id, name, passcode, role) VALUES (?, ?, ?, ?)", invigilator_rows)
+        conn.executemany("INSERT INTO rooms (code, floor, capacity) VALUES (?, ?, ?)", room_rows)
+        conn.executemany(
+            "INSERT INTO students (ra_number, name, department_code, semester) VALUES (?, ?, ?, ?)",
+            student_rows
+        )
+        conn.executemany(
+            "INSERT INTO subjects (code, title, semester, department_code, num_students) VALUES (?, ?, ?, ?, ?)",
+            [(s['code'], s['title'], s['semester'], s['department'], s['num_students']) for s in subjects]
+        )
+        conn.executemany("INSERT INTO enrollments (ra_number, subject_code) VALUES (?, ?)", enrollment_rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+    # The window holds `days` weekdays, matching ExamScheduler._generate_dates
+    current = datetime.strptime(start_date, "%Y-%m-%d")
+    weekdays = 0
+    while True:
+        if current.weekday() < 5:
+            weekdays += 1
+            if weekdays == days:
+                break
+        current += timedelta(days=1)
+
+    return {
+        'subjects': subjects,
+        'start_date': start_date,
+        'end_date': current.strftime("%Y-%m-%d"),
+        'counts': {
+            'departments': len(department_rows),
+            'invigilators': len(invigilator_rows),
+            'rooms': len(room_rows),
+            'students': len(student_rows),
+            'subjects': len(subjects),
+            'enrollments': len(enrollment_rows),
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Create a synthetic exam database. "
+                    "Run from the exam_scheduler directory: python -m benchmarks.generator"
+    )
+    parser.add_argument("db_file")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--electives", type=int, default=0,
+                        help="extra subjects per student from other departments")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    workload = generate_institution(args.db_file, electives=args.electives, seed=args.seed, **SCALES[args.scale])
+    counts = ", ".join(f"{count} {name}" for name, count in workload['counts'].items())
+    print(f"Created {args.db_file}: {counts}; exams {workload['start_date']} to {workload['end_date']}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
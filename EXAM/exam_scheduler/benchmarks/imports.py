@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules that worker processes, the job runner and the command line load.
+# They must stay importable without the UI and export stacks.
+CORE_MODULES = (
+    "csp.scheduler",
+    "csp.repair",
+    "csp.jobs",
+    "csp.cli",
+    "csp.enrollment",
+    "csp.export",
+    "database.init_db",
+    "database.timetables",
+)
+# Loaded only by the Streamlit pages, the portfolio/constraint solvers and the
+# export functions that need them
+HEAVY_MODULES = ("streamlit", "pandas", "pyarrow", "openpyxl", "constraint")
+# Cold import budget per module; NumPy alone takes most of it
+DEFAULT_BUDGET_MS = 400
+REPEATS = 3
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{'ms': elapsed * 1000, 'modules': sorted(name for name in sys.modules if '.' not in name)}}))
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module, repeats=REPEATS):
+    """Import the module in fresh interpreters; return (best ms, heavy modules it pulled in)"""
+    best = None
+    heavy = set()
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", PROBE.format(module=module)], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        probe = json.loads(output.strip().splitlines()[-1])
+        best = probe['ms'] if best is None else min(best, probe['ms'])
+        heavy.update(name for name in probe['modules'] if name in HEAVY_MODULES)
+    return best, sorted(heavy)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check that the scheduling core imports quickly and without the UI stack. "
+                    "Run from the exam_scheduler directory: python -m benchmarks.imports"
+    )
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    args = parser.parse_args(argv)
+
+    failures = []
+    for module in CORE_MODULES:
+        try:
+            ms, heavy = measure(module, args.repeats)
+        except subprocess.CalledProcessError as e:
+            failures.append(f"{module} failed to import: {e.stderr.strip().splitlines()[-1]}")
+            continue
+        print(f"  {module:<20} {ms:>7.1f} ms  {', '.join(heavy) or '-'}")
+        if heavy:
+            failures.append(f"{module} imports {', '.join(heavy)}")
+        if ms > args.budget_ms:
+            failures.append(f"{module} took {ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from csp.constraints import ExamConstraints
+from csp.enrollment import read_coenrollment
+from csp.scheduler import ExamScheduler
+from database.connection import close_pool, set_statement_tracer
+from database.init_db import create_connection
+from benchmarks.generator import SCALES, generate_institution
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_SCALES = ("small", "medium")
+# Exams placed one by one through schedule_exam, as the admin form does
+SINGLE_EXAMS = 25
+# Subjects in the python-constraint model; the full search grows too fast beyond this
+CONSTRAINT_SUBJECTS = 12
+REPEATS = 3
+
+
+# Each benchmark gets the scratch database and its workload, does any setup
+# untimed, and returns the zero-argument callable that is measured.
+
+def _bench_schedule_exam(db_file, workload):
+    subjects = workload['subjects'][:SINGLE_EXAMS]
+
+    def run():
+        scheduler = ExamScheduler(db_file)
+        for s in subjects:
+            scheduler.schedule_exam(s['code'], s['title'], s['semester'], s['department'],
+                                    s['num_students'], workload['start_date'], workload['end_date'])
+    return run
+
+
+def _bench_schedule_term(db_file, workload):
+    def run():
+        ExamScheduler(db_file).schedule_term(workload['subjects'], workload['start_date'], workload['end_date'])
+    return run
+
+
+def _bench_exam_constraints(db_file, workload):
+    scheduler = ExamScheduler(db_file)
+    subjects = workload['subjects'][:CONSTRAINT_SUBJECTS]
+    dates = scheduler._generate_dates(workload['start_date'], workload['end_date'])
+
+    def run():
+        constraints = ExamConstraints()
+        constraints.add_domain_variables(subjects, dates, scheduler.sessions,
+                                         scheduler.all_invigilators, scheduler.all_rooms)
+        constraints.add_basic_constraints(subjects)
+        constraints.get_problem().getSolution()
+    return run
+
+
+def _bench_coenrollment(db_file, workload):
+    return lambda: read_coenrollment(db_file)
+
+
+def _bench_save_schedules(db_file, workload):
+    conn = create_connection(db_file)
+    try:
+        conn.execute("DELETE FROM exam_schedule")
+        conn.commit()
+    finally:
+        conn.close()
+    scheduler = ExamScheduler(db_file)
+    result = scheduler.schedule_term(workload['subjects'], workload['start_date'], workload['end_date'])
+    schedules = list(result['schedules'].values())
+
+    def run():
+        if not scheduler.save_schedules(schedules):
+            raise RuntimeError(f"save_schedules failed: {scheduler.last_conflicts[:3]}")
+    return run
+
+
+def _bench_get_full_schedule(db_file, workload):
+    return ExamScheduler(db_file).get_full_schedule
+
+
+def _bench_schedule_pages(db_file, workload):
+    scheduler = ExamScheduler(db_file)
+
+    def run():
+        rows, cursor = scheduler.get_schedule_page()
+        while cursor:
+            rows, cursor = scheduler.get_schedule_page(after=cursor)
+    return run
+
+
+# Run in this order: save_schedules leaves the saved term behind for the reads
+BENCHMARKS = [
+    ("schedule_exam", _bench_schedule_exam),
+    ("schedule_term", _bench_schedule_term),
+    ("exam_constraints", _bench_exam_constraints),
+    ("coenrollment", _bench_coenrollment),
+    ("save_schedules", _bench_save_schedules),
+    ("get_full_schedule", _bench_get_full_schedule),
+    ("schedule_pages", _bench_schedule_pages),
+]
+
+
+def measure(prepare, db_file, workload, repeats=REPEATS):
+    """Return seconds (best of repeats), statement count and peak traced KB"""
+    statements = []
+    best = None
+    for attempt in range(repeats):
+        run = prepare(db_file, workload)
+        set_statement_tracer(statements.append if attempt == 0 else None)
+        try:
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+        finally:
+            set_statement_tracer(None)
+        best = elapsed if best is None else min(best, elapsed)
+
+    # Memory on its own run: tracemalloc slows everything down
+    run = prepare(db_file, workload)
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'seconds': round(best, 4),
+        'queries': len(statements),
+        'peak_kb': round(peak / 1024),
+    }
+
+
+def run_suite(scales=DEFAULT_SCALES, repeats=REPEATS, seed=0):
+    """Benchmark every operation at each scale; returns {scale: {operation: metrics}}"""
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        for scale in scales:
+            db_file = os.path.join(scratch, f"{scale}.db")
+            workload = generate_institution(db_file, seed=seed, **SCALES[scale])
+            results[scale] = {}
+            for name, prepare in BENCHMARKS:
+                results[scale][name] = measure(prepare, db_file, workload, repeats)
+            close_pool(db_file)
+    return results
+
+
+def compare(results, baseline, time_tolerance=1.0, memory_tolerance=0.5):
+    """List regressions of results against baseline.
+
+    A run regresses when it is more than time_tolerance (as a fraction) slower,
+    uses more than memory_tolerance more peak memory, or issues more
+    statements than the baseline. Scales or operations missing from the
+    baseline are not compared.
+    """
+    regressions = []
+    for scale, operations in results.items():
+        for name, metrics in operations.items():
+            expected = baseline.get(scale, {}).get(name)
+            if not expected:
+                continue
+            # Ignore sub-millisecond noise on very fast operations
+            if metrics['seconds'] > max(expected['seconds'] * (1 + time_tolerance), 0.005):
+                regressions.append(f"{scale}/{name}: {metrics['seconds']}s vs baseline {expected['seconds']}s")
+            if metrics['queries'] > expected['queries']:
+                regressions.append(f"{scale}/{name}: {metrics['queries']} queries vs baseline {expected['queries']}")
+            if metrics['peak_kb'] > max(expected['peak_kb'] * (1 + memory_tolerance), 64):
+                regressions.append(f"{scale}/{name}: {metrics['peak_kb']} KB peak vs baseline {expected['peak_kb']} KB")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the scheduler on synthetic institutions and compare with the baseline. "
+                    "Run from the exam_scheduler directory: python -m benchmarks.suite"
+    )
+    parser.add_argument("--scales", nargs="+", choices=sorted(SCALES), default=list(DEFAULT_SCALES))
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--time-tolerance", type=float, default=1.0,
+                        help="allowed slowdown as a fraction of the baseline (default 1.0 = 2x)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.5)
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="store these results as the new baseline instead of comparing")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.scales, args.repeats)
+    for scale, operations in results.items():
+        print(f"[{scale}]")
+        for name, metrics in operations.items():
+            print(f"  {name:<18} {metrics['seconds']:>9.4f}s {metrics['queries']:>7} queries "
+                  f"{metrics['peak_kb']:>8} KB peak")
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline first")
+        return 1
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.time_tolerance, args.memory_tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,283 @@
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+from database.init_db import create_connection
+from database.instrumentation import recording
+from database.migrations import MigrationError, is_up_to_date, migrate
+from csp.scheduler import EXAM_ORDERS, SLOT_ORDERS, ExamScheduler
+
+# Same columns as the Schedule Whole Term upload; department_code (the bulk
+# import name) is accepted too
+SUBJECT_COLUMNS = ('code', 'title', 'semester', 'department', 'num_students')
+
+# Exit codes
+OK = 0
+FAILED = 1
+PARTIAL = 2
+
+
+def read_subject_file(source):
+    """Parse a subject list CSV into schedule_term() dicts; raises ValueError on a bad row"""
+    subjects = []
+    for line, row in enumerate(csv.DictReader(source), start=2):
+        if 'department' not in row and 'department_code' in row:
+            row['department'] = row['department_code']
+        missing = [column for column in SUBJECT_COLUMNS if not (row.get(column) or "").strip()]
+        if missing:
+            raise ValueError(f"line {line}: missing {', '.join(missing)}")
+        try:
+            subjects.append({
+                'code': row['code'].strip(),
+                'title': row['title'].strip(),
+                'semester': int(row['semester']),
+                'department': row['department'].strip(),
+                'num_students': int(row['num_students']),
+            })
+        except ValueError:
+            raise ValueError(f"line {line}: semester and num_students must be whole numbers")
+    return subjects
+
+
+def unscheduled_subjects(conn):
+    """Subjects with no exam yet; the size falls back to the enrolment count"""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT s.code, s.title, s.semester, s.department_code,
+               COALESCE(s.num_students,
+                        (SELECT COUNT(*) FROM enrollments e WHERE e.subject_code = s.code))
+        FROM subjects s
+        WHERE NOT EXISTS (SELECT 1 FROM exam_schedule es WHERE es.subject_code = s.code)
+        ORDER BY s.code
+    """)
+    return [{'code': code, 'title': title, 'semester': semester, 'department': department,
+             'num_students': num_students}
+            for code, title, semester, department, num_students in cur.fetchall()]
+
+
+def scheduled_codes(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT DISTINCT subject_code FROM exam_schedule")
+    return {row[0] for row in cur.fetchall()}
+
+
+def prepare_database(conn, dry_run=False):
+    """Upgrade the schema, or on a dry run only check it; returns an error message or None"""
+    # A database the web app never opened may still be on an old schema
+    if dry_run:
+        if not is_up_to_date(conn):
+            return "database schema is out of date; run without --dry-run to upgrade it"
+        return None
+    try:
+        migrate(conn)
+    except MigrationError as e:
+        return f"database upgrade failed: {e}"
+    return None
+
+
+def run_batch(db_file, subjects, start_date, end_date, dry_run=False, order="dsatur", slot_order="earliest",
+              optimize=False, portfolio=False, time_budget=10.0, seed=None,
+              max_duties_per_day=1, max_duties_per_term=None):
+    """Schedule a batch of subjects and, unless dry_run, save them in one transaction.
+
+    The database is brought up to the latest schema first; a dry run
+    never writes, so it fails on an outdated schema instead. Subjects that
+    already have an exam or no students are skipped. Returns a
+    JSON-friendly report with the placements, what was left out and why,
+    placement statistics and phase/query timings.
+    """
+    report = {
+        'ok': False,
+        'dry_run': dry_run,
+        'saved': False,
+        'requested': len(subjects),
+        'skipped': [],
+        'unscheduled': [],
+        'conflicts': [],
+        'schedule': [],
+    }
+    with recording() as recorder:
+        conn = create_connection(db_file)
+        if not conn:
+            report['error'] = f"cannot open {db_file}"
+            return report
+        try:
+            error = prepare_database(conn, dry_run)
+            if error:
+                report['error'] = error
+                return report
+            done = scheduled_codes(conn)
+        except sqlite3.Error as e:
+            report['error'] = f"cannot read exam_schedule: {e}"
+            return report
+        finally:
+            conn.close()
+
+        batch = []
+        for subject in subjects:
+            if subject['code'] in done:
+                report['skipped'].append({'code': subject['code'], 'reason': "already scheduled"})
+            elif not subject['num_students']:
+                report['skipped'].append({'code': subject['code'], 'reason': "no students"})
+            else:
+                batch.append(subject)
+
+        scheduler = ExamScheduler(db_file, seed=seed, max_duties_per_day=max_duties_per_day,
+                                  max_duties_per_term=max_duties_per_term)
+        if portfolio:
+            # Imported here so plain runs never load python-constraint
+            from csp.portfolio import solve_portfolio
+            result = solve_portfolio(scheduler, batch, start_date, end_date, time_budget=time_budget)
+            report['strategy'] = result.get('strategy')
+        else:
+            result = scheduler.schedule_term(batch, start_date, end_date, order=order, slot_order=slot_order)
+            if optimize:
+                result = scheduler.optimize_term(batch, result, start_date, end_date,
+                                                 time_budget=time_budget, seed=seed)
+        report['unscheduled'] = list(result['unscheduled'])
+        report['schedule'] = [exam for schedule in result['schedules'].values() for exam in schedule]
+
+        if dry_run:
+            report['ok'] = True
+        elif scheduler.save_schedules(result['schedules'].values()):
+            report['ok'] = True
+            report['saved'] = bool(result['schedules'])
+        else:
+            report['conflicts'] = scheduler.last_conflicts
+            report['error'] = "save failed; nothing was written"
+
+    exams = report['schedule']
+    report['stats'] = {
+        'scheduled': len(result['schedules']),
+        'unscheduled': len(report['unscheduled']),
+        'skipped': len(report['skipped']),
+        'rooms_used': len(exams),
+        'invigilators_used': len({exam['invigilator_code'] for exam in exams}),
+        'days_used': len({exam['date'] for exam in exams}),
+        'students_seated': sum(exam['student_count'] for exam in exams),
+    }
+    report['timings'] = {key: value for key, value in recorder.as_dict().items() if key != 'profile'}
+    return report
+
+
+def _print_report(report, out):
+    stats = report.get('stats', {})
+    for exam in sorted(report['schedule'], key=lambda exam: (exam['date'], exam['session'], exam['subject_code'])):
+        print(f"{exam['date']} {exam['session']} {exam['subject_code']:<12} {exam['room_code']:<8} "
+              f"{exam['invigilator_code']:<8} {exam['student_count']:>5}", file=out)
+    for skipped in report['skipped']:
+        print(f"Skipped {skipped['code']}: {skipped['reason']}", file=out)
+    if report['unscheduled']:
+        print(f"Could not schedule: {', '.join(report['unscheduled'])}", file=out)
+    for conflict in report['conflicts'][:20]:
+        print(f"Conflict: {conflict}", file=out)
+    if stats:
+        print(f"{stats['scheduled']} of {report['requested']} subjects scheduled in "
+              f"{stats['rooms_used']} rooms over {stats['days_used']} days, "
+              f"{stats['invigilators_used']} invigilators, {stats['students_seated']} students", file=out)
+    timings = report.get('timings')
+    if timings:
+        print(f"Took {timings['seconds']:.3f}s, {timings['query_count']} queries "
+              f"({timings['query_seconds']:.3f}s)", file=out)
+        for name, phase_timing in sorted(timings['phases'].items(), key=lambda item: -item[1]['seconds']):
+            print(f"  {name:<20} {phase_timing['seconds']:>9.4f}s {phase_timing['calls']:>7} calls", file=out)
+    if report.get('error'):
+        print(f"Error: {report['error']}", file=out)
+    elif report['dry_run']:
+        print("Dry run: nothing was saved", file=out)
+    elif report['saved']:
+        print("Saved", file=out)
+
+
+def _date(value):
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD, got {value!r}")
+    return value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Schedule exams without the web interface, e.g. from cron. "
+                    "Run from the exam_scheduler directory: python -m csp.cli",
+        epilog="Exit status: 0 every subject placed, 2 saved but some subjects "
+               "left unscheduled, 1 nothing saved."
+    )
+    parser.add_argument("--db", default=os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "exam_scheduler.db"))
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--subjects", metavar="CSV",
+                        help="subject list (code, title, semester, department, num_students); - for stdin")
+    source.add_argument("--all-unscheduled", action="store_true",
+                        help="every subject in the database that has no exam yet")
+    parser.add_argument("--start", type=_date, required=True, help="earliest exam date, YYYY-MM-DD")
+    parser.add_argument("--end", type=_date, required=True, help="latest exam date, YYYY-MM-DD")
+    parser.add_argument("--dry-run", action="store_true", help="schedule but do not save")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON on stdout")
+    parser.add_argument("--order", choices=EXAM_ORDERS, default="dsatur")
+    parser.add_argument("--slot-order", choices=SLOT_ORDERS, default="earliest")
+    parser.add_argument("--optimize", action="store_true", help="improve the greedy result with local search")
+    parser.add_argument("--portfolio", action="store_true", help="try several strategies in parallel")
+    parser.add_argument("--time-budget", type=float, default=10.0,
+                        help="seconds for --optimize or --portfolio (default 10)")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--max-duties-per-day", type=int, default=1)
+    parser.add_argument("--max-duties-per-term", type=int)
+    args = parser.parse_args(argv)
+    if args.start > args.end:
+        parser.error("--end must not be before --start")
+
+    if args.subjects:
+        try:
+            if args.subjects == "-":
+                subjects = read_subject_file(sys.stdin)
+            else:
+                with open(args.subjects, newline="", encoding="utf-8-sig") as f:
+                    subjects = read_subject_file(f)
+        except (OSError, ValueError) as e:
+            print(f"Error reading subject list: {e}", file=sys.stderr)
+            return FAILED
+
+    # With --json, stdout carries only the report; library and migration
+    # messages go to stderr
+    log = sys.stderr if args.json else sys.stdout
+    with contextlib.redirect_stdout(log):
+        if args.all_unscheduled:
+            conn = create_connection(args.db)
+            if not conn:
+                return FAILED
+            try:
+                error = prepare_database(conn, args.dry_run)
+                if error:
+                    print(f"Error: {error}", file=sys.stderr)
+                    return FAILED
+                subjects = unscheduled_subjects(conn)
+            except sqlite3.Error as e:
+                print(f"Error loading subjects: {e}", file=sys.stderr)
+                return FAILED
+            finally:
+                conn.close()
+        report = run_batch(
+            args.db, subjects, args.start, args.end, dry_run=args.dry_run,
+            order=args.order, slot_order=args.slot_order, optimize=args.optimize,
+            portfolio=args.portfolio, time_budget=args.time_budget, seed=args.seed,
+            max_duties_per_day=args.max_duties_per_day, max_duties_per_term=args.max_duties_per_term,
+        )
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        _print_report(report, sys.stdout)
+
+    if not report['ok']:
+        return FAILED
+    return PARTIAL if report['unscheduled'] else OK
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,108 @@
+import heapq
+from collections import defaultdict
+
+# Edge kinds: a SLOT conflict forbids sharing a (date, session), a DAY conflict
+# forbids sharing a date at all. DAY is the stronger of the two.
+SLOT = 1
+DAY = 2
+
+
+def build_conflict_graph(subjects, rooms_needed, total_rooms, total_invigilators, coenrollment=None):
+    """Build the subject conflict graph for a batch of exams.
+
+    Returns a dict mapping subject code -> {neighbour code: edge kind}.
+    Subjects conflict when they share a student (same slot forbidden), share a
+    department (same day forbidden), or together need more rooms than exist
+    (same slot forbidden) or more invigilators than exist (same day forbidden,
+    since an invigilator covers at most one session per day).
+    ``rooms_needed`` maps a student count to the fewest rooms that seat it.
+    Shared students come from ``coenrollment`` (a CoEnrollment); a pair with
+    a subject it does not cover falls back to "same semester shares students".
+    """
+    graph = {subject['code']: {} for subject in subjects}
+
+    def link(a, b, kind):
+        if a == b:
+            return
+        if graph[a].get(b, 0) < kind:
+            graph[a][b] = kind
+            graph[b][a] = kind
+
+    by_semester = defaultdict(list)
+    by_department = defaultdict(list)
+    for subject in subjects:
+        by_semester[subject['semester']].append(subject['code'])
+        by_department[subject['department']].append(subject['code'])
+
+    covered = {code for code in graph if coenrollment is not None and code in coenrollment}
+    for codes in by_semester.values():
+        for i, a in enumerate(codes):
+            for b in codes[i + 1:]:
+                if a not in covered or b not in covered:
+                    link(a, b, SLOT)
+    for a in covered:
+        for b in coenrollment.neighbours(a):
+            if b in graph:
+                link(a, b, SLOT)
+    for codes in by_department.values():
+        for i, a in enumerate(codes):
+            for b in codes[i + 1:]:
+                link(a, b, DAY)
+
+    # Resource conflicts only arise between large exams, so sort by size and
+    # stop pairing as soon as the combined demand fits.
+    demand = sorted(
+        ((rooms_needed(s['num_students']) or 0, s['code']) for s in subjects),
+        reverse=True
+    )
+    for i, (need_a, a) in enumerate(demand):
+        for need_b, b in demand[i + 1:]:
+            if need_a + need_b > total_invigilators:
+                link(a, b, DAY)
+            elif need_a + need_b > total_rooms:
+                link(a, b, SLOT)
+            else:
+                break
+
+    return graph
+
+
+def dsatur_order(graph, placed_slot, tie_break=None):
+    """Yield subject codes in saturation-degree / largest-first order.
+
+    ``placed_slot(code)`` is called after each yielded code and must return the
+    (date, session) the subject was placed in, or None if it could not be
+    placed. Saturation is the number of distinct slots blocked for a subject by
+    its already placed neighbours; ties fall back to degree and then to
+    ``tie_break(code)`` (larger first).
+    """
+    tie_break = tie_break or (lambda code: 0)
+    blocked = {code: set() for code in graph}
+    done = set()
+    heap = [(0, -len(neighbours), -tie_break(code), code) for code, neighbours in graph.items()]
+    heapq.heapify(heap)
+
+    while heap:
+        neg_sat, _, _, code = heapq.heappop(heap)
+        if code in done or -neg_sat != len(blocked[code]):
+            continue  # stale entry, a fresher one is in the heap
+        done.add(code)
+        yield code
+
+        slot = placed_slot(code)
+        if slot is None:
+            continue
+        date, session = slot
+        for neighbour, kind in graph[code].items():
+            if neighbour in done:
+                continue
+            before = len(blocked[neighbour])
+            if kind == DAY:
+                blocked[neighbour].add((date, None))
+            else:
+                blocked[neighbour].add((date, session))
+            if len(blocked[neighbour]) != before:
+                heapq.heappush(heap, (
+                    -len(blocked[neighbour]), -len(graph[neighbour]),
+                    -tie_break(neighbour), neighbour
+                ))
@@ -1,89 +1,210 @@
-from constraint import Problem
+from collections import defaultdict
+from constraint import AllDifferentConstraint, Constraint, Problem, Unassigned
+
+
+class DistinctDayConstraint(Constraint):
+    """All given slot variables must fall on different days"""
+
+    def __init__(self, sessions_per_day):
+        self.sessions_per_day = sessions_per_day
+
+    def __call__(self, variables, domains, assignments, forwardcheck=False,
+                 _unassigned=Unassigned):
+        days = set()
+        for variable in variables:
+            slot = assignments.get(variable, _unassigned)
+            if slot is not _unassigned:
+                day = slot // self.sessions_per_day
+                if day in days:
+                    return False
+                days.add(day)
+        if forwardcheck and days:
+            for variable in variables:
+                if variable not in assignments:
+                    domain = domains[variable]
+                    for slot in domain[:]:
+                        if slot // self.sessions_per_day in days:
+                            domain.hideValue(slot)
+                    if not domain:
+                        return False
+        return True
+
+
+class ResourceClashConstraint(Constraint):
+    """No two exams may hold the same resource at the same time.
+
+    Variables come in (slot, resource) pairs, one pair per exam. With
+    ``per_day`` set, two exams clash whenever they share the resource on the
+    same day, otherwise only when they share the exact slot.
+    """
+
+    def __init__(self, sessions_per_day, per_day=False):
+        self.sessions_per_day = sessions_per_day
+        self.per_day = per_day
+
+    def _key(self, slot, resource):
+        return (slot // self.sessions_per_day if self.per_day else slot, resource)
+
+    def __call__(self, variables, domains, assignments, forwardcheck=False,
+                 _unassigned=Unassigned):
+        taken = set()
+        for slot_var, resource_var in zip(variables[::2], variables[1::2]):
+            slot = assignments.get(slot_var, _unassigned)
+            resource = assignments.get(resource_var, _unassigned)
+            if slot is _unassigned or resource is _unassigned:
+                continue
+            key = self._key(slot, resource)
+            if key in taken:
+                return False
+            taken.add(key)
+        if forwardcheck and taken:
+            # Prune the open half of any pair whose other half is fixed
+            for slot_var, resource_var in zip(variables[::2], variables[1::2]):
+                slot = assignments.get(slot_var, _unassigned)
+                resource = assignments.get(resource_var, _unassigned)
+                if (slot is _unassigned) == (resource is _unassigned):
+                    continue
+                if slot is _unassigned:
+                    domain = domains[slot_var]
+                    for value in domain[:]:
+                        if self._key(value, resource) in taken:
+                            domain.hideValue(value)
+                else:
+                    domain = domains[resource_var]
+                    for value in domain[:]:
+                        if self._key(slot, value) in taken:
+                            domain.hideValue(value)
+                if not domain:
+                    return False
+        return True
+
 
 class ExamConstraints:
-    def __init__(self):
-        self.problem = Problem()
+    def __init__(self, solver=None):
+        # solver: any python-constraint Solver; None uses its default backtracking
+        self.problem = Problem(solver)
+        self.dates = []
+        self.sessions = []
 
     def add_domain_variables(self, subjects, dates, sessions, invigilators, rooms):
-        """Add variables with domains to the CSP"""
+        """Add variables with domains to the CSP.
+
+        Date and session are combined into a single integer slot variable:
+        slot = date_index * len(sessions) + session_index.
+        """
+        self.add_slot_variables(subjects, dates, sessions)
         for subject in subjects:
             subj_code = subject['code']
-            self.problem.addVariable(f"date_{subj_code}", dates)
-            self.problem.addVariable(f"session_{subj_code}", sessions)
             self.problem.addVariable(f"invigilator_{subj_code}", [inv['code'] for inv in invigilators])
             self.problem.addVariable(f"room_{subj_code}", rooms)
 
-    def add_basic_constraints(self, subjects):
-        """Add core constraints"""
-        self._add_semester_clash_constraints(subjects)
-        self._add_invigilator_availability_constraints(subjects)
-        self._add_room_usage_constraints(subjects)
+    def add_slot_variables(self, subjects, dates, sessions, domains=None):
+        """Add only the slot variables, for models that seat exams afterwards.
+
+        ``domains`` optionally maps subject code -> allowed slot numbers,
+        e.g. the slots a ResourceModel still reports as feasible.
+        """
+        self.dates = list(dates)
+        self.sessions = list(sessions)
+        slots = list(range(len(self.dates) * len(self.sessions)))
+        for subject in subjects:
+            allowed = domains.get(subject['code'], slots) if domains else slots
+            self.problem.addVariable(f"slot_{subject['code']}", [int(slot) for slot in allowed])
+
+    def add_basic_constraints(self, subjects, resources=True, coenrollment=None):
+        """Add core constraints, one global constraint per group.
+
+        Pass resources=False for a model built with add_slot_variables().
+        With a CoEnrollment, subjects it covers only clash with the subjects
+        they really share students with.
+        """
+        self._add_semester_clash_constraints(subjects, coenrollment)
+        if resources:
+            self._add_invigilator_availability_constraints(subjects)
+            self._add_room_usage_constraints(subjects)
         self._add_department_constraints(subjects)
 
-    def _add_semester_clash_constraints(self, subjects):
-        """Prevent same-semester subjects from having exams at same date and session"""
-        for i, subj1 in enumerate(subjects):
-            for j, subj2 in enumerate(subjects):
-                if i < j and subj1['semester'] == subj2['semester']:
-                    self.problem.addConstraint(
-                        lambda d1, s1, d2, s2: not (d1 == d2 and s1 == s2),
-                        [f"date_{subj1['code']}", f"session_{subj1['code']}",
-                         f"date_{subj2['code']}", f"session_{subj2['code']}"]
-                    )
+    def _add_semester_clash_constraints(self, subjects, coenrollment=None):
+        """Prevent subjects sharing students from having exams at same date and session.
+
+        Without enrolment data everyone in a semester is assumed to sit every
+        subject in it.
+        """
+        covered = {s['code'] for s in subjects if coenrollment is not None and s['code'] in coenrollment}
+        for codes in self._group_codes(subjects, 'semester').values():
+            unknown = [code for code in codes if code not in covered]
+            if len(unknown) > 1:
+                self.problem.addConstraint(
+                    AllDifferentConstraint(), [f"slot_{code}" for code in unknown]
+                )
+            for a in unknown:
+                for b in codes:
+                    if b in covered:
+                        self.problem.addConstraint(AllDifferentConstraint(), [f"slot_{a}", f"slot_{b}"])
+        for a in sorted(covered):
+            for b in coenrollment.neighbours(a):
+                if b in covered and a < b:
+                    self.problem.addConstraint(AllDifferentConstraint(), [f"slot_{a}", f"slot_{b}"])
 
     def _add_invigilator_availability_constraints(self, subjects):
-        """Ensure invigilator not assigned both FN and AN sessions same day"""
-        for i, subj1 in enumerate(subjects):
-            for j, subj2 in enumerate(subjects):
-                if i < j:
-                    self.problem.addConstraint(
-                        lambda d1, inv1, s1, d2, inv2, s2: not (
-                            d1 == d2 and inv1 == inv2 and 
-                            ((s1 == 'FN' and s2 == 'AN') or (s1 == 'AN' and s2 == 'FN'))
-                        ),
-                        [f"date_{subj1['code']}", f"invigilator_{subj1['code']}", f"session_{subj1['code']}",
-                         f"date_{subj2['code']}", f"invigilator_{subj2['code']}", f"session_{subj2['code']}"]
-                    )
-                    # Additional constraint: Invigilator can't be assigned to two exams same session same day
-                    self.problem.addConstraint(
-                        lambda d1, inv1, s1, d2, inv2, s2: not (
-                            d1 == d2 and inv1 == inv2 and s1 == s2
-                        ),
-                        [f"date_{subj1['code']}", f"invigilator_{subj1['code']}", f"session_{subj1['code']}",
-                         f"date_{subj2['code']}", f"invigilator_{subj2['code']}", f"session_{subj2['code']}"]
-                    )
+        """Ensure an invigilator covers at most one exam per day (either session)"""
+        if len(subjects) > 1:
+            self.problem.addConstraint(
+                ResourceClashConstraint(len(self.sessions), per_day=True),
+                self._paired_variables(subjects, 'invigilator')
+            )
 
     def _add_room_usage_constraints(self, subjects):
         """Restrict only one exam per room per session"""
-        for i, subj1 in enumerate(subjects):
-            for j, subj2 in enumerate(subjects):
-                if i < j:
-                    self.problem.addConstraint(
-                        lambda d1, r1, s1, d2, r2, s2: not (d1 == d2 and r1 == r2 and s1 == s2),
-                        [f"date_{subj1['code']}", f"room_{subj1['code']}", f"session_{subj1['code']}",
-                         f"date_{subj2['code']}", f"room_{subj2['code']}", f"session_{subj2['code']}"]
-                    )
+        if len(subjects) > 1:
+            self.problem.addConstraint(
+                ResourceClashConstraint(len(self.sessions)),
+                self._paired_variables(subjects, 'room')
+            )
 
     def _add_department_constraints(self, subjects):
         """Department can have only one exam per day"""
-        dept_exams = {}
+        for codes in self._group_codes(subjects, 'department').values():
+            if len(codes) > 1:
+                self.problem.addConstraint(
+                    DistinctDayConstraint(len(self.sessions)),
+                    [f"slot_{code}" for code in codes]
+                )
+
+    @staticmethod
+    def _group_codes(subjects, key):
+        groups = defaultdict(list)
         for subject in subjects:
-            if subject['department'] not in dept_exams:
-                dept_exams[subject['department']] = []
-            dept_exams[subject['department']].append(subject)
-        
-        for dept, dept_subjects in dept_exams.items():
-            for i, subj1 in enumerate(dept_subjects):
-                for j, subj2 in enumerate(dept_subjects):
-                    if i < j:
-                        self.problem.addConstraint(
-                            lambda d1, d2: d1 != d2,
-                            [f"date_{subj1['code']}", f"date_{subj2['code']}"]
-                        )
+            groups[subject[key]].append(subject['code'])
+        return groups
+
+    @staticmethod
+    def _paired_variables(subjects, resource):
+        variables = []
+        for subject in subjects:
+            variables.extend([f"slot_{subject['code']}", f"{resource}_{subject['code']}"])
+        return variables
+
+    def decode_slot(self, slot):
+        """Turn a combined slot value back into (date, session)"""
+        day, session = divmod(slot, len(self.sessions))
+        return self.dates[day], self.sessions[session]
+
+    def decode_solution(self, solution):
+        """Map a solver solution to {subject_code: {date, session, invigilator, room}}"""
+        decoded = {}
+        for variable, value in solution.items():
+            if variable.startswith("slot_"):
+                code = variable[len("slot_"):]
+                date, session = self.decode_slot(value)
+                decoded.setdefault(code, {}).update({'date': date, 'session': session})
+            else:
+                kind, code = variable.split("_", 1)
+                decoded.setdefault(code, {})[kind] = value
+        return decoded
 
     def add_custom_constraint(self, constraint_func, variables):
         self.problem.addConstraint(constraint_func, variables)
 
     def get_problem(self):
         return self.problem
-
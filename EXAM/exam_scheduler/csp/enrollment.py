@@ -0,0 +1,176 @@
+import sqlite3
+import numpy as np
+from database.init_db import create_connection
+
+
+class CoEnrollment:
+    """Sparse subject x subject matrix of shared-student counts.
+
+    Stored in CSR form: the neighbours of subject i are
+    ``indices[indptr[i]:indptr[i + 1]]`` with matching ``counts``, sorted by
+    subject index. Only pairs that share at least one student are kept, so
+    memory grows with the number of real clashes, not with subjects squared.
+    ``sizes`` holds each subject's enrolment. Subjects with no enrolment rows
+    are not covered, and callers fall back to the semester rule for them.
+    """
+
+    def __init__(self, codes, indptr, indices, counts, sizes):
+        self.codes = list(codes)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.indptr = indptr
+        self.indices = indices
+        self.counts = counts
+        self.sizes = sizes
+
+    @classmethod
+    def from_arrays(cls, student_ids, subject_ids, codes):
+        """Build from parallel integer arrays of (student, subject index) enrolments"""
+        num_subjects = len(codes)
+        students = np.asarray(student_ids, dtype=np.int64)
+        subjects = np.asarray(subject_ids, dtype=np.int64)
+        order = np.lexsort((subjects, students))
+        students, subjects = students[order], subjects[order]
+        if len(students):
+            # A student listed twice for one subject counts once
+            keep = np.ones(len(students), dtype=bool)
+            keep[1:] = (students[1:] != students[:-1]) | (subjects[1:] != subjects[:-1])
+            students, subjects = students[keep], subjects[keep]
+        sizes = np.bincount(subjects, minlength=num_subjects).astype(np.int32)
+
+        # Rows are grouped by student, so pairing each row with the one
+        # `offset` places later finds every pair once; stop at the first
+        # offset that crosses every group.
+        firsts, seconds = [], []
+        offset = 1
+        while offset < len(students):
+            same = students[offset:] == students[:-offset]
+            if not same.any():
+                break
+            firsts.append(subjects[:-offset][same])
+            seconds.append(subjects[offset:][same])
+            offset += 1
+
+        if firsts:
+            keys, counts = np.unique(np.concatenate(firsts) * num_subjects + np.concatenate(seconds),
+                                     return_counts=True)
+            first, second = np.divmod(keys, num_subjects)
+            rows = np.concatenate([first, second])
+            cols = np.concatenate([second, first])
+            data = np.concatenate([counts, counts]).astype(np.int32)
+            order = np.lexsort((cols, rows))
+            rows, cols, data = rows[order], cols[order], data[order]
+        else:
+            rows = cols = np.zeros(0, dtype=np.int64)
+            data = np.zeros(0, dtype=np.int32)
+
+        indptr = np.zeros(num_subjects + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=num_subjects), out=indptr[1:])
+        return cls(codes, indptr, cols.astype(np.int32), data, sizes)
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """Build from (student id, subject code) pairs in any order"""
+        subject_index = {}
+        student_index = {}
+        student_ids = []
+        subject_ids = []
+        for student, subject in pairs:
+            student_ids.append(student_index.setdefault(student, len(student_index)))
+            subject_ids.append(subject_index.setdefault(subject, len(subject_index)))
+        return cls.from_arrays(student_ids, subject_ids, list(subject_index))
+
+    def __contains__(self, code):
+        """True when the subject has enrolment data"""
+        i = self.index.get(code)
+        return i is not None and self.sizes[i] > 0
+
+    @property
+    def nnz(self):
+        """Stored entries; each clashing pair is stored twice"""
+        return len(self.indices)
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + self.counts.nbytes + self.sizes.nbytes
+
+    def enrolled(self, code):
+        i = self.index.get(code)
+        return int(self.sizes[i]) if i is not None else 0
+
+    def neighbours(self, code):
+        """{subject code: shared students} for every subject sharing a student with code"""
+        i = self.index.get(code)
+        if i is None:
+            return {}
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return {self.codes[j]: int(n) for j, n in zip(self.indices[start:end], self.counts[start:end])}
+
+    def shared(self, a, b):
+        """Students enrolled in both a and b"""
+        i, j = self.index.get(a), self.index.get(b)
+        if i is None or j is None:
+            return 0
+        start, end = self.indptr[i], self.indptr[i + 1]
+        position = start + np.searchsorted(self.indices[start:end], j)
+        return int(self.counts[position]) if position < end and self.indices[position] == j else 0
+
+    def clashes(self, code, others):
+        """{other: shared students} for the others that share a student with code"""
+        neighbours = self.neighbours(code)
+        return {other: neighbours[other] for other in others if other in neighbours}
+
+
+def load_coenrollment(conn):
+    """Build the co-enrolment matrix from the enrollments table; None when it is empty"""
+    cur = conn.cursor()
+    # Primary-key order, so each student's rows arrive together
+    cur.execute("SELECT ra_number, subject_code FROM enrollments ORDER BY ra_number, subject_code")
+    subject_index = {}
+    student_ids = []
+    subject_ids = []
+    student = -1
+    previous = None
+    while True:
+        rows = cur.fetchmany(10000)
+        if not rows:
+            break
+        for ra_number, subject_code in rows:
+            if ra_number != previous:
+                student += 1
+                previous = ra_number
+            student_ids.append(student)
+            subject_ids.append(subject_index.setdefault(subject_code, len(subject_index)))
+    if not subject_ids:
+        return None
+    return CoEnrollment.from_arrays(student_ids, subject_ids, list(subject_index))
+
+
+def co_enrolled_subjects(conn, subject_code):
+    """{subject code: shared students} for one subject, straight from SQL.
+
+    Cheaper than building the whole matrix when only a few subjects are
+    looked at, e.g. when a single exam is scheduled.
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT other.subject_code, COUNT(*)
+        FROM enrollments mine
+        JOIN enrollments other ON other.ra_number = mine.ra_number
+        WHERE mine.subject_code = ? AND other.subject_code != mine.subject_code
+        GROUP BY other.subject_code
+    """, (subject_code,))
+    return dict(cur.fetchall())
+
+
+def read_coenrollment(db_file):
+    """load_coenrollment() on a pooled connection; None if there is no enrolment data"""
+    conn = create_connection(db_file)
+    if not conn:
+        return None
+    try:
+        return load_coenrollment(conn)
+    except sqlite3.Error as e:
+        print(f"Error loading enrollments: {e}")
+        return None
+    finally:
+        conn.close()
@@ -0,0 +1,241 @@
+import csv
+import io
+import sqlite3
+import tempfile
+from datetime import date
+from database.init_db import create_connection
+from database.queries import SCHEDULE_COLUMNS, SCHEDULE_JOINS
+
+EXPORT_CHUNK_SIZE = 1000
+# CSV output stays in memory up to this size, then spills to a temp file
+SPOOL_LIMIT = 8 * 1024 * 1024
+
+
+def iter_schedule_rows(db_file, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the column names, then lists of up to chunk_size schedule rows.
+
+    Rows come straight off the SQLite cursor with fetchmany, so the full
+    schedule is never held in memory.
+    """
+    conn = create_connection(db_file)
+    if not conn:
+        return
+    try:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT {SCHEDULE_COLUMNS}
+            {SCHEDULE_JOINS}
+            ORDER BY es.date, es.session, es.room_code
+        """)
+        yield [col[0] for col in cur.description]
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    except sqlite3.Error as e:
+        print(f"Error exporting schedule: {e}")
+    finally:
+        conn.close()
+
+
+def iter_schedule_csv(db_file, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the schedule as CSV text, one chunk of rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for index, chunk in enumerate(iter_schedule_rows(db_file, chunk_size)):
+        if index == 0:
+            writer.writerow(chunk)  # column names
+        else:
+            writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def schedule_csv_file(db_file, chunk_size=EXPORT_CHUNK_SIZE):
+    """Write the schedule as UTF-8 CSV into a rewound spooled file.
+
+    Returns None when there is nothing scheduled.
+    """
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_LIMIT, mode="w+b")
+    has_rows = False
+    for index, text in enumerate(iter_schedule_csv(db_file, chunk_size)):
+        has_rows = has_rows or index > 0
+        out.write(text.encode("utf-8"))
+    if not has_rows:
+        out.close()
+        return None
+    out.seek(0)
+    return out
+
+
+def schedule_csv_bytes(db_file, chunk_size=EXPORT_CHUNK_SIZE):
+    """The schedule as UTF-8 CSV bytes, e.g. for st.download_button; None when nothing is scheduled"""
+    out = schedule_csv_file(db_file, chunk_size)
+    if out is None:
+        return None
+    with out:
+        return out.read()
+
+
+def schedule_csv_text(db_file, chunk_size=EXPORT_CHUNK_SIZE):
+    """The schedule as one CSV string; None when nothing is scheduled"""
+    chunks = list(iter_schedule_csv(db_file, chunk_size))
+    return "".join(chunks) if len(chunks) > 1 else None
+
+
+def schedule_xlsx_bytes(db_file, chunk_size=EXPORT_CHUNK_SIZE):
+    """Build the schedule as an .xlsx workbook and return its bytes.
+
+    Uses openpyxl's write-only mode, which streams rows to the sheet instead
+    of building a cell grid, into an in-memory BytesIO buffer. Returns None
+    when there is nothing scheduled or openpyxl is not installed.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        print("Excel export needs openpyxl (pip install openpyxl)")
+        return None
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Exam Schedule")
+    has_rows = False
+    for index, chunk in enumerate(iter_schedule_rows(db_file, chunk_size)):
+        if index == 0:
+            sheet.append(chunk)
+            continue
+        has_rows = True
+        for row in chunk:
+            sheet.append(row)
+    if not has_rows:
+        return None
+
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+# Columns of the analytics snapshot. The categorical ones are written as
+# Arrow dictionaries: small int32 codes plus one copy of each distinct value.
+SNAPSHOT_SELECT = """
+    SELECT es.date, es.session, es.subject_code, s.title as subject_title,
+           d.name as department, s.semester, es.room_code,
+           es.invigilator_id, u.name as invigilator_name
+"""
+SNAPSHOT_CATEGORIES = {
+    'session': "SELECT DISTINCT es.session",
+    'department': "SELECT DISTINCT d.name",
+    'room_code': "SELECT DISTINCT es.room_code",
+    'invigilator_id': "SELECT DISTINCT es.invigilator_id",
+    'invigilator_name': "SELECT DISTINCT u.name",
+}
+
+
+def _snapshot_schema(pa):
+    category = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('date', pa.date32()),
+        ('session', category),
+        ('subject_code', pa.string()),
+        ('subject_title', pa.string()),
+        ('department', category),
+        ('semester', pa.int8()),
+        ('room_code', category),
+        ('invigilator_id', category),
+        ('invigilator_name', category),
+    ])
+
+
+def _snapshot_batch(pa, schema, rows, dictionaries):
+    """Turn one fetchmany chunk into a RecordBatch sharing the fixed dictionaries"""
+    columns = list(zip(*rows))
+    arrays = []
+    for field, values in zip(schema, columns):
+        if field.name == 'date':
+            arrays.append(pa.array([date.fromisoformat(v) for v in values], pa.date32()))
+        elif field.name in dictionaries:
+            codes, dictionary = dictionaries[field.name]
+            arrays.append(pa.DictionaryArray.from_arrays(
+                pa.array([codes[v] for v in values], pa.int32()), dictionary))
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_schedule_snapshot(db_file, sink, fmt="arrow", chunk_size=EXPORT_CHUNK_SIZE):
+    """Write the full schedule join as a columnar Arrow IPC or Parquet file.
+
+    ``sink`` is a path or a writable binary file object. The Arrow format is
+    an uncompressed IPC file, so load_schedule_snapshot can memory-map it and
+    touch only the columns asked for. Rows are streamed from the cursor one
+    record batch at a time. Returns the number of rows written, or None on
+    error or when pyarrow is not installed.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("Columnar export needs pyarrow (pip install pyarrow)")
+        return None
+    if fmt not in ("arrow", "parquet"):
+        raise ValueError(f"Unknown snapshot format {fmt!r}; expected 'arrow' or 'parquet'")
+
+    conn = create_connection(db_file)
+    if not conn:
+        return None
+    schema = _snapshot_schema(pa)
+    writer = None
+    try:
+        # One read transaction, so the dictionaries match the rows exactly
+        conn.execute("BEGIN")
+        dictionaries = {}
+        for name, select in SNAPSHOT_CATEGORIES.items():
+            values = [row[0] for row in conn.execute(f"{select} {SCHEDULE_JOINS} ORDER BY 1")]
+            dictionaries[name] = ({v: i for i, v in enumerate(values)}, pa.array(values, pa.string()))
+
+        if fmt == "arrow":
+            writer = pa.ipc.new_file(sink, schema)
+        else:
+            writer = pq.ParquetWriter(sink, schema, compression="snappy")
+
+        cur = conn.execute(f"{SNAPSHOT_SELECT} {SCHEDULE_JOINS} ORDER BY es.date, es.session, es.room_code")
+        total = 0
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            writer.write_batch(_snapshot_batch(pa, schema, rows, dictionaries))
+            total += len(rows)
+        return total
+    except sqlite3.Error as e:
+        print(f"Error writing schedule snapshot: {e}")
+        return None
+    finally:
+        if writer is not None:
+            writer.close()
+        conn.close()
+
+
+def schedule_parquet_bytes(db_file):
+    """Build the schedule snapshot as Parquet and return its bytes, or None"""
+    buffer = io.BytesIO()
+    if not write_schedule_snapshot(db_file, buffer, fmt="parquet"):
+        return None
+    return buffer.getvalue()
+
+
+def load_schedule_snapshot(path, columns=None):
+    """Load a snapshot written by write_schedule_snapshot as a pyarrow Table.
+
+    Arrow IPC files are memory-mapped, so only the pages of the requested
+    columns are ever read; Parquet files read just those column chunks.
+    """
+    import pyarrow as pa
+
+    if str(path).endswith(".parquet"):
+        import pyarrow.parquet as pq
+        return pq.read_table(path, columns=columns, memory_map=True)
+    with pa.memory_map(str(path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.select(columns) if columns else table
@@ -0,0 +1,97 @@
+import heapq
+from collections import Counter, defaultdict
+
+
+class InvigilatorAllocator:
+    """Hand out invigilators to exams, fewest duties first.
+
+    A min-heap of (duties, invigilator) yields the least-loaded invigilators
+    without sorting everyone per exam. Entries go stale when a duty count
+    changes; book() pushes a fresh entry and stale ones are dropped as they
+    surface. An invigilator can take a slot when they are not already in that
+    session, have fewer than ``max_per_day`` duties that day and, with
+    ``max_per_term`` set, fewer than that many overall. The default of one
+    duty a day is the rule the rest of the scheduler checks against.
+    """
+
+    def __init__(self, invigilators, max_per_day=1, max_per_term=None):
+        self.max_per_day = max_per_day
+        self.max_per_term = max_per_term
+        self.active = set(invigilators)
+        self.duties = Counter()                  # invigilator -> duties overall
+        self.day_duties = defaultdict(Counter)   # date -> invigilator -> duties
+        self.busy = defaultdict(set)             # (date, session) -> invigilators
+        # Sorted, so already a valid heap with ties broken by id
+        self._heap = [(0, inv) for inv in sorted(self.active)]
+
+    @classmethod
+    def from_ledger(cls, ledger, invigilators, max_per_day=1, max_per_term=None):
+        """Start from the duties already booked in an OccupancyLedger"""
+        allocator = cls(invigilators, max_per_day, max_per_term)
+        for slot, invigilators_busy in ledger.busy_invigilators.items():
+            allocator.busy[slot].update(invigilators_busy)
+        for date, counts in ledger.invigilators_by_date.items():
+            allocator.day_duties[date].update(counts)
+        allocator.duties.update(ledger.duty_counts)
+        allocator._heap = [(allocator.duties[inv], inv) for inv in allocator.active]
+        heapq.heapify(allocator._heap)
+        return allocator
+
+    def is_free(self, invigilator, date, session):
+        """True when the invigilator can take one more duty in the slot"""
+        if invigilator not in self.active or invigilator in self.busy.get((date, session), ()):
+            return False
+        if self.day_duties[date][invigilator] >= self.max_per_day:
+            return False
+        return self.max_per_term is None or self.duties[invigilator] < self.max_per_term
+
+    def allocate(self, count, date, session):
+        """Return ``count`` least-loaded invigilators free for the slot, or [] if there are not enough.
+
+        Nothing is reserved; book() the resulting schedule to take the duties.
+        Costs O((count + skipped) log n), where skipped are the invigilators
+        passed over because they are already busy on the date.
+        """
+        chosen = []
+        seen = set()
+        popped = []
+        while self._heap and len(chosen) < count:
+            entry = heapq.heappop(self._heap)
+            duties, inv = entry
+            if inv in seen or inv not in self.active or duties != self.duties[inv]:
+                continue  # stale or duplicate entry
+            popped.append(entry)
+            seen.add(inv)
+            if self.max_per_term is not None and duties >= self.max_per_term:
+                break  # everyone left in the heap is at the cap too
+            if self.is_free(inv, date, session):
+                chosen.append(inv)
+        for entry in popped:
+            heapq.heappush(self._heap, entry)
+        return chosen if len(chosen) == count else []
+
+    def _apply(self, date, session, invigilator, delta):
+        if delta > 0:
+            self.busy[(date, session)].add(invigilator)
+        else:
+            self.busy[(date, session)].discard(invigilator)
+        self.day_duties[date][invigilator] += delta
+        self.duties[invigilator] += delta
+        if self.day_duties[date][invigilator] <= 0:
+            del self.day_duties[date][invigilator]
+        if invigilator in self.active:
+            heapq.heappush(self._heap, (self.duties[invigilator], invigilator))
+
+    def book(self, schedule):
+        """Record the duties of a formatted schedule"""
+        for exam in schedule:
+            self._apply(exam['date'], exam['session'], exam['invigilator_code'], 1)
+
+    def release(self, schedule):
+        """Undo a previous book() call"""
+        for exam in schedule:
+            self._apply(exam['date'], exam['session'], exam['invigilator_code'], -1)
+
+    def retire(self, invigilator):
+        """Stop handing out an invigilator, e.g. one who is leaving"""
+        self.active.discard(invigilator)
@@ -0,0 +1,389 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from database.init_db import create_connection
+from database.instrumentation import recording
+from csp.scheduler import ExamScheduler
+
+JOB_KINDS = ("exam", "term")
+ACTIVE_STATUSES = ("queued", "running")
+FINAL_STATUSES = ("done", "failed", "cancelled")
+# Seconds an idle worker sleeps between looks at the queue
+POLL_SECONDS = 1.0
+# Progress is written at most this often, so a fast solver is not slowed by SQLite
+PROGRESS_INTERVAL = 0.5
+# A running job whose heartbeat is older than this has lost its worker
+STALE_SECONDS = 300
+# How often a worker looks for jobs orphaned by a crash or another process
+RECOVER_SECONDS = STALE_SECONDS / 2
+
+JOB_COLUMNS = """id, kind, status, params, progress, message, result, cancel_requested,
+                 submitted_by, created_at, started_at, finished_at, heartbeat_at"""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _as_job(cur, row):
+    job = dict(zip([col[0] for col in cur.description], row))
+    job['params'] = json.loads(job['params']) if job['params'] else {}
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    job['cancel_requested'] = bool(job['cancel_requested'])
+    return job
+
+
+def submit_job(db_file, kind, params, submitted_by=None):
+    """Queue a scheduling job and wake the worker; returns the job id or None"""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Unknown job kind {kind!r}")
+    conn = create_connection(db_file)
+    if not conn:
+        return None
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO scheduling_jobs (kind, params, submitted_by, message) VALUES (?, ?, ?, 'Waiting for a worker')",
+            (kind, json.dumps(params), submitted_by)
+        )
+        conn.commit()
+        job_id = cur.lastrowid
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"Error submitting job: {e}")
+        return None
+    finally:
+        conn.close()
+    worker = _workers.get(os.path.abspath(db_file))
+    if worker:
+        worker.wake()
+    return job_id
+
+
+def get_job(db_file, job_id):
+    """One job with params and result decoded, or None"""
+    conn = create_connection(db_file)
+    if not conn:
+        return None
+    try:
+        cur = conn.cursor()
+        cur.execute(f"SELECT {JOB_COLUMNS} FROM scheduling_jobs WHERE id = ?", (job_id,))
+        row = cur.fetchone()
+        return _as_job(cur, row) if row else None
+    except sqlite3.Error as e:
+        print(f"Error reading job {job_id}: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def list_jobs(db_file, limit=20):
+    """Most recent jobs first, without their (possibly large) results"""
+    conn = create_connection(db_file)
+    if not conn:
+        return []
+    try:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT {JOB_COLUMNS.replace('result,', 'NULL AS result,')}
+            FROM scheduling_jobs ORDER BY id DESC LIMIT ?
+        """, (limit,))
+        return [_as_job(cur, row) for row in cur.fetchall()]
+    except sqlite3.Error as e:
+        print(f"Error listing jobs: {e}")
+        return []
+    finally:
+        conn.close()
+
+
+def cancel_job(db_file, job_id):
+    """Cancel a queued job at once, or ask a running one to stop; True if either happened"""
+    conn = create_connection(db_file)
+    if not conn:
+        return False
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE scheduling_jobs
+            SET status = 'cancelled', message = 'Cancelled before it started', finished_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = 'queued'
+        """, (job_id,))
+        changed = cur.rowcount
+        if not changed:
+            cur.execute("""
+                UPDATE scheduling_jobs SET cancel_requested = 1, message = 'Cancelling...'
+                WHERE id = ? AND status = 'running'
+            """, (job_id,))
+            changed = cur.rowcount
+        conn.commit()
+        return changed > 0
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"Error cancelling job {job_id}: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def recover_stale_jobs(db_file, stale_seconds=STALE_SECONDS):
+    """Mark running jobs whose worker stopped sending heartbeats as failed; returns how many"""
+    conn = create_connection(db_file)
+    if not conn:
+        return 0
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE scheduling_jobs
+            SET status = 'failed', message = 'Worker stopped while the job was running',
+                finished_at = CURRENT_TIMESTAMP
+            WHERE status = 'running' AND heartbeat_at < datetime('now', ?)
+        """, (f"-{int(stale_seconds)} seconds",))
+        conn.commit()
+        return cur.rowcount
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"Error recovering stale jobs: {e}")
+        return 0
+    finally:
+        conn.close()
+
+
+def _claim_next(db_file):
+    """Atomically move the oldest queued job to running and return it"""
+    conn = create_connection(db_file)
+    if not conn:
+        return None
+    try:
+        cur = conn.cursor()
+        # The write lock stops two workers from claiming the same job
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute(f"SELECT {JOB_COLUMNS} FROM scheduling_jobs WHERE status = 'queued' ORDER BY id LIMIT 1")
+        row = cur.fetchone()
+        if not row:
+            conn.rollback()
+            return None
+        job = _as_job(cur, row)
+        cur.execute("""
+            UPDATE scheduling_jobs
+            SET status = 'running', message = 'Started', started_at = CURRENT_TIMESTAMP,
+                heartbeat_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (job['id'],))
+        conn.commit()
+        job['status'] = 'running'
+        return job
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"Error claiming job: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def _finish(db_file, job_id, status, message, result=None):
+    conn = create_connection(db_file)
+    if not conn:
+        return
+    try:
+        conn.execute("""
+            UPDATE scheduling_jobs
+            SET status = ?, message = ?, result = ?, finished_at = CURRENT_TIMESTAMP,
+                progress = CASE WHEN ? = 'done' THEN 1 ELSE progress END
+            WHERE id = ?
+        """, (status, message, json.dumps(result) if result is not None else None, status, job_id))
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"Error finishing job {job_id}: {e}")
+    finally:
+        conn.close()
+
+
+class JobProgress:
+    """progress(done, total) callback that records progress and honours cancel requests"""
+
+    def __init__(self, db_file, job_id, interval=PROGRESS_INTERVAL):
+        self.db_file = db_file
+        self.job_id = job_id
+        self.interval = interval
+        self._last = 0.0
+
+    def __call__(self, done, total, message=None, force=False):
+        now = time.monotonic()
+        if not force and now - self._last < self.interval and done < total:
+            return
+        self._last = now
+        conn = create_connection(self.db_file)
+        if not conn:
+            return
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE scheduling_jobs
+                SET progress = ?, message = COALESCE(?, message), heartbeat_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND cancel_requested = 0
+            """, (done / total if total else 0, message, self.job_id))
+            conn.commit()
+            cancelled = cur.rowcount == 0
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"Error recording progress for job {self.job_id}: {e}")
+            cancelled = False
+        finally:
+            conn.close()
+        if cancelled:
+            raise JobCancelled()
+
+
+def _run_exam(db_file, params, progress):
+    scheduler = ExamScheduler(db_file)
+    schedule = scheduler.schedule_exam(
+        subject_code=params['subject_code'],
+        subject_title=params['subject_title'],
+        semester=params['semester'],
+        department=params['department'],
+        num_students=params['num_students'],
+        start_date=params['start_date'],
+        end_date=params['end_date']
+    )
+    if not schedule:
+        return 'failed', "Could not schedule exam with current constraints", {'schedule': []}
+    progress(1, 1, "Saving", force=True)
+    if not scheduler.save_schedule(schedule):
+        return 'failed', "Failed to save schedule to database", {'schedule': schedule}
+    return 'done', f"Scheduled {params['subject_code']}", {'schedule': schedule}
+
+
+def _run_term(db_file, params, progress):
+    subjects = params['subjects']
+    scheduler = ExamScheduler(db_file)
+    if params.get('portfolio'):
+        # Imported here so plain runs never load python-constraint
+        from csp.portfolio import solve_portfolio
+        progress(0, 1, "Trying several strategies", force=True)
+        result = solve_portfolio(scheduler, subjects, params['start_date'], params['end_date'],
+                                 time_budget=float(params.get('time_budget', 10)))
+    else:
+        result = scheduler.schedule_term(subjects, params['start_date'], params['end_date'], progress=progress)
+
+    # Last chance to cancel: nothing has been written yet
+    progress(len(subjects), len(subjects), "Saving", force=True)
+    summary = {
+        'scheduled': len(result['schedules']),
+        'unscheduled': result['unscheduled'],
+        'strategy': result.get('strategy'),
+        'schedule': [exam for schedule in result['schedules'].values() for exam in schedule],
+    }
+    # One transaction for the whole term: either every exam is saved or none
+    if not scheduler.save_schedules(result['schedules'].values()):
+        summary['conflicts'] = scheduler.last_conflicts[:20]
+        return 'failed', "Failed to save schedule: " + "; ".join(scheduler.last_conflicts[:5]), summary
+    return 'done', f"Scheduled {summary['scheduled']} of {len(subjects)} subjects", summary
+
+
+RUNNERS = {'exam': _run_exam, 'term': _run_term}
+
+
+def run_job(db_file, job):
+    """Run a claimed job to completion and record how it ended; returns the final status"""
+    progress = JobProgress(db_file, job['id'])
+    try:
+        with recording(profile=job['params'].get('profile', False)) as recorder:
+            status, message, result = RUNNERS[job['kind']](db_file, job['params'], progress)
+        result['profile'] = recorder.as_dict()
+    except JobCancelled:
+        status, message, result = 'cancelled', "Cancelled; nothing was saved", None
+    except Exception as e:
+        # A bad job must not take the worker down with it
+        print(f"Job {job['id']} failed: {e}")
+        status, message, result = 'failed', f"Error: {e}", None
+    _finish(db_file, job['id'], status, message, result)
+    return status
+
+
+class JobWorker(threading.Thread):
+    """Daemon thread that runs queued jobs one at a time, independent of any browser session"""
+
+    def __init__(self, db_file, poll_seconds=POLL_SECONDS):
+        super().__init__(name=f"scheduling-jobs:{os.path.basename(db_file)}", daemon=True)
+        self.db_file = db_file
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._next_recovery = 0.0
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+    def recover_if_due(self):
+        """Run recover_stale_jobs() at most once every RECOVER_SECONDS"""
+        now = time.monotonic()
+        if now >= self._next_recovery:
+            self._next_recovery = now + RECOVER_SECONDS
+            recover_stale_jobs(self.db_file)
+
+    def run_pending(self):
+        """Run queued jobs until the queue is empty; returns how many ran"""
+        count = 0
+        while not self._stopping.is_set():
+            self.recover_if_due()
+            job = _claim_next(self.db_file)
+            if not job:
+                break
+            run_job(self.db_file, job)
+            count += 1
+        return count
+
+    def run(self):
+        while not self._stopping.is_set():
+            self.run_pending()
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def ensure_worker(db_file):
+    """Start this process's worker for db_file unless it is already running"""
+    key = os.path.abspath(db_file)
+    with _workers_lock:
+        worker = _workers.get(key)
+        if worker is None or not worker.is_alive():
+            worker = _workers[key] = JobWorker(db_file)
+            worker.start()
+    return worker
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run queued scheduling jobs outside the web app. "
+                    "Run from the exam_scheduler directory: python -m csp.jobs"
+    )
+    parser.add_argument("--db", default=os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "exam_scheduler.db"))
+    parser.add_argument("--once", action="store_true", help="run the queued jobs, then exit")
+    args = parser.parse_args(argv)
+
+    worker = JobWorker(args.db)
+    if args.once:
+        print(f"Ran {worker.run_pending()} job(s)")
+        return 0
+    print(f"Waiting for jobs in {args.db} (Ctrl+C to stop)")
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,378 @@
+import math
+import random
+import time
+from collections import Counter
+
+from csp.occupancy import OccupancyLedger
+
+# Any hard violation outweighs every soft cost
+HARD_WEIGHT = 1000
+# Same-cohort exams closer than this many exam days are penalised
+SPREAD_WINDOW = 3
+
+
+class LocalSearchOptimizer:
+    """Anytime simulated-annealing / tabu improver for exam timetables.
+
+    Works on formatted schedules and keeps running counters for every
+    constraint, so a move is scored by removing and re-adding one exam.
+    Hard: room clashes, an invigilator in two rooms at once or over
+    ``max_duties_per_day`` duties a day, room capacity, shared students in a
+    slot, one exam per department per day. Soft: nearby same-cohort exams,
+    students with two exams a day, uneven duties. Shared students come from
+    ``coenrollment`` where it covers both subjects, else from the semester.
+    """
+
+    def __init__(self, rooms, invigilators, dates, sessions, fixed=None,
+                 time_budget=5.0, seed=None, tabu_tenure=20, capacities=None, coenrollment=None,
+                 max_duties_per_day=1):
+        self.rooms = list(rooms)
+        self.coenrollment = coenrollment
+        # room code -> seats; rooms without an entry are treated as unlimited
+        self.capacities = capacities or {}
+        self.invigilators = list(invigilators)
+        self.dates = list(dates)
+        self.sessions = list(sessions)
+        self.fixed = fixed or OccupancyLedger()
+        self.time_budget = time_budget
+        self.random = random.Random(seed)
+        self.tabu_tenure = tabu_tenure
+        self.max_duties_per_day = max_duties_per_day
+        self.stats = {}
+
+        self.slots = [(day, session) for day in range(len(self.dates))
+                      for session in range(len(self.sessions))]
+        self.date_index = {date: i for i, date in enumerate(self.dates)}
+        self.session_index = {session: i for i, session in enumerate(self.sessions)}
+
+    # ------------------------------------------------------------------
+    # Counter bookkeeping
+    # ------------------------------------------------------------------
+
+    def _reset_counters(self):
+        self.room_use = Counter()
+        self.invigilator_slots = Counter()
+        self.invigilator_days = Counter()
+        self.semester_slots = Counter()   # exams without enrolment data
+        self.enrolled_slots = Counter()   # exams with enrolment data, by (slot, semester)
+        self.subject_slots = Counter()
+        self.subject_days = Counter()
+        self.department_days = Counter()
+        self.cohort_days = Counter()
+        self.duties = Counter()
+
+        # Bookings outside the optimised set are fixed background load
+        for (date, session), rooms in self.fixed.booked_rooms.items():
+            if date in self.date_index and session in self.session_index:
+                slot = (self.date_index[date], self.session_index[session])
+                for room in rooms:
+                    self.room_use[(slot, room)] += 1
+        for (date, session), invigilators in self.fixed.busy_invigilators.items():
+            if date in self.date_index and session in self.session_index:
+                slot = (self.date_index[date], self.session_index[session])
+                for invigilator in invigilators:
+                    self.invigilator_slots[(slot, invigilator)] += 1
+        for date, invigilators in self.fixed.invigilators_by_date.items():
+            if date in self.date_index:
+                for invigilator, count in invigilators.items():
+                    self.invigilator_days[(self.date_index[date], invigilator)] += count
+        for date, departments in self.fixed.departments_by_date.items():
+            if date in self.date_index:
+                for department in departments:
+                    self.department_days[(self.date_index[date], department)] += 1
+        for invigilator, count in self.fixed.duty_counts.items():
+            self.duties[invigilator] += count
+        for code, slots in self.fixed.subject_slots.items():
+            for (date, session) in slots:
+                if date in self.date_index and session in self.session_index:
+                    self.subject_slots[((self.date_index[date], self.session_index[session]), code)] += 1
+                    self.subject_days[(self.date_index[date], code)] += 1
+
+    @staticmethod
+    def _bump(counter, key, sign, limit=1):
+        """Apply +1/-1 to a clash counter and return the violation change"""
+        before = counter[key]
+        after = before + sign
+        counter[key] = after
+        return max(0, after - limit) - max(0, before - limit)
+
+    def _spread_cost(self, cohort, day, sign):
+        cost = 0
+        for gap in range(-SPREAD_WINDOW + 1, SPREAD_WINDOW):
+            if gap:
+                cost += (SPREAD_WINDOW - abs(gap)) * self.cohort_days[(cohort, day + gap)]
+        return sign * cost
+
+    def _apply(self, exam, sign):
+        """Add (sign=1) or remove (sign=-1) an exam; return the cost change"""
+        slot = exam['slot']
+        day = slot[0]
+        hard = 0
+        soft = 0
+        for room, seats in zip(exam['rooms'], exam['seats']):
+            hard += self._bump(self.room_use, (slot, room), sign)
+            if self.capacities.get(room, seats) < seats:
+                hard += sign
+        for invigilator in exam['invigilators']:
+            hard += self._bump(self.invigilator_slots, (slot, invigilator), sign)
+            hard += self._bump(self.invigilator_days, (day, invigilator), sign, self.max_duties_per_day)
+            duties = self.duties[invigilator]
+            # Load balance: sum of squared duty counts
+            soft += (duties + sign) ** 2 - duties ** 2
+            self.duties[invigilator] = duties + sign
+        if self.coenrollment is not None and exam['code'] in self.coenrollment:
+            for other, shared in self.coenrollment.neighbours(exam['code']).items():
+                if self.subject_slots[(slot, other)]:
+                    hard += sign
+                if self.subject_days[(day, other)]:
+                    soft += sign * shared
+            hard += sign * self.semester_slots[(slot, exam['semester'])]
+            self.enrolled_slots[(slot, exam['semester'])] += sign
+        else:
+            hard += sign * self.enrolled_slots[(slot, exam['semester'])]
+            hard += self._bump(self.semester_slots, (slot, exam['semester']), sign)
+        self.subject_slots[(slot, exam['code'])] += sign
+        self.subject_days[(day, exam['code'])] += sign
+        hard += self._bump(self.department_days, (day, exam['department']), sign)
+
+        cohort = (exam['department'], exam['semester'])
+        soft += self._spread_cost(cohort, day, sign)
+        self.cohort_days[(cohort, day)] += sign
+        return hard * HARD_WEIGHT + soft, hard
+
+    # ------------------------------------------------------------------
+    # Moves
+    # ------------------------------------------------------------------
+
+    def _free_rooms(self, slot, seats, exclude=()):
+        """Pick one room per entry of seats, preferring free rooms big enough"""
+        free = [room for room in self.rooms
+                if self.room_use[(slot, room)] == 0 and room not in exclude]
+        self.random.shuffle(free)
+        busy = [room for room in self.rooms if room not in free and room not in exclude]
+        self.random.shuffle(busy)
+        pool = free + busy
+        chosen = [None] * len(seats)
+        taken = set()
+        # Seat the largest groups first, while big rooms are still free
+        for i in sorted(range(len(seats)), key=lambda i: -seats[i]):
+            fallback = None
+            for room in pool:
+                if room in taken:
+                    continue
+                if self.capacities.get(room, seats[i]) >= seats[i]:
+                    chosen[i] = room
+                    break
+                if fallback is None:
+                    fallback = room
+            else:
+                chosen[i] = fallback
+            if chosen[i] is None:
+                return []
+            taken.add(chosen[i])
+        return chosen
+
+    def _free_invigilators(self, slot, count, exclude=()):
+        day = slot[0]
+        free = [inv for inv in self.invigilators
+                if self.invigilator_slots[(slot, inv)] == 0
+                and self.invigilator_days[(day, inv)] < self.max_duties_per_day
+                and inv not in exclude]
+        # Prefer lightly loaded invigilators so moves also balance duties
+        free.sort(key=lambda inv: (self.duties[inv], self.random.random()))
+        if len(free) < count:
+            busy = [inv for inv in self.invigilators if inv not in free and inv not in exclude]
+            busy.sort(key=lambda inv: self.invigilator_days[(day, inv)])
+            free.extend(busy)
+        return free[:count]
+
+    def _propose(self, exam):
+        """Return a candidate (slot, rooms, invigilators) for the exam"""
+        move = self.random.random()
+        if move < 0.5 or not exam['rooms']:
+            slot = self.random.choice(self.slots)
+            rooms = self._free_rooms(slot, exam['seats'])
+            # Under one duty a day the exam's own invigilators stay free all day
+            if slot[0] == exam['slot'][0] and self.max_duties_per_day == 1:
+                invigilators = list(exam['invigilators'])
+            else:
+                invigilators = self._free_invigilators(slot, len(exam['invigilators']))
+            return slot, rooms, invigilators
+        index = self.random.randrange(len(exam['rooms']))
+        if move < 0.75:
+            replacement = self._free_rooms(exam['slot'], [exam['seats'][index]], exclude=exam['rooms'])
+            rooms = list(exam['rooms'])
+            if replacement:
+                rooms[index] = replacement[0]
+            return exam['slot'], rooms, list(exam['invigilators'])
+        replacement = self._free_invigilators(exam['slot'], 1, exclude=exam['invigilators'])
+        invigilators = list(exam['invigilators'])
+        if replacement:
+            invigilators[index] = replacement[0]
+        return exam['slot'], list(exam['rooms']), invigilators
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def _initial_placement(self, exam, deadline):
+        """Greedy cheapest slot for an exam that has no placement yet; the best so far once the deadline passes"""
+        best = None
+        for slot in self.slots:
+            if best is not None and time.monotonic() >= deadline:
+                break
+            exam['slot'] = slot
+            exam['rooms'] = self._free_rooms(slot, exam['seats'])
+            exam['invigilators'] = self._free_invigilators(slot, exam['room_count'])
+            delta, _ = self._apply(exam, 1)
+            self._apply(exam, -1)
+            if best is None or delta < best[0]:
+                best = (delta, slot, exam['rooms'], exam['invigilators'])
+                if delta == 0:
+                    break
+        _, exam['slot'], exam['rooms'], exam['invigilators'] = best
+
+    def _load(self, schedules, unplaced):
+        exams = []
+        for code, rows in schedules.items():
+            first = rows[0]
+            exams.append({
+                'code': code,
+                'rows': rows,
+                'semester': first['semester'],
+                'department': first['department'],
+                'room_count': len(rows),
+                'seats': [row['student_count'] for row in rows],
+                'slot': (self.date_index[first['date']], self.session_index[first['session']]),
+                'rooms': [row['room_code'] for row in rows],
+                'invigilators': [row['invigilator_code'] for row in rows],
+            })
+        for subject, rows in unplaced:
+            exams.append({
+                'code': subject['code'],
+                'rows': rows,
+                'semester': subject['semester'],
+                'department': subject['department'],
+                'room_count': len(rows),
+                'seats': [row['student_count'] for row in rows],
+                'slot': None,
+                'rooms': [],
+                'invigilators': [],
+            })
+        return exams
+
+    def optimize(self, schedules, unplaced=()):
+        """Improve a timetable within the time budget and return the best one.
+
+        ``schedules`` maps subject code -> formatted rows. ``unplaced`` is an
+        optional list of (subject, rows) pairs for exams that still need a
+        slot; their rows only supply per-room student counts. Returns a new
+        mapping in the same row format; unplaced exams not reached before the
+        deadline are left out of it.
+        """
+        deadline = time.monotonic() + self.time_budget
+        self._reset_counters()
+        exams = self._load(schedules, unplaced)
+        if not exams or not self.slots:
+            self.stats = {'iterations': 0, 'cost': 0, 'hard_violations': 0}
+            return {code: [dict(row) for row in rows] for code, rows in schedules.items()}
+
+        cost = 0
+        hard = 0
+        placed = []
+        for exam in exams:
+            if exam['slot'] is None:
+                if time.monotonic() >= deadline:
+                    continue
+                self._initial_placement(exam, deadline)
+            placed.append(exam)
+            delta, hard_delta = self._apply(exam, 1)
+            cost += delta
+            hard += hard_delta
+        exams = placed
+
+        best_cost, best_hard = cost, hard
+        best = [(exam['slot'], list(exam['rooms']), list(exam['invigilators'])) for exam in exams]
+        temperature = max(1.0, cost / max(1, len(exams)))
+        tabu = {}
+        iteration = 0
+
+        while time.monotonic() < deadline:
+            iteration += 1
+            exam = self.random.choice(exams)
+            slot, rooms, invigilators = self._propose(exam)
+            if (slot, rooms, invigilators) == (exam['slot'], exam['rooms'], exam['invigilators']):
+                continue
+
+            old = (exam['slot'], exam['rooms'], exam['invigilators'])
+            removed, removed_hard = self._apply(exam, -1)
+            exam['slot'], exam['rooms'], exam['invigilators'] = slot, rooms, invigilators
+            added, added_hard = self._apply(exam, 1)
+            delta = removed + added
+            new_cost = cost + delta
+
+            is_tabu = tabu.get((exam['code'], slot), 0) > iteration
+            accept = new_cost < best_cost or (not is_tabu and (
+                delta <= 0 or self.random.random() < math.exp(-delta / temperature)
+            ))
+            if accept:
+                if slot != old[0]:
+                    tabu[(exam['code'], old[0])] = iteration + self.tabu_tenure
+                cost = new_cost
+                hard += removed_hard + added_hard
+                if cost < best_cost:
+                    best_cost, best_hard = cost, hard
+                    best = [(e['slot'], list(e['rooms']), list(e['invigilators'])) for e in exams]
+            else:
+                self._apply(exam, -1)
+                exam['slot'], exam['rooms'], exam['invigilators'] = old
+                self._apply(exam, 1)
+
+            temperature = max(0.05, temperature * 0.9995)
+            if iteration % 5000 == 0:
+                # Reheat so a long budget keeps exploring instead of freezing
+                temperature = max(temperature, best_cost / max(1, len(exams)) * 0.1, 1.0)
+
+        self.stats = {'iterations': iteration, 'cost': best_cost, 'hard_violations': best_hard}
+        return self._export(exams, best)
+
+    def _export(self, exams, assignment):
+        result = {}
+        for exam, (slot, rooms, invigilators) in zip(exams, assignment):
+            date = self.dates[slot[0]]
+            session = self.sessions[slot[1]]
+            result[exam['code']] = [
+                dict(row, date=date, session=session,
+                     room_code=rooms[i], invigilator_code=invigilators[i])
+                for i, row in enumerate(exam['rows'])
+            ]
+        return result
+
+    def evaluate(self, schedules):
+        """Return (cost, hard violations) of a timetable without changing it"""
+        self._reset_counters()
+        cost = 0
+        hard = 0
+        for exam in self._load(schedules, ()):
+            delta, hard_delta = self._apply(exam, 1)
+            cost += delta
+            hard += hard_delta
+        return cost, hard
+
+    def feasible_subset(self, schedules):
+        """Split a timetable into exams that fit together and ones that clash.
+
+        Exams are added one by one; any exam whose addition creates a hard
+        violation is left out. Returns (kept schedules, dropped codes).
+        """
+        self._reset_counters()
+        kept = {}
+        dropped = []
+        for exam in self._load(schedules, ()):
+            _, hard = self._apply(exam, 1)
+            if hard:
+                self._apply(exam, -1)
+                dropped.append(exam['code'])
+            else:
+                kept[exam['code']] = schedules[exam['code']]
+        return kept, dropped
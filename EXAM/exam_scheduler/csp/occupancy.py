@@ -0,0 +1,94 @@
+from collections import Counter, defaultdict
+
+
+class OccupancyLedger:
+    """In-memory view of which rooms, invigilators and departments are busy.
+
+    Built from a single read of ``exam_schedule`` and kept up to date as exams
+    are placed, so feasibility checks during scheduling are dictionary/set
+    lookups instead of SQL queries.
+    """
+
+    def __init__(self):
+        self.booked_rooms = defaultdict(set)              # (date, session) -> room codes
+        self.busy_invigilators = defaultdict(set)         # (date, session) -> invigilator ids
+        self.invigilators_by_date = defaultdict(Counter)  # date -> invigilator id -> rows
+        self.departments_by_date = defaultdict(Counter)   # date -> department code -> rows
+        self.duty_counts = Counter()                      # invigilator id -> rows overall
+        self.subject_slots = defaultdict(Counter)         # subject code -> (date, session) -> rows
+
+    @classmethod
+    def from_connection(cls, conn):
+        """Build a ledger from the current contents of exam_schedule"""
+        ledger = cls()
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT es.date, es.session, es.room_code, es.invigilator_id,
+                   s.department_code, es.subject_code
+            FROM exam_schedule es
+            JOIN subjects s ON es.subject_code = s.code
+        """)
+        for row in cur.fetchall():
+            ledger._add(*row)
+        return ledger
+
+    def _add(self, date, session, room_code, invigilator_id, department, subject_code=None):
+        self.booked_rooms[(date, session)].add(room_code)
+        self.busy_invigilators[(date, session)].add(invigilator_id)
+        self.invigilators_by_date[date][invigilator_id] += 1
+        self.departments_by_date[date][department] += 1
+        self.duty_counts[invigilator_id] += 1
+        if subject_code is not None:
+            self.subject_slots[subject_code][(date, session)] += 1
+
+    def _remove(self, date, session, room_code, invigilator_id, department, subject_code=None):
+        self.booked_rooms[(date, session)].discard(room_code)
+        self.busy_invigilators[(date, session)].discard(invigilator_id)
+        self.invigilators_by_date[date][invigilator_id] -= 1
+        self.departments_by_date[date][department] -= 1
+        self.duty_counts[invigilator_id] -= 1
+        if subject_code is not None:
+            slots = self.subject_slots[subject_code]
+            slots[(date, session)] -= 1
+            if slots[(date, session)] <= 0:
+                del slots[(date, session)]
+        # Drop zeroed entries so membership tests stay simple
+        for counter, key in ((self.invigilators_by_date[date], invigilator_id),
+                             (self.departments_by_date[date], department),
+                             (self.duty_counts, invigilator_id)):
+            if counter[key] <= 0:
+                del counter[key]
+
+    def is_department_available(self, department, date):
+        """Check if department has no exam scheduled on given date"""
+        return department not in self.departments_by_date.get(date, ())
+
+    def slots_of(self, subject_codes):
+        """Return every (date, session) in which any of the subjects has an exam"""
+        taken = set()
+        for code in subject_codes:
+            taken.update(self.subject_slots.get(code, ()))
+        return taken
+
+    def free_rooms(self, rooms, date, session):
+        """Return rooms (in the given order) that are not booked for the slot"""
+        booked = self.booked_rooms.get((date, session), ())
+        return [room for room in rooms if room not in booked]
+
+    def free_invigilators(self, invigilators, date, session, max_per_day=1):
+        """Return invigilators (in the given order) free in the slot and under max_per_day duties that day"""
+        busy = self.busy_invigilators.get((date, session), ())
+        day = self.invigilators_by_date.get(date, {})
+        return [inv for inv in invigilators if inv not in busy and day.get(inv, 0) < max_per_day]
+
+    def book(self, schedule):
+        """Mark every room/invigilator slot in a formatted schedule as taken"""
+        for exam in schedule:
+            self._add(exam['date'], exam['session'], exam['room_code'],
+                      exam['invigilator_code'], exam['department'], exam.get('subject_code'))
+
+    def release(self, schedule):
+        """Undo a previous book() call, e.g. after a failed save"""
+        for exam in schedule:
+            self._remove(exam['date'], exam['session'], exam['room_code'],
+                         exam['invigilator_code'], exam['department'], exam.get('subject_code'))
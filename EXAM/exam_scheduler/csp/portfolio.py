@@ -0,0 +1,244 @@
+import os
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, wait
+from constraint import BacktrackingSolver, Constraint, MinConflictsSolver, RecursiveBacktrackingSolver
+from csp.constraints import ExamConstraints
+from csp.local_search import LocalSearchOptimizer
+from csp.scheduler import ExamScheduler
+
+DEFAULT_TIME_BUDGET = 10.0
+# Extra seconds to wait for workers to report after the budget runs out
+GRACE_SECONDS = 2.0
+# Time kept back from local search for scoring and sending the result home
+SEARCH_MARGIN = 0.5
+MIN_CONFLICTS_STEPS = 20000
+
+SOLVERS = {
+    'backtracking': lambda: BacktrackingSolver(),
+    'recursive': lambda: RecursiveBacktrackingSolver(),
+    'min_conflicts': lambda: MinConflictsSolver(MIN_CONFLICTS_STEPS),
+}
+
+# Filled once per worker process by _init_worker and only read afterwards
+_shared = {}
+
+
+class _DeadlinePassed(Exception):
+    pass
+
+
+class DeadlineConstraint(Constraint):
+    """Stops a python-constraint search once the wall-clock deadline passes"""
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+
+    def __call__(self, variables, domains, assignments, forwardcheck=False):
+        if time.time() > self.deadline:
+            raise _DeadlinePassed()
+        return True
+
+
+def _deadline_progress(deadline):
+    """schedule_term() progress callback that abandons the run once the deadline passes"""
+    def progress(done, total):
+        if time.time() > deadline:
+            raise _DeadlinePassed()
+    return progress
+
+
+def default_strategies(count):
+    """The default portfolio: fixed strategies first, then seeded variations up to count"""
+    strategies = [
+        {'name': "dsatur/earliest", 'kind': "greedy", 'order': "dsatur", 'slot_order': "earliest"},
+        {'name': "dsatur/latest", 'kind': "greedy", 'order': "dsatur", 'slot_order': "latest"},
+        {'name': "largest/earliest", 'kind': "greedy", 'order': "largest", 'slot_order': "earliest"},
+        {'name': "csp/backtracking", 'kind': "csp", 'solver': "backtracking"},
+        {'name': "csp/recursive", 'kind': "csp", 'solver': "recursive"},
+        {'name': "csp/min_conflicts", 'kind': "csp", 'solver': "min_conflicts", 'seed': 1},
+    ]
+    variations = [
+        {'kind': "greedy", 'order': "dsatur", 'slot_order': "earliest", 'optimize': True},
+        {'kind': "greedy", 'order': "dsatur_random", 'slot_order': "random"},
+        {'kind': "greedy", 'order': "random", 'slot_order': "earliest"},
+    ]
+    seed = 0
+    while len(strategies) < count:
+        for variation in variations:
+            if len(strategies) >= count:
+                break
+            name = f"{variation['order']}/{variation['slot_order']}{'+search' if variation.get('optimize') else ''}"
+            strategies.append(dict(variation, name=f"{name}#{seed}", seed=seed))
+        seed += 1
+    return strategies
+
+
+def _init_worker(db_file, snapshot, subjects, start_date, end_date):
+    _shared.update(db_file=db_file, snapshot=snapshot, subjects=subjects,
+                   start_date=start_date, end_date=end_date)
+
+
+def _solve_csp(scheduler, subjects, dates, solver, deadline):
+    """Slots from the python-constraint model, then rooms packed slot by slot"""
+    model = scheduler._resource_model(dates)
+    domains = {}
+    unscheduled = []
+    # A department sits at most one exam a day, so with more subjects than
+    # days the model has no solution at all; leave the smallest ones out
+    by_department = defaultdict(list)
+    for subject in sorted(subjects, key=lambda s: -(s['num_students'] or 0)):
+        by_department[subject['department']].append(subject)
+    for group in by_department.values():
+        unscheduled.extend(subject['code'] for subject in group[len(dates):])
+    excess = set(unscheduled)
+
+    for subject in subjects:
+        if subject['code'] in excess:
+            continue
+        needed = scheduler.room_allocator.rooms_needed(subject['num_students'])
+        slots = model.feasible_slots(subject['department'], needed,
+                                     blocked_slots=scheduler._student_clash_slots(subject['code'])) if needed else []
+        if len(slots):
+            domains[subject['code']] = slots
+        else:
+            unscheduled.append(subject['code'])
+    modelled = [subject for subject in subjects if subject['code'] in domains]
+
+    constraints = ExamConstraints(SOLVERS[solver]())
+    constraints.add_slot_variables(modelled, dates, scheduler.sessions, domains)
+    constraints.add_basic_constraints(modelled, resources=False, coenrollment=scheduler.coenrollment)
+    if modelled:
+        constraints.add_custom_constraint(DeadlineConstraint(deadline), [f"slot_{s['code']}" for s in modelled])
+    try:
+        solution = constraints.get_problem().getSolution() if modelled else {}
+    except _DeadlinePassed:
+        solution = None
+    if solution is None:
+        return {'schedules': {}, 'unscheduled': [subject['code'] for subject in subjects]}
+
+    decoded = constraints.decode_solution(solution)
+    by_slot = defaultdict(list)
+    for subject in modelled:
+        placement = decoded[subject['code']]
+        by_slot[(placement['date'], placement['session'])].append(subject)
+    result = {'schedules': {}, 'unscheduled': unscheduled}
+    for (date, session), group in sorted(by_slot.items()):
+        placed = scheduler.schedule_slot(group, date, session)
+        result['schedules'].update(placed['schedules'])
+        result['unscheduled'].extend(placed['unscheduled'])
+    return result
+
+
+def _run_strategy(strategy, deadline):
+    """Run one strategy on the shared snapshot; None if the budget ran out before it finished"""
+    if time.time() > deadline:
+        return None
+    started = time.time()
+    snapshot = _shared['snapshot']
+    subjects = _shared['subjects']
+    start_date, end_date = _shared['start_date'], _shared['end_date']
+    seed = strategy.get('seed')
+    scheduler = ExamScheduler(_shared['db_file'], snapshot=snapshot, seed=seed)
+    dates = scheduler._generate_dates(start_date, end_date)
+
+    if strategy['kind'] == "csp":
+        # MinConflictsSolver draws from the module-level random generator
+        random.seed(seed)
+        result = _solve_csp(scheduler, subjects, dates, strategy['solver'], deadline)
+    else:
+        try:
+            result = scheduler.schedule_term(subjects, start_date, end_date,
+                                             strategy['order'], strategy['slot_order'],
+                                             progress=_deadline_progress(deadline))
+        except _DeadlinePassed:
+            return None
+        budget = deadline - time.time() - SEARCH_MARGIN
+        if strategy.get('optimize') and budget > 0:
+            result = scheduler.optimize_term(subjects, result, start_date, end_date,
+                                             time_budget=budget, seed=seed)
+
+    evaluator = LocalSearchOptimizer(
+        scheduler.all_rooms, [inv['code'] for inv in scheduler.all_invigilators],
+        dates, scheduler.sessions, fixed=snapshot['occupancy'],
+        capacities=scheduler.room_allocator.capacity, coenrollment=scheduler.coenrollment,
+        max_duties_per_day=scheduler.max_duties_per_day
+    )
+    cost, hard = evaluator.evaluate(result['schedules'])
+    return {
+        'strategy': strategy['name'],
+        'result': result,
+        # Fewest unscheduled exams first, then fewest clashes, then the soft cost
+        'score': (len(result['unscheduled']), hard, cost),
+        'seconds': round(time.time() - started, 3),
+    }
+
+
+def solve_portfolio(scheduler, subjects, start_date, end_date, time_budget=DEFAULT_TIME_BUDGET,
+                    workers=None, strategies=None):
+    """Schedule a term with several strategies at once and keep the best timetable.
+
+    Each strategy runs in its own process of a ProcessPoolExecutor against
+    one read-only snapshot of ``scheduler``'s rooms, invigilators and
+    bookings. The strategies vary exam ordering, slot ordering, local-search
+    seeds and python-constraint solvers. Results reported within
+    ``time_budget`` seconds are ranked by unscheduled exams, then hard
+    violations, then soft cost.
+
+    Every member stops itself at the deadline: greedy runs check it after
+    each exam, local search gets the time left as its budget and the
+    python-constraint search is cut off by a DeadlineConstraint. Workers
+    are not killed, so a member overruns by one step at most, and as they
+    only see the snapshot they never write to the database. The winner is
+    booked on ``scheduler``, so save_schedules() works as after
+    schedule_term(). Returns the schedule_term() result dict plus
+    ``strategy`` and ``stats``.
+    """
+    workers = workers or os.cpu_count() or 1
+    strategies = strategies or default_strategies(workers)
+    deadline = time.time() + time_budget
+    shared = (scheduler.db_file, scheduler.snapshot(), list(subjects), start_date, end_date)
+
+    outcomes = []
+    if workers == 1:
+        _init_worker(*shared)
+        for strategy in strategies:
+            outcome = _run_strategy(strategy, deadline)
+            if outcome:
+                outcomes.append(outcome)
+    else:
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(strategies)),
+                                       initializer=_init_worker, initargs=shared)
+        try:
+            futures = [executor.submit(_run_strategy, strategy, deadline) for strategy in strategies]
+            done, _ = wait(futures, timeout=time_budget + GRACE_SECONDS)
+            for future in done:
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    print(f"Portfolio strategy failed: {e}")
+                    continue
+                if outcome:
+                    outcomes.append(outcome)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    if not outcomes:
+        # Nothing reported in time: fall back to the plain greedy pass
+        result = scheduler.schedule_term(subjects, start_date, end_date)
+        result.update(strategy="dsatur/earliest", stats={'strategies_run': 0, 'scores': {}})
+        return result
+
+    best = min(outcomes, key=lambda outcome: outcome['score'])
+    result = best['result']
+    for schedule in result['schedules'].values():
+        scheduler._book(schedule)
+    result['strategy'] = best['strategy']
+    result['stats'] = {
+        'strategies_run': len(outcomes),
+        'score': best['score'],
+        'scores': {outcome['strategy']: outcome['score'] for outcome in outcomes},
+        'seconds': {outcome['strategy']: outcome['seconds'] for outcome in outcomes},
+    }
+    return result
@@ -0,0 +1,270 @@
+import argparse
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from database.init_db import create_connection
+from database.data_version import bump_data_version
+from database.timetables import refresh_subjects
+from csp.room_allocation import RoomAllocator
+from csp.scheduler import ExamScheduler
+
+# How far (calendar days either side) a whole exam may move when one of its
+# rows cannot be repaired in its own slot
+REPAIR_WINDOW_DAYS = 7
+
+EXAM_ROWS = """
+    SELECT es.id, es.date, es.session, es.subject_code, es.room_code,
+           es.invigilator_id, s.title, s.semester, s.department_code,
+           s.num_students, r.capacity, r.floor
+    FROM exam_schedule es
+    JOIN subjects s ON es.subject_code = s.code
+    JOIN rooms r ON es.room_code = r.code
+"""
+
+
+def _fetch_rows(cur, where, params):
+    cur.execute(f"{EXAM_ROWS} WHERE {where} ORDER BY es.date, es.session, es.room_code", params)
+    columns = [col[0] for col in cur.description]
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+def _as_schedule(rows):
+    """Database rows in the formatted-schedule shape the ledger understands"""
+    return [{
+        'subject_code': row['subject_code'],
+        'subject_title': row['title'],
+        'semester': row['semester'],
+        'department': row['department_code'],
+        'date': row['date'],
+        'session': row['session'],
+        'room_code': row['room_code'],
+        'invigilator_code': row['invigilator_id'],
+        'student_count': row['capacity'],
+    } for row in rows]
+
+
+def _replacement_invigilator(scheduler, row):
+    """Least-loaded invigilator free for the row's slot"""
+    free = scheduler.invigilator_allocator.allocate(1, row['date'], row['session'])
+    return free[0] if free else None
+
+
+def _replacement_room(scheduler, row):
+    """Free room in the row's slot seating at least as many; same floor, then smallest"""
+    allocator = scheduler.room_allocator
+    free = [room for room in scheduler.occupancy.free_rooms(scheduler.all_rooms, row['date'], row['session'])
+            if allocator.capacity[room] >= row['capacity']]
+    return min(free, key=lambda room: (allocator.floor[room] != row['floor'], allocator.capacity[room], room),
+               default=None)
+
+
+def _shift(date, days):
+    return (datetime.strptime(date, "%Y-%m-%d") + timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def repair_schedule(db_file, invigilator=None, room=None, delete=True, window_days=REPAIR_WINDOW_DAYS):
+    """Repair the timetable after one invigilator or one room drops out.
+
+    Only exams using the resource are touched. Each affected row first gets
+    a replacement in its own slot: another invigilator free that day, or a
+    free room at least as large (same floor preferred). An exam with a row
+    that cannot be fixed in place moves whole to the feasible slot nearest
+    its old one, within window_days. Every other assignment stays fixed.
+
+    The repair is planned and written while holding the write lock, so the
+    schedule cannot change underneath it. Either every affected exam is
+    repaired and, with delete=True, the resource is removed, or nothing
+    changes. Returns a report dict.
+    """
+    if (invigilator is None) == (room is None):
+        raise ValueError("Give exactly one of invigilator or room")
+    started = time.perf_counter()
+    report = {'ok': False, 'reassigned': [], 'moved': [], 'unrepaired': [], 'error': None, 'seconds': None}
+    conn = create_connection(db_file)
+    if not conn:
+        report['error'] = "could not connect to database"
+        return report
+
+    field = 'invigilator_code' if invigilator is not None else 'room_code'
+    column = 'invigilator_id' if invigilator is not None else 'room_code'
+    try:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        if invigilator is not None:
+            cur.execute("SELECT 1 FROM users WHERE id = ? AND role = 'invigilator'", (invigilator,))
+        else:
+            cur.execute("SELECT 1 FROM rooms WHERE code = ?", (room,))
+        if not cur.fetchone():
+            report['error'] = f"unknown {'invigilator' if invigilator is not None else 'room'} {invigilator or room}"
+            conn.rollback()
+            return report
+
+        # Loaded after taking the write lock, so it matches what we will write to
+        scheduler = ExamScheduler(db_file)
+        if invigilator is not None:
+            scheduler.all_invigilators = [inv for inv in scheduler.all_invigilators if inv['code'] != invigilator]
+            scheduler.invigilator_allocator.retire(invigilator)
+            affected = _fetch_rows(cur, "es.invigilator_id = ?", (invigilator,))
+            find_replacement = _replacement_invigilator
+        else:
+            allocator = scheduler.room_allocator
+            scheduler.all_rooms = [code for code in scheduler.all_rooms if code != room]
+            scheduler.room_allocator = RoomAllocator(
+                (code, allocator.floor[code], allocator.capacity[code]) for code in scheduler.all_rooms
+            )
+            affected = _fetch_rows(cur, "es.room_code = ?", (room,))
+            find_replacement = _replacement_room
+
+        by_subject = defaultdict(list)
+        for row in affected:
+            by_subject[row['subject_code']].append(row)
+
+        # 1. Same slot, one row at a time
+        updates = []
+        to_move = []
+        for code, rows in by_subject.items():
+            swapped = []
+            for row in rows:
+                replacement = find_replacement(scheduler, row)
+                if replacement is None:
+                    break
+                old = _as_schedule([row])
+                new = [dict(old[0], **{field: replacement})]
+                scheduler._release(old)
+                scheduler._book(new)
+                swapped.append((row, old, new, replacement))
+            if len(swapped) < len(rows):
+                for _, old, new, _ in reversed(swapped):
+                    scheduler._release(new)
+                    scheduler._book(old)
+                to_move.append(code)
+                continue
+            for row, _, _, replacement in swapped:
+                updates.append((replacement, row['id']))
+                report['reassigned'].append({
+                    'subject_code': code, 'date': row['date'], 'session': row['session'],
+                    'old': row[column], 'new': replacement,
+                })
+
+        # 2. Whole exam to the nearest feasible slot
+        moved = {}
+        for code in to_move:
+            rows = _fetch_rows(cur, "es.subject_code = ?", (code,))
+            first = rows[0]
+            scheduler._release(_as_schedule(rows))
+            dates = scheduler._generate_dates(_shift(first['date'], -window_days), _shift(first['date'], window_days))
+            cur.execute("SELECT COUNT(*) FROM enrollments WHERE subject_code = ?", (code,))
+            enrolled = cur.fetchone()[0]
+            if enrolled:
+                # _place_exam already avoids its students' other exams
+                blocked = set()
+            else:
+                cur.execute("""
+                    SELECT DISTINCT es.date, es.session
+                    FROM exam_schedule es
+                    JOIN subjects s ON es.subject_code = s.code
+                    WHERE s.semester = ? AND es.subject_code != ? AND es.date BETWEEN ? AND ?
+                """, (first['semester'], code, dates[0], dates[-1]) if dates else (first['semester'], code, '', ''))
+                blocked = set(cur.fetchall())
+                blocked.update((schedule[0]['date'], schedule[0]['session'])
+                               for schedule in moved.values() if schedule[0]['semester'] == first['semester'])
+            # Expected size, else the enrolment count. The seats of the rooms it
+            # held are a last resort: they overstate demand, as rooms are rarely full
+            num_students = first['num_students'] or enrolled or sum(row['capacity'] for row in rows)
+
+            schedule = scheduler._place_exam(
+                code, first['title'], first['semester'], first['department_code'],
+                num_students, dates, blocked, near=(first['date'], first['session'])
+            )
+            if not schedule:
+                report['unrepaired'].append(code)
+                continue
+            moved[code] = schedule
+            report['moved'].append({
+                'subject_code': code,
+                'from': (first['date'], first['session']),
+                'to': (schedule[0]['date'], schedule[0]['session']),
+            })
+
+        if report['unrepaired']:
+            conn.rollback()
+            report['error'] = "no feasible slot nearby for " + ", ".join(report['unrepaired'])
+            return report
+
+        cur.executemany(f"UPDATE exam_schedule SET {column} = ? WHERE id = ?", updates)
+        for code in moved:
+            cur.execute("DELETE FROM exam_schedule WHERE subject_code = ?", (code,))
+        new_rows = [exam for schedule in moved.values() for exam in schedule]
+        conflicts = scheduler._find_conflicts(cur, new_rows)
+        if conflicts:
+            conn.rollback()
+            report['error'] = "; ".join(conflicts[:5])
+            return report
+        cur.executemany("""
+            INSERT INTO exam_schedule
+            (date, session, subject_code, invigilator_id, room_code)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(exam['date'], exam['session'], exam['subject_code'],
+               exam['invigilator_code'], exam['room_code']) for exam in new_rows])
+
+        refresh_subjects(conn, list(by_subject))
+
+        if delete:
+            if invigilator is not None:
+                cur.execute("DELETE FROM users WHERE id = ? AND role = 'invigilator'", (invigilator,))
+            else:
+                cur.execute("DELETE FROM rooms WHERE code = ?", (room,))
+        bump_data_version(conn)
+        conn.commit()
+        report['ok'] = True
+        return report
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"Error repairing schedule: {e}")
+        report['error'] = str(e)
+        return report
+    finally:
+        conn.close()
+        report['seconds'] = round(time.perf_counter() - started, 6)
+
+
+def remove_invigilator(db_file, invigilator_id, window_days=REPAIR_WINDOW_DAYS):
+    """Reassign an invigilator's duties, then delete the invigilator"""
+    return repair_schedule(db_file, invigilator=invigilator_id, window_days=window_days)
+
+
+def retire_room(db_file, room_code, window_days=REPAIR_WINDOW_DAYS):
+    """Move exams out of a room, then delete the room"""
+    return repair_schedule(db_file, room=room_code, window_days=window_days)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Repair the exam schedule after an invigilator or room drops out. "
+                    "Run from the exam_scheduler directory: python -m csp.repair"
+    )
+    parser.add_argument("kind", choices=["invigilator", "room"])
+    parser.add_argument("code")
+    parser.add_argument("--db", default=os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "exam_scheduler.db"))
+    parser.add_argument("--window-days", type=int, default=REPAIR_WINDOW_DAYS)
+    parser.add_argument("--keep", action="store_true", help="repair the schedule but keep the resource row")
+    args = parser.parse_args(argv)
+
+    resource = {'invigilator': args.code} if args.kind == "invigilator" else {'room': args.code}
+    report = repair_schedule(args.db, delete=not args.keep, window_days=args.window_days, **resource)
+    for change in report['reassigned']:
+        print(f"{change['subject_code']} {change['date']} {change['session']}: {change['old']} -> {change['new']}")
+    for move in report['moved']:
+        print(f"{move['subject_code']} moved {' '.join(move['from'])} -> {' '.join(move['to'])}")
+    if not report['ok']:
+        print(f"Repair failed: {report['error']}")
+        return 1
+    print(f"Repaired in {report['seconds'] * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
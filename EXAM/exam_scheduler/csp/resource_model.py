@@ -0,0 +1,150 @@
+import numpy as np
+
+
+class ResourceModel:
+    """Vectorized occupancy of rooms, invigilators and departments over a date window.
+
+    Slots are numbered day_index * len(sessions) + session_index (the same
+    encoding ExamConstraints uses). Occupancy is held as count arrays of shape
+    (slots x rooms), (slots x invigilators) and (days x departments); a
+    resource is busy when its count is non-zero. Counts rather than booleans
+    let bookings be released again without rescanning the schedule.
+    """
+
+    def __init__(self, rooms, invigilators, departments, dates, sessions):
+        self.rooms = list(rooms)
+        self.invigilators = list(invigilators)
+        self.departments = list(departments)
+        self.dates = list(dates)
+        self.sessions = list(sessions)
+
+        self.room_index = {room: i for i, room in enumerate(self.rooms)}
+        self.invigilator_index = {inv: i for i, inv in enumerate(self.invigilators)}
+        self.department_index = {dept: i for i, dept in enumerate(self.departments)}
+        self.date_index = {date: i for i, date in enumerate(self.dates)}
+        self.session_index = {session: i for i, session in enumerate(self.sessions)}
+
+        num_slots = len(self.dates) * len(self.sessions)
+        self.room_busy = np.zeros((num_slots, len(self.rooms)), dtype=np.int32)
+        self.invigilator_busy = np.zeros((num_slots, len(self.invigilators)), dtype=np.int32)
+        self.department_busy = np.zeros((len(self.dates), len(self.departments)), dtype=np.int32)
+
+    @classmethod
+    def from_ledger(cls, ledger, rooms, invigilators, departments, dates, sessions):
+        """Build the arrays from an OccupancyLedger, keeping only the window"""
+        model = cls(rooms, invigilators, departments, dates, sessions)
+        for (date, session), booked in ledger.booked_rooms.items():
+            slot = model.slot_of(date, session)
+            if slot is None:
+                continue
+            for room in booked:
+                if room in model.room_index:
+                    model.room_busy[slot, model.room_index[room]] += 1
+            for inv in ledger.busy_invigilators.get((date, session), ()):
+                if inv in model.invigilator_index:
+                    model.invigilator_busy[slot, model.invigilator_index[inv]] += 1
+        for date, departments_busy in ledger.departments_by_date.items():
+            day = model.date_index.get(date)
+            if day is None:
+                continue
+            for dept, count in departments_busy.items():
+                if dept in model.department_index:
+                    model.department_busy[day, model.department_index[dept]] += count
+        return model
+
+    @classmethod
+    def from_connection(cls, conn, dates, sessions):
+        """Build the arrays straight from the rooms, users and exam_schedule tables"""
+        cur = conn.cursor()
+        rooms = [row[0] for row in cur.execute("SELECT code FROM rooms")]
+        invigilators = [row[0] for row in cur.execute("SELECT id FROM users WHERE role='invigilator'")]
+        departments = [row[0] for row in cur.execute("SELECT code FROM departments")]
+        model = cls(rooms, invigilators, departments, dates, sessions)
+        cur.execute("""
+            SELECT es.date, es.session, es.room_code, es.invigilator_id,
+                   s.department_code
+            FROM exam_schedule es
+            JOIN subjects s ON es.subject_code = s.code
+            WHERE es.date BETWEEN ? AND ?
+        """, (min(model.dates), max(model.dates)) if model.dates else ('', ''))
+        model._apply_rows(cur.fetchall(), 1)
+        return model
+
+    def slot_of(self, date, session):
+        """Return the slot index for (date, session), or None if outside the window"""
+        day = self.date_index.get(date)
+        position = self.session_index.get(session)
+        if day is None or position is None:
+            return None
+        return day * len(self.sessions) + position
+
+    def _apply_rows(self, rows, delta):
+        for date, session, room, inv, dept in rows:
+            slot = self.slot_of(date, session)
+            if slot is None:
+                continue
+            if room in self.room_index:
+                self.room_busy[slot, self.room_index[room]] += delta
+            if inv in self.invigilator_index:
+                self.invigilator_busy[slot, self.invigilator_index[inv]] += delta
+            if dept in self.department_index:
+                self.department_busy[slot // len(self.sessions), self.department_index[dept]] += delta
+
+    def book(self, schedule):
+        """Mark a formatted schedule's rooms, invigilators and department as busy"""
+        self._apply_rows(self._schedule_rows(schedule), 1)
+
+    def release(self, schedule):
+        """Undo a previous book() call"""
+        self._apply_rows(self._schedule_rows(schedule), -1)
+
+    @staticmethod
+    def _schedule_rows(schedule):
+        return [(exam['date'], exam['session'], exam['room_code'],
+                 exam['invigilator_code'], exam['department']) for exam in schedule]
+
+    def blocked_mask(self, blocked_slots):
+        """Turn (date, session) / (date, None) pairs into a boolean slot mask"""
+        mask = np.zeros(self.room_busy.shape[0], dtype=bool)
+        per_day = len(self.sessions)
+        for date, session in blocked_slots:
+            day = self.date_index.get(date)
+            if day is None:
+                continue
+            if session is None:
+                mask[day * per_day:(day + 1) * per_day] = True
+            elif session in self.session_index:
+                mask[day * per_day + self.session_index[session]] = True
+        return mask
+
+    def feasible_slots(self, department, rooms_needed, invigilators_needed=None, blocked_slots=(),
+                       max_per_day=1):
+        """Return every slot index, in date/session order, that can host the exam.
+
+        A slot qualifies when the department has no exam that day, at least
+        ``rooms_needed`` rooms are free in the slot and, unless
+        ``invigilators_needed`` is None, that many invigilators are free in
+        the slot and have fewer than ``max_per_day`` duties that day. All
+        dates are checked in one pass over the arrays.
+        """
+        per_day = len(self.sessions)
+        ok = (self.room_busy == 0).sum(axis=1) >= rooms_needed
+
+        if department in self.department_index:
+            free_day = self.department_busy[:, self.department_index[department]] == 0
+            ok &= np.repeat(free_day, per_day)
+
+        if invigilators_needed is not None:
+            by_day = self.invigilator_busy.reshape(len(self.dates), per_day, -1)
+            under_cap = by_day.sum(axis=1, keepdims=True) < max_per_day
+            free = ((by_day == 0) & under_cap).sum(axis=2) >= invigilators_needed
+            ok &= free.reshape(-1)
+
+        if blocked_slots:
+            ok &= ~self.blocked_mask(blocked_slots)
+        return np.flatnonzero(ok)
+
+    def slot_key(self, slot):
+        """Return (date, session) for a slot index"""
+        day, position = divmod(int(slot), len(self.sessions))
+        return self.dates[day], self.sessions[position]
@@ -0,0 +1,92 @@
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import accumulate
+
+
+class RoomAllocator:
+    """Seat exam cohorts in rooms using each room's real capacity.
+
+    A single exam gets the smallest free room that seats everyone. Failing
+    that, it gets the fewest rooms on one floor, filled largest first with
+    the last group best-fitted to the smallest room that still holds it.
+    Rooms spread across floors are used only when that needs fewer rooms.
+    Every room is one invigilator, so fewer rooms per exam leaves more of
+    both for the rest of the slot.
+    """
+
+    def __init__(self, rooms):
+        # rooms: iterable of (code, floor, capacity) rows from the rooms table
+        self.capacity = {}
+        self.floor = {}
+        for code, floor, capacity in rooms:
+            self.capacity[code] = capacity
+            self.floor[code] = floor
+        # Largest first; the code breaks ties so packings are deterministic
+        self.order = sorted(self.capacity, key=lambda code: (-self.capacity[code], code))
+        self._seats_by_count = list(accumulate(self.capacity[code] for code in self.order))
+
+    def rooms_needed(self, num_students):
+        """Fewest rooms that could seat num_students, or None if all rooms together cannot"""
+        count = bisect_left(self._seats_by_count, num_students) + 1
+        return count if count <= len(self.order) else None
+
+    def _fill(self, num_students, rooms):
+        """Fill rooms (largest first) to capacity; best-fit the last group"""
+        packing = []
+        remaining = num_students
+        for i, code in enumerate(rooms):
+            if self.capacity[code] >= remaining:
+                last = code
+                for other in rooms[i + 1:]:
+                    if self.capacity[other] < remaining:
+                        break
+                    last = other
+                packing.append((last, remaining))
+                return packing
+            packing.append((code, self.capacity[code]))
+            remaining -= self.capacity[code]
+        return None
+
+    def _cost(self, packing):
+        return len(packing), sum(self.capacity[code] for code, _ in packing)
+
+    def pack(self, num_students, free_rooms):
+        """Seat num_students in free_rooms; return [(room code, students)] or None"""
+        free = set(free_rooms)
+        candidates = [code for code in self.order if code in free]
+        if not candidates:
+            return None
+        if self.capacity[candidates[0]] >= num_students:
+            return self._fill(num_students, candidates)
+
+        anywhere = self._fill(num_students, candidates)
+        if anywhere is None:
+            return None
+        by_floor = defaultdict(list)
+        for code in candidates:
+            by_floor[self.floor[code]].append(code)
+        best = None
+        for rooms in by_floor.values():
+            packing = self._fill(num_students, rooms)
+            if packing and (best is None or self._cost(packing) < self._cost(best)):
+                best = packing
+        # Keep an exam on one floor unless that costs extra rooms
+        if best and len(best) <= len(anywhere):
+            return best
+        return anywhere
+
+    def pack_slot(self, exams, free_rooms):
+        """Bulk mode: pack every exam of one slot from a shared pool of rooms.
+
+        ``exams`` maps subject code -> number of students. Exams are packed
+        largest first (first-fit decreasing), each taking its rooms out of
+        the pool. Returns {code: packing} for the exams that fit.
+        """
+        free = set(free_rooms)
+        packed = {}
+        for code, num_students in sorted(exams.items(), key=lambda item: (-item[1], item[0])):
+            packing = self.pack(num_students, free)
+            if packing:
+                packed[code] = packing
+                free.difference_update(room for room, _ in packing)
+        return packed
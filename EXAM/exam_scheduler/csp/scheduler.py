@@ -1,21 +1,53 @@
-from constraint import Problem
 from datetime import datetime, timedelta
 import sqlite3
 from database.init_db import create_connection
-from collections import defaultdict
+from database.data_version import bump_data_version
+from database.instrumentation import phase
+from database.queries import SCHEDULE_COLUMNS, SCHEDULE_JOINS, fetch_schedule_page
+from database.timetables import refresh_subjects
+from csp.export import schedule_csv_text, schedule_xlsx_bytes, write_schedule_snapshot
+from csp.occupancy import OccupancyLedger
+from csp.conflict_graph import DAY, build_conflict_graph, dsatur_order
+from csp.enrollment import co_enrolled_subjects, read_coenrollment
+from csp.invigilator_allocation import InvigilatorAllocator
+from csp.local_search import LocalSearchOptimizer
+from csp.resource_model import ResourceModel
+from csp.room_allocation import RoomAllocator
+from collections import Counter, defaultdict
+import copy
 import random
-import pandas as pd
-import streamlit as st
+
+
+# Exam orderings and slot orderings schedule_term() understands
+EXAM_ORDERS = ("dsatur", "dsatur_random", "largest", "random")
+SLOT_ORDERS = ("earliest", "latest", "random")
 
 
 class ExamScheduler:
-    def __init__(self, db_file):
+    def __init__(self, db_file, snapshot=None, seed=None, max_duties_per_day=1, max_duties_per_term=None):
         self.db_file = db_file
-        self.problem = Problem()
-        self.max_students_per_room = 30
-        self._load_resources()
+        # Invigilator caps; a snapshot carries its own
+        self.max_duties_per_day = max_duties_per_day
+        self.max_duties_per_term = max_duties_per_term
+        self._resource_models = {}
+        self.last_conflicts = []
+        # Co-enrolment matrix, read on first use by the batch methods
+        self._coenrollment = None
+        self._coenrollment_loaded = False
+        self._co_enrolled_cache = {}
+        # Only the randomized orderings draw from this
+        self.random = random.Random(seed)
+        if snapshot is None:
+            self._load_resources()
+        else:
+            self._load_snapshot(snapshot)
+        self.invigilator_allocator = InvigilatorAllocator.from_ledger(
+            self.occupancy, [inv['code'] for inv in self.all_invigilators],
+            self.max_duties_per_day, self.max_duties_per_term
+        )
         self.sessions = ['FN', 'AN']  # Both sessions available
 
+    @phase("load_resources")
     def _load_resources(self):
         """Load all necessary resources from database"""
         conn = create_connection(self.db_file)
@@ -23,8 +55,10 @@ class ExamScheduler:
             try:
                 # Load rooms
                 cur = conn.cursor()
-                cur.execute("SELECT code FROM rooms")
-                self.all_rooms = [row[0] for row in cur.fetchall()]
+                cur.execute("SELECT code, floor, capacity FROM rooms")
+                rooms = cur.fetchall()
+                self.all_rooms = [row[0] for row in rooms]
+                self.room_allocator = RoomAllocator(rooms)
                 
                 # Load invigilators
                 cur.execute("SELECT id, name FROM users WHERE role='invigilator'")
@@ -34,63 +68,59 @@ class ExamScheduler:
                 cur.execute("SELECT code FROM departments")
                 self.departments = [row[0] for row in cur.fetchall()]
                 
+                # Snapshot current bookings once; checks below read from it
+                self.occupancy = OccupancyLedger.from_connection(conn)
+                
             except sqlite3.Error as e:
                 print(f"Error loading resources: {e}")
                 self.all_rooms = []
+                self.room_allocator = RoomAllocator([])
                 self.all_invigilators = []
                 self.departments = []
+                self.occupancy = OccupancyLedger()
             finally:
                 conn.close()
         else:
             self.all_rooms = []
+            self.room_allocator = RoomAllocator([])
             self.all_invigilators = []
             self.departments = []
+            self.occupancy = OccupancyLedger()
+
+    def snapshot(self):
+        """Picklable copy of the loaded rooms, invigilators, departments and bookings.
 
+        Pass it to ExamScheduler(db_file, snapshot=...) to get a scheduler,
+        e.g. in a worker process, that never reads the database.
+        """
+        return {
+            'rooms': [(code, self.room_allocator.floor[code], self.room_allocator.capacity[code])
+                      for code in self.all_rooms],
+            'invigilators': list(self.all_invigilators),
+            'departments': list(self.departments),
+            'occupancy': self.occupancy,
+            'coenrollment': self.coenrollment,
+            'max_duties_per_day': self.max_duties_per_day,
+            'max_duties_per_term': self.max_duties_per_term,
+        }
+
+    def _load_snapshot(self, snapshot):
+        self.all_rooms = [room[0] for room in snapshot['rooms']]
+        self.room_allocator = RoomAllocator(snapshot['rooms'])
+        self.all_invigilators = list(snapshot['invigilators'])
+        self.departments = list(snapshot['departments'])
+        self.max_duties_per_day = snapshot.get('max_duties_per_day', 1)
+        self.max_duties_per_term = snapshot.get('max_duties_per_term')
+        # Never modified, so every scheduler can share one matrix
+        self._coenrollment = snapshot.get('coenrollment')
+        self._coenrollment_loaded = True
+        # Bookings change as exams are placed; never share them with the snapshot
+        self.occupancy = copy.deepcopy(snapshot['occupancy'])
+
+    @phase("invigilator_lookup")
     def _get_available_invigilators_for_exam(self, rooms_needed, date, session):
-        """Get available invigilators for the exam based on existing schedule"""
-        conn = create_connection(self.db_file)
-        if not conn:
-            return []
-            
-        try:
-            cur = conn.cursor()
-            # Get all invigilators who are not already assigned in conflicting exams
-            cur.execute("""
-                SELECT u.id FROM users u
-                WHERE u.role='invigilator' 
-                AND u.id NOT IN (
-                    SELECT es.invigilator_id FROM exam_schedule es
-                    WHERE es.date = ? AND es.session = ?
-                )
-                AND u.id NOT IN (
-                    SELECT es.invigilator_id FROM exam_schedule es
-                    WHERE es.date = ? AND es.session != ?
-                )
-                LIMIT ?
-            """, (date, session, date, session, rooms_needed))
-            
-            available = [row[0] for row in cur.fetchall()]
-            
-            # If we don't have enough, try to find ones with minimal conflicts
-            if len(available) < rooms_needed:
-                cur.execute("""
-                    SELECT u.id, COUNT(e.id) as assignment_count
-                    FROM users u
-                    LEFT JOIN exam_schedule e ON u.id = e.invigilator_id
-                    WHERE u.role='invigilator'
-                    GROUP BY u.id
-                    ORDER BY assignment_count ASC
-                    LIMIT ?
-                """, (rooms_needed,))
-                available = [row[0] for row in cur.fetchall()]
-                
-            return available if len(available) >= rooms_needed else []
-            
-        except sqlite3.Error as e:
-            print(f"Error getting available invigilators: {e}")
-            return []
-        finally:
-            conn.close()
+        """Least-loaded invigilators free for the slot, or [] if there are not enough"""
+        return self.invigilator_allocator.allocate(rooms_needed, date, session)
 
     def _get_existing_schedule(self):
         """Get existing exam schedule from database"""
@@ -116,63 +146,80 @@ class ExamScheduler:
         finally:
             conn.close()
 
-    def _get_available_rooms_for_exam(self, rooms_needed, date, session):
-        """Get rooms not already booked for the given date and session"""
-        conn = create_connection(self.db_file)
-        if not conn:
-            return []
-            
-        try:
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT room_code FROM exam_schedule
-                WHERE date = ? AND session = ?
-            """, (date, session))
-            
-            booked_rooms = {row[0] for row in cur.fetchall()}
-            available_rooms = [room for room in self.all_rooms if room not in booked_rooms]
-            
-            return available_rooms[:rooms_needed] if len(available_rooms) >= rooms_needed else []
-            
-        except sqlite3.Error as e:
-            print(f"Error getting available rooms: {e}")
-            return []
-        finally:
-            conn.close()
+    @phase("room_lookup")
+    def _get_available_rooms_for_exam(self, num_students, date, session):
+        """Pack the students into rooms not already booked for the given date and session.
+
+        Returns a list of (room code, students) pairs, or [] if the free rooms
+        cannot seat everyone.
+        """
+        available_rooms = self.occupancy.free_rooms(self.all_rooms, date, session)
+        return self.room_allocator.pack(num_students, available_rooms) or []
 
     def _is_department_available(self, department, date):
         """Check if department has no exam scheduled on given date"""
-        conn = create_connection(self.db_file)
-        if not conn:
-            return False
-            
-        try:
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT COUNT(*) FROM exam_schedule es
-                JOIN subjects s ON es.subject_code = s.code
-                WHERE s.department_code = ? AND es.date = ?
-            """, (department, date))
-            
-            count = cur.fetchone()[0]
-            return count == 0
-            
-        except sqlite3.Error as e:
-            print(f"Error checking department availability: {e}")
-            return False
-        finally:
-            conn.close()
+        return self.occupancy.is_department_available(department, date)
 
-    def schedule_exam(self, subject_code, subject_title, semester, department, num_students, start_date, end_date):
-        """Main scheduling method with all constraints"""
-        if not self.all_rooms or not self.all_invigilators:
-            return None
-            
-        rooms_needed = (num_students - 1) // self.max_students_per_room + 1
-        if rooms_needed > len(self.all_rooms):
-            return None
-        
-        # Generate date range (only weekdays)
+    @property
+    def coenrollment(self):
+        """Subject x subject shared-student matrix; None without enrolment data"""
+        if not self._coenrollment_loaded:
+            with phase("coenrollment"):
+                self._coenrollment = read_coenrollment(self.db_file)
+            self._coenrollment_loaded = True
+        return self._coenrollment
+
+    def _co_enrolled(self, subject_code):
+        """{subject code: shared students} for subjects sharing students with subject_code"""
+        if self._coenrollment_loaded:
+            return self._coenrollment.neighbours(subject_code) if self._coenrollment is not None else {}
+        # One exam at a time: a lookup per subject beats reading every enrolment
+        if subject_code not in self._co_enrolled_cache:
+            conn = create_connection(self.db_file)
+            if not conn:
+                return {}
+            try:
+                self._co_enrolled_cache[subject_code] = co_enrolled_subjects(conn, subject_code)
+            except sqlite3.Error as e:
+                print(f"Error loading enrollments: {e}")
+                return {}
+            finally:
+                conn.close()
+        return self._co_enrolled_cache[subject_code]
+
+    def _student_clash_slots(self, subject_code):
+        """Booked (date, session) pairs holding an exam that shares students with the subject"""
+        return self.occupancy.slots_of(self._co_enrolled(subject_code))
+
+    def _resource_model(self, dates):
+        """Return the vectorized occupancy model for a date window, building it once"""
+        key = tuple(dates)
+        if key not in self._resource_models:
+            self._resource_models[key] = ResourceModel.from_ledger(
+                self.occupancy, self.all_rooms,
+                [inv['code'] for inv in self.all_invigilators],
+                self.departments, dates, self.sessions
+            )
+        return self._resource_models[key]
+
+    @phase("book")
+    def _book(self, schedule):
+        """Reserve a placed exam in the ledger and every cached resource model"""
+        self.occupancy.book(schedule)
+        self.invigilator_allocator.book(schedule)
+        for model in self._resource_models.values():
+            model.book(schedule)
+
+    def _release(self, schedule):
+        """Undo _book(), e.g. when saving fails"""
+        self.occupancy.release(schedule)
+        self.invigilator_allocator.release(schedule)
+        for model in self._resource_models.values():
+            model.release(schedule)
+
+    @phase("generate_dates")
+    def _generate_dates(self, start_date, end_date):
+        """Generate date range (only weekdays)"""
         dates = []
         current = datetime.strptime(start_date, "%Y-%m-%d")
         end = datetime.strptime(end_date, "%Y-%m-%d")
@@ -180,46 +227,293 @@ class ExamScheduler:
             if current.weekday() < 5:  # Monday-Friday
                 dates.append(current.strftime("%Y-%m-%d"))
             current += timedelta(days=1)
-        
+        return dates
+
+    def schedule_exam(self, subject_code, subject_title, semester, department, num_students, start_date, end_date):
+        """Main scheduling method with all constraints"""
+        if not self.all_rooms or not self.all_invigilators:
+            return None
+            
+        dates = self._generate_dates(start_date, end_date)
         if not dates:
             return None
             
-        # Try to find a valid schedule by checking dates in order
-        for date in dates:
-            for session in self.sessions:
-                # Check if department is available on this date
-                if not self._is_department_available(department, date):
-                    continue
-                    
-                # Get available rooms for this date and session
-                available_rooms = self._get_available_rooms_for_exam(rooms_needed, date, session)
-                if len(available_rooms) < rooms_needed:
-                    continue
-                    
-                # Get available invigilators for this date and session
-                available_invigilators = self._get_available_invigilators_for_exam(rooms_needed, date, session)
-                if len(available_invigilators) < rooms_needed:
-                    continue
-                    
-                # If we get here, we have all required resources
-                return self._format_schedule({
-                    'date': date,
-                    'session': session,
-                    'rooms': available_rooms[:rooms_needed],
-                    'invigilators': available_invigilators[:rooms_needed]
-                }, subject_code, subject_title, semester, department, num_students, rooms_needed)
+        return self._place_exam(subject_code, subject_title, semester, department, num_students, dates)
+
+    def _place_exam(self, subject_code, subject_title, semester, department, num_students, dates,
+                    blocked_slots=(), near=None, slot_order="earliest"):
+        """Place one exam in the first feasible slot and reserve its resources.
+
+        ``blocked_slots`` holds extra (date, session) pairs to skip; a session
+        of None blocks the whole date. With ``near`` set to a (date, session),
+        slots are tried nearest to it first; otherwise ``slot_order`` (one of
+        SLOT_ORDERS) decides which feasible slot is tried first.
+        """
+        # Lower bound from the largest rooms; None means they cannot all be seated
+        rooms_needed = self.room_allocator.rooms_needed(num_students)
+        if rooms_needed is None:
+            return None
+            
+        # Students of this subject already sitting another exam in a slot
+        clashes = self._student_clash_slots(subject_code)
+        if clashes:
+            blocked_slots = clashes.union(blocked_slots)
+            
+        # One vectorized pass finds every slot with a free department day,
+        # enough free rooms and enough invigilators under the daily cap; the
+        # term cap is left to the allocator below
+        with phase("department_check"):
+            model = self._resource_model(dates)
+            slots = model.feasible_slots(department, rooms_needed, rooms_needed, blocked_slots,
+                                         max_per_day=self.max_duties_per_day)
+            origin = model.slot_of(*near) if near else None
+            if origin is not None:
+                slots = sorted(slots, key=lambda slot: abs(int(slot) - origin))
+            elif slot_order == "latest":
+                slots = slots[::-1]
+            elif slot_order == "random":
+                slots = list(slots)
+                self.random.shuffle(slots)
+        for slot in slots:
+            date, session = model.slot_key(slot)
+                
+            # Pack the students into this slot's free rooms by capacity
+            packing = self._get_available_rooms_for_exam(num_students, date, session)
+            if not packing:
+                continue
+                
+            # Get available invigilators for this date and session
+            available_invigilators = self._get_available_invigilators_for_exam(len(packing), date, session)
+            if len(available_invigilators) < len(packing):
+                continue
+                
+            # If we get here, we have all required resources
+            schedule = self._format_schedule({
+                'date': date,
+                'session': session,
+                'rooms': [room for room, _ in packing],
+                'invigilators': available_invigilators[:len(packing)],
+                'student_counts': [students for _, students in packing]
+            }, subject_code, subject_title, semester, department, num_students, len(packing))
+            
+            # Reserve the slot so later placements on this scheduler see it
+            self._book(schedule)
+            return schedule
         
         return None
 
+    def schedule_term(self, subjects, start_date, end_date, order="dsatur", slot_order="earliest",
+                      progress=None):
+        """Schedule a whole batch of subjects in one pass.
+
+        ``subjects`` is a list of dicts with code, title, semester, department
+        and num_students. By default exams are placed in DSatur order over the
+        conflict graph (most constrained first, then largest) instead of
+        submission order, each in its earliest feasible slot. ``order`` and
+        ``slot_order`` pick other strategies from EXAM_ORDERS and SLOT_ORDERS;
+        the random ones draw from the scheduler's seed. ``progress``, if given,
+        is called as progress(done, total) after each exam; it may raise to
+        abandon the run. Returns a dict with the per-subject ``schedules`` and
+        the list of ``unscheduled`` subject codes; nothing is written to the
+        database.
+        """
+        if order not in EXAM_ORDERS or slot_order not in SLOT_ORDERS:
+            raise ValueError(f"Unknown ordering {order!r}/{slot_order!r}")
+        result = {'schedules': {}, 'unscheduled': []}
+        if not subjects:
+            return result
+            
+        dates = self._generate_dates(start_date, end_date)
+        if not self.all_rooms or not self.all_invigilators or not dates:
+            result['unscheduled'] = [subject['code'] for subject in subjects]
+            return result
+            
+        by_code = {subject['code']: subject for subject in subjects}
+        with phase("conflict_graph"):
+            graph = build_conflict_graph(
+                subjects, self.room_allocator.rooms_needed,
+                len(self.all_rooms), len(self.all_invigilators), self.coenrollment
+            )
+        placements = {}
+        
+        def placed_slot(code):
+            return placements.get(code)
+        
+        if order == "dsatur":
+            sequence = dsatur_order(graph, placed_slot, lambda c: by_code[c]['num_students'])
+        elif order == "dsatur_random":
+            # Jitter below 1 only reorders exams of equal size
+            jitter = {code: self.random.random() for code in by_code}
+            sequence = dsatur_order(graph, placed_slot, lambda c: by_code[c]['num_students'] + jitter[c])
+        elif order == "largest":
+            sequence = sorted(by_code, key=lambda c: -by_code[c]['num_students'])
+        else:
+            sequence = list(by_code)
+            self.random.shuffle(sequence)
+            
+        for code in sequence:
+            subject = by_code[code]
+            blocked = set()
+            for neighbour, kind in graph[code].items():
+                if neighbour in placements:
+                    date, session = placements[neighbour]
+                    blocked.add((date, None) if kind == DAY else (date, session))
+                    
+            schedule = self._place_exam(
+                code, subject['title'], subject['semester'], subject['department'],
+                subject['num_students'], dates, blocked, slot_order=slot_order
+            )
+            if schedule:
+                placements[code] = (schedule[0]['date'], schedule[0]['session'])
+                result['schedules'][code] = schedule
+            else:
+                result['unscheduled'].append(code)
+            if progress:
+                progress(len(placements) + len(result['unscheduled']), len(by_code))
+                
+        return result
+
+    def schedule_slot(self, subjects, date, session):
+        """Bulk mode: seat several exams in one (date, session) together.
+
+        ``subjects`` uses the same dicts as schedule_term(). Rooms for the whole
+        batch are packed from the slot's free rooms at once, largest exam
+        first, so big cohorts get the big rooms. Subjects whose department
+        already has an exam that day, that share students or a department with
+        a larger exam in the batch or an exam already in the slot, or that do
+        not fit are returned as unscheduled. Without enrolment data, sharing a
+        semester counts as sharing students. Nothing is written to the database.
+        """
+        result = {'schedules': {}, 'unscheduled': []}
+        if session not in self.sessions or not self.all_rooms or not self.all_invigilators:
+            result['unscheduled'] = [subject['code'] for subject in subjects]
+            return result
+            
+        candidates = {}
+        semesters = set()
+        unenrolled_semesters = set()
+        departments = set()
+        for subject in sorted(subjects, key=lambda s: -s['num_students']):
+            code = subject['code']
+            if self.coenrollment is not None and code in self.coenrollment:
+                clash = (subject['semester'] in unenrolled_semesters
+                         or bool(self.coenrollment.clashes(code, candidates))
+                         or (date, session) in self._student_clash_slots(code))
+            else:
+                clash = subject['semester'] in semesters
+            if (clash or subject['department'] in departments
+                    or not self._is_department_available(subject['department'], date)):
+                result['unscheduled'].append(code)
+                continue
+            semesters.add(subject['semester'])
+            if self.coenrollment is None or code not in self.coenrollment:
+                unenrolled_semesters.add(subject['semester'])
+            departments.add(subject['department'])
+            candidates[code] = subject
+            
+        free_rooms = self.occupancy.free_rooms(self.all_rooms, date, session)
+        packed = self.room_allocator.pack_slot(
+            {code: subject['num_students'] for code, subject in candidates.items()}, free_rooms
+        )
+        for code, subject in candidates.items():
+            packing = packed.get(code)
+            invigilators = self._get_available_invigilators_for_exam(len(packing), date, session) if packing else []
+            if not invigilators:
+                result['unscheduled'].append(code)
+                continue
+            schedule = self._format_schedule({
+                'date': date,
+                'session': session,
+                'rooms': [room for room, _ in packing],
+                'invigilators': invigilators,
+                'student_counts': [students for _, students in packing]
+            }, code, subject['title'], subject['semester'], subject['department'],
+               subject['num_students'], len(packing))
+            self._book(schedule)
+            result['schedules'][code] = schedule
+            
+        return result
+
+    def optimize_term(self, subjects, result, start_date, end_date, time_budget=5.0, seed=None):
+        """Improve a schedule_term() result with local search.
+
+        Runs the anytime optimizer for at most ``time_budget`` seconds, trying
+        to place any unscheduled subjects and to spread same-cohort exams and
+        invigilator duties. If the search cannot re-place an exam that
+        ``result`` had already placed, every exam keeps its original placement
+        and only the newly placed ones that fit are added, so nothing placed
+        is ever lost. Other exams still in conflict are returned as
+        unscheduled, so every returned schedule is safe to save. The occupancy
+        ledger is updated to match the returned timetable.
+        """
+        dates = self._generate_dates(start_date, end_date)
+        if not dates or not self.all_rooms or not self.all_invigilators:
+            return result
+            
+        # Everything outside this batch stays fixed
+        fixed = copy.deepcopy(self.occupancy)
+        for schedule in result['schedules'].values():
+            fixed.release(schedule)
+            
+        by_code = {subject['code']: subject for subject in subjects}
+        unplaced = []
+        for code in result['unscheduled']:
+            subject = by_code[code]
+            # Seat counts from a packing into every room; the optimizer picks the rooms
+            packing = self.room_allocator.pack(subject['num_students'], self.all_rooms)
+            if not packing:
+                continue
+            rows = self._format_schedule({
+                'date': None,
+                'session': None,
+                'rooms': [None] * len(packing),
+                'invigilators': [None] * len(packing),
+                'student_counts': [students for _, students in packing]
+            }, code, subject['title'], subject['semester'], subject['department'],
+               subject['num_students'], len(packing))
+            unplaced.append((subject, rows))
+            
+        optimizer = LocalSearchOptimizer(
+            self.all_rooms, [inv['code'] for inv in self.all_invigilators],
+            dates, self.sessions, fixed=fixed, time_budget=time_budget, seed=seed,
+            capacities=self.room_allocator.capacity, coenrollment=self.coenrollment,
+            max_duties_per_day=self.max_duties_per_day
+        )
+        improved = optimizer.optimize(result['schedules'], unplaced)
+        kept, _ = optimizer.feasible_subset(improved)
+        if any(code not in kept for code in result['schedules']):
+            # Originals go first so the newly placed exams yield to them
+            merged = dict(result['schedules'])
+            merged.update((code, schedule) for code, schedule in kept.items() if code not in merged)
+            fitting, _ = optimizer.feasible_subset(merged)
+            kept = dict(result['schedules'])
+            kept.update((code, schedule) for code, schedule in fitting.items() if code not in kept)
+        
+        for schedule in result['schedules'].values():
+            self._release(schedule)
+        for schedule in kept.values():
+            self._book(schedule)
+            
+        return {
+            'schedules': kept,
+            'unscheduled': [code for code in by_code if code not in kept],
+            'stats': optimizer.stats
+        }
+
+    @phase("format")
     def _format_schedule(self, solution, subject_code, subject_title, semester, department, num_students, rooms_needed):
         """Format the solution into a schedule dictionary"""
         schedule = []
         students_per_room = num_students // rooms_needed
         remaining_students = num_students % rooms_needed
+        student_counts = solution.get('student_counts')
         
         for i in range(rooms_needed):
-            # Distribute students evenly across rooms
-            room_students = students_per_room + (1 if i < remaining_students else 0)
+            if student_counts:
+                room_students = student_counts[i]
+            else:
+                # Distribute students evenly across rooms
+                room_students = students_per_room + (1 if i < remaining_students else 0)
             
             schedule.append({
                 'subject_code': subject_code,
@@ -236,45 +530,142 @@ class ExamScheduler:
 
     def save_schedule(self, schedule):
         """Save schedule to database with transaction"""
+        return self.save_schedules([schedule])
+
+    def _find_conflicts(self, cur, rows):
+        """Check rows about to be inserted against the database and each other.
+
+        Returns a list of human-readable conflicts: a room booked twice in a
+        slot, an invigilator in two rooms at once or over the daily duty cap,
+        a department with two
+        subjects on one day, or enrolled students with two exams in one slot.
+        """
+        dates = sorted({exam['date'] for exam in rows})
+        rooms = defaultdict(set)
+        invigilators = defaultdict(set)   # (date, session) -> invigilators on duty
+        duties = Counter()                # (date, invigilator) -> duties that day
+        departments = defaultdict(set)
+        slot_subjects = defaultdict(set)
+        
+        for start in range(0, len(dates), 500):
+            batch = dates[start:start + 500]
+            cur.execute(f"""
+                SELECT es.date, es.session, es.room_code, es.invigilator_id,
+                       s.department_code, es.subject_code
+                FROM exam_schedule es
+                JOIN subjects s ON es.subject_code = s.code
+                WHERE es.date IN ({",".join("?" * len(batch))})
+            """, batch)
+            for date, session, room, invigilator, department, subject in cur.fetchall():
+                rooms[(date, session)].add(room)
+                invigilators[(date, session)].add(invigilator)
+                duties[(date, invigilator)] += 1
+                departments[(date, department)].add(subject)
+                slot_subjects[(date, session)].add(subject)
+        
+        conflicts = []
+        for exam in rows:
+            date, session = exam['date'], exam['session']
+            if exam['room_code'] in rooms[(date, session)]:
+                conflicts.append(f"Room {exam['room_code']} already booked on {date} {session}")
+            rooms[(date, session)].add(exam['room_code'])
+            
+            invigilator = exam['invigilator_code']
+            if invigilator in invigilators[(date, session)]:
+                conflicts.append(f"Invigilator {invigilator} already on duty on {date} {session}")
+            elif duties[(date, invigilator)] >= self.max_duties_per_day:
+                conflicts.append(f"Invigilator {invigilator} already has {self.max_duties_per_day} "
+                                 f"duties on {date}")
+            invigilators[(date, session)].add(invigilator)
+            duties[(date, invigilator)] += 1
+            
+            subjects = departments[(date, exam['department'])]
+            if subjects - {exam['subject_code']}:
+                conflicts.append(f"Department {exam['department']} already has an exam on {date}")
+            subjects.add(exam['subject_code'])
+            
+            in_slot = slot_subjects[(date, session)]
+            if exam['subject_code'] not in in_slot:
+                clashes = {other: shared for other, shared in self._co_enrolled(exam['subject_code']).items()
+                           if other in in_slot}
+                for other, shared in sorted(clashes.items()):
+                    conflicts.append(f"{shared} students of {exam['subject_code']} also sit {other} on {date} {session}")
+            in_slot.add(exam['subject_code'])
+        return conflicts
+
+    @phase("save")
+    def save_schedules(self, schedules):
+        """Save any number of subject schedules in one all-or-nothing transaction.
+
+        Takes the write lock up front (BEGIN IMMEDIATE), re-checks every row
+        against what other writers may have committed since this scheduler
+        loaded its snapshot, and then inserts subjects and exam slots with
+        executemany. The portal timetables for the saved subjects are
+        refreshed in the same transaction. On any conflict or error nothing
+        is written, the placements are released from the in-memory ledger,
+        the problems are left in ``self.last_conflicts`` and False is
+        returned.
+        """
+        schedules = [schedule for schedule in schedules if schedule]
+        self.last_conflicts = []
+        if not schedules:
+            return True
+            
         conn = create_connection(self.db_file)
         if not conn:
+            for schedule in schedules:
+                self._release(schedule)
             return False
             
+        rows = [exam for schedule in schedules for exam in schedule]
         try:
             cur = conn.cursor()
             
-            # Start transaction
-            cur.execute("BEGIN TRANSACTION")
+            # Start transaction, holding the write lock until commit
+            cur.execute("BEGIN IMMEDIATE")
             
-            # Add subject if new
-            exam = schedule[0]
-            cur.execute("""
+            self.last_conflicts = self._find_conflicts(cur, rows)
+            if self.last_conflicts:
+                raise sqlite3.IntegrityError(
+                    f"{len(self.last_conflicts)} conflicts, first: {self.last_conflicts[0]}"
+                )
+            
+            # Add subjects if new
+            cur.executemany("""
                 INSERT OR IGNORE INTO subjects 
-                (code, title, semester, department_code)
-                VALUES (?, ?, ?, ?)
-            """, (
-                exam['subject_code'], exam['subject_title'],
-                exam['semester'], exam['department']
-            ))
+                (code, title, semester, department_code, num_students)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(
+                schedule[0]['subject_code'], schedule[0]['subject_title'],
+                schedule[0]['semester'], schedule[0]['department'],
+                sum(exam['student_count'] for exam in schedule)
+            ) for schedule in schedules])
             
             # Add all exam slots
-            for exam in schedule:
-                cur.execute("""
-                    INSERT INTO exam_schedule 
-                    (date, session, subject_code, invigilator_id, room_code)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (
-                    exam['date'], exam['session'],
-                    exam['subject_code'], exam['invigilator_code'],
-                    exam['room_code']
-                ))
+            cur.executemany("""
+                INSERT INTO exam_schedule 
+                (date, session, subject_code, invigilator_id, room_code)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(
+                exam['date'], exam['session'],
+                exam['subject_code'], exam['invigilator_code'],
+                exam['room_code']
+            ) for exam in rows])
             
+            # Keep the portal timetables in step, in the same transaction
+            refresh_subjects(conn, [schedule[0]['subject_code'] for schedule in schedules])
+            
+            bump_data_version(conn)
             conn.commit()
             return True
             
         except sqlite3.Error as e:
             conn.rollback()
             print(f"Database error: {e}")
+            if not self.last_conflicts:
+                self.last_conflicts = [str(e)]
+            for schedule in schedules:
+                self._release(schedule)
             return False
         finally:
             conn.close()
@@ -287,14 +678,9 @@ class ExamScheduler:
             
         try:
             cur = conn.cursor()
-            cur.execute("""
-                SELECT es.date, es.session, es.subject_code, s.title as subject_title,
-                       d.name as department, s.semester, 
-                       u.name as invigilator_name, es.room_code
-                FROM exam_schedule es
-                JOIN subjects s ON es.subject_code = s.code
-                JOIN departments d ON s.department_code = d.code
-                JOIN users u ON es.invigilator_id = u.id
+            cur.execute(f"""
+                SELECT {SCHEDULE_COLUMNS}
+                {SCHEDULE_JOINS}
                 ORDER BY es.date, es.session, es.room_code
             """)
             
@@ -307,61 +693,28 @@ class ExamScheduler:
         finally:
             conn.close()
 
-    def export_schedule_to_csv(self):
-        """Export schedule to CSV format"""
-        schedule = self.get_full_schedule()
-        if not schedule:
-            return None
+    def get_schedule_page(self, filters=None, after=None, page_size=50):
+        """Get one keyset-paginated page of the schedule; see fetch_schedule_page"""
+        conn = create_connection(self.db_file)
+        if not conn:
+            return [], None
             
-        df = pd.DataFrame(schedule)
-        return df.to_csv(index=False)
+        try:
+            return fetch_schedule_page(conn, filters, after, page_size)
+        except sqlite3.Error as e:
+            print(f"Error loading schedule page: {e}")
+            return [], None
+        finally:
+            conn.close()
 
-    def export_schedule_to_excel(self):
-        """Export schedule to Excel format"""
-        schedule = self.get_full_schedule()
-        if not schedule:
-            return None
-            
-        df = pd.DataFrame(schedule)
-        return df.to_excel(index=False)
-
-
-def view_schedule(db_file):
-    """View and export the current exam schedule"""
-    st.subheader("Current Exam Schedule")
-    
-    scheduler = ExamScheduler(db_file)
-    schedule = scheduler.get_full_schedule()
-    
-    if schedule:
-        # Display as table
-        df = pd.DataFrame(schedule)
-        st.dataframe(df)
-        
-        # Export options
-        st.subheader("Export Schedule")
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            if st.button("Download as CSV"):
-                csv = scheduler.export_schedule_to_csv()
-                st.download_button(
-                    label="Click to download",
-                    data=csv,
-                    file_name="exam_schedule.csv",
-                    mime="text/csv"
-                )
-        
-        with col2:
-            if st.button("Download as Excel"):
-                excel = scheduler.export_schedule_to_excel()
-                st.download_button(
-                    label="Click to download",
-                    data=excel,
-                    file_name="exam_schedule.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
-    else:
-        st.info("No exams scheduled yet")
+    def export_schedule_to_csv(self):
+        """Export schedule to CSV format; returns the CSV text or None"""
+        return schedule_csv_text(self.db_file)
 
+    def export_schedule_to_excel(self):
+        """Export schedule to Excel format; returns .xlsx bytes or None"""
+        return schedule_xlsx_bytes(self.db_file)
 
+    def export_schedule_snapshot(self, path, fmt="arrow"):
+        """Export schedule as a columnar Arrow/Parquet snapshot; returns rows written"""
+        return write_schedule_snapshot(self.db_file, path, fmt)
@@ -0,0 +1,336 @@
+import argparse
+import csv
+import io
+import os
+import sqlite3
+from itertools import islice
+from database.init_db import create_connection
+from database.data_version import bump_data_version
+
+DEFAULT_CHUNK_SIZE = 1000
+# Keep memory bounded on huge files: only this many row errors are kept
+MAX_REPORTED_ERRORS = 1000
+# Stay well below SQLite's bound-parameter limit in IN (...) lookups
+LOOKUP_BATCH = 500
+
+
+def _required(row, field):
+    value = (row.get(field) or "").strip()
+    if not value:
+        raise ValueError(f"missing {field}")
+    return value
+
+
+def _integer(row, field, minimum=None, maximum=None, required=True):
+    raw = (row.get(field) or "").strip()
+    if not raw:
+        if required:
+            raise ValueError(f"missing {field}")
+        return None
+    try:
+        value = int(raw)
+    except ValueError:
+        raise ValueError(f"{field} must be a whole number, got {raw!r}")
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise ValueError(f"{field} out of range: {value}")
+    return value
+
+
+def _department_row(row):
+    return (_required(row, 'code'), _required(row, 'name'))
+
+
+def _invigilator_row(row):
+    code = _required(row, 'id')
+    # Same rule as the Add Invigilator form
+    if len(code) != 7 or not code.startswith('VS'):
+        raise ValueError("invigilator id must be in VS12345 format (7 characters)")
+    return (code, _required(row, 'name'), _required(row, 'passcode'), "invigilator")
+
+
+def _subject_row(row):
+    return (
+        _required(row, 'code'),
+        _required(row, 'title'),
+        _integer(row, 'semester', 1, 8),
+        _required(row, 'department_code'),
+        _integer(row, 'num_students', minimum=1, required=False),
+    )
+
+
+def _student_row(row):
+    return (
+        _required(row, 'ra_number'),
+        _required(row, 'name'),
+        _required(row, 'department_code'),
+        _integer(row, 'semester', 1, 8),
+    )
+
+
+def _enrollment_row(row):
+    return (_required(row, 'ra_number'), _required(row, 'subject_code'))
+
+
+def _room_row(row):
+    return (
+        _required(row, 'code'),
+        _integer(row, 'floor', minimum=0),
+        _integer(row, 'capacity', minimum=1),
+    )
+
+
+# kind -> how to validate a CSV row and where it goes. "key" is the primary
+# key column (a tuple of the leading columns for a composite key),
+# "references" lists (tuple position, table, column) foreign keys.
+IMPORT_SPECS = {
+    'departments': {
+        'parse': _department_row,
+        'table': 'departments',
+        'columns': ('code', 'name'),
+        'key': 'code',
+        'references': (),
+    },
+    'invigilators': {
+        'parse': _invigilator_row,
+        'table': 'users',
+        'columns': ('id', 'name', 'passcode', 'role'),
+        'key': 'id',
+        'references': (),
+    },
+    'subjects': {
+        'parse': _subject_row,
+        'table': 'subjects',
+        'columns': ('code', 'title', 'semester', 'department_code', 'num_students'),
+        'key': 'code',
+        'references': ((3, 'departments', 'code'),),
+    },
+    'rooms': {
+        'parse': _room_row,
+        'table': 'rooms',
+        'columns': ('code', 'floor', 'capacity'),
+        'key': 'code',
+        'references': (),
+    },
+    'students': {
+        'parse': _student_row,
+        'table': 'students',
+        'columns': ('ra_number', 'name', 'department_code', 'semester'),
+        'key': 'ra_number',
+        'references': ((2, 'departments', 'code'),),
+    },
+    'enrollments': {
+        'parse': _enrollment_row,
+        'table': 'enrollments',
+        'columns': ('ra_number', 'subject_code'),
+        'key': ('ra_number', 'subject_code'),
+        'references': ((0, 'students', 'ra_number'), (1, 'subjects', 'code')),
+    },
+}
+
+
+def _existing_values(conn, table, column, values):
+    """Return the subset of values already present in table.column"""
+    found = set()
+    values = list(values)
+    for start in range(0, len(values), LOOKUP_BATCH):
+        batch = values[start:start + LOOKUP_BATCH]
+        placeholders = ",".join("?" * len(batch))
+        found.update(row[0] for row in conn.execute(
+            f"SELECT {column} FROM {table} WHERE {column} IN ({placeholders})", batch))
+    return found
+
+
+def _existing_keys(conn, table, columns, keys):
+    """Return the subset of composite keys already present in table"""
+    found = set()
+    keys = list(keys)
+    batch_size = LOOKUP_BATCH // len(columns)
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        rows = ",".join([f"({','.join('?' * len(columns))})"] * len(batch))
+        found.update(conn.execute(
+            f"SELECT {', '.join(columns)} FROM {table} WHERE ({', '.join(columns)}) IN (VALUES {rows})",
+            [value for key in batch for value in key]))
+    return found
+
+
+class ImportReport:
+    """Running totals and per-row errors for one import"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.rows_read = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+        self.errors_truncated = False
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+        else:
+            self.errors_truncated = True
+
+    def as_dict(self):
+        return {
+            'kind': self.kind,
+            'rows_read': self.rows_read,
+            'inserted': self.inserted,
+            'failed': self.failed,
+            'errors': list(self.errors),
+            'errors_truncated': self.errors_truncated,
+        }
+
+
+def _import_chunk(conn, spec, chunk, report):
+    """Validate and insert one chunk of (line number, csv row) pairs"""
+    parsed = []
+    for line, row in chunk:
+        try:
+            parsed.append((line, spec['parse'](row)))
+        except ValueError as e:
+            report.error(line, str(e))
+
+    # Reject keys already in the database or repeated within the chunk
+    if isinstance(spec['key'], tuple):
+        keys = [tuple(values[:len(spec['key'])]) for _, values in parsed]
+        existing = _existing_keys(conn, spec['table'], spec['key'], set(keys))
+    else:
+        keys = [values[0] for _, values in parsed]
+        existing = _existing_values(conn, spec['table'], spec['key'], set(keys))
+    seen = set()
+    candidates = []
+    for (line, values), key in zip(parsed, keys):
+        if key in existing or key in seen:
+            report.error(line, f"{spec['key']} {key!r} already exists")
+        else:
+            seen.add(key)
+            candidates.append((line, values))
+
+    for position, table, column in spec['references']:
+        present = _existing_values(conn, table, column, {values[position] for _, values in candidates})
+        kept = []
+        for line, values in candidates:
+            if values[position] in present:
+                kept.append((line, values))
+            else:
+                report.error(line, f"unknown {table[:-1]} {values[position]!r}")
+        candidates = kept
+
+    if not candidates:
+        return
+
+    placeholders = ",".join("?" * len(spec['columns']))
+    sql = f"INSERT INTO {spec['table']} ({', '.join(spec['columns'])}) VALUES ({placeholders})"
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(sql, [values for _, values in candidates])
+        bump_data_version(conn)
+        conn.commit()
+        report.inserted += len(candidates)
+        return
+    except sqlite3.IntegrityError:
+        # Someone else wrote a clashing row after our checks; redo the chunk
+        # row by row so only the offending rows fail
+        conn.rollback()
+
+    conn.execute("BEGIN IMMEDIATE")
+    inserted = 0
+    for line, values in candidates:
+        conn.execute("SAVEPOINT import_row")
+        try:
+            conn.execute(sql, values)
+            conn.execute("RELEASE import_row")
+            inserted += 1
+        except sqlite3.IntegrityError as e:
+            conn.execute("ROLLBACK TO import_row")
+            conn.execute("RELEASE import_row")
+            report.error(line, str(e))
+    bump_data_version(conn)
+    conn.commit()
+    report.inserted += inserted
+
+
+def import_csv(db_file, kind, source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream a CSV file into one table, committing once per chunk.
+
+    ``source`` is a path or a file object (text or binary). Rows are read,
+    validated and inserted ``chunk_size`` at a time, so memory does not grow
+    with the file. Invalid rows are reported and skipped; they never abort
+    the rest of the import. Returns the report as a dict.
+
+    Expected columns per kind:
+      departments:  code, name
+      invigilators: id, name, passcode
+      subjects:     code, title, semester, department_code[, num_students]
+      rooms:        code, floor, capacity
+      students:     ra_number, name, department_code, semester
+      enrollments:  ra_number, subject_code
+    """
+    if kind not in IMPORT_SPECS:
+        raise ValueError(f"Unknown import kind {kind!r}; expected one of {', '.join(IMPORT_SPECS)}")
+    spec = IMPORT_SPECS[kind]
+    report = ImportReport(kind)
+
+    if isinstance(source, (str, os.PathLike)):
+        handle = open(source, newline="", encoding="utf-8-sig")
+    elif isinstance(source, io.TextIOBase):
+        handle = source
+    else:
+        handle = io.TextIOWrapper(source, newline="", encoding="utf-8-sig")
+
+    conn = create_connection(db_file)
+    try:
+        if not conn:
+            report.error(0, "could not connect to database")
+            return report.as_dict()
+
+        reader = csv.DictReader(handle)
+        if reader.fieldnames:
+            reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+        # Line numbers count the header as line 1, like a spreadsheet
+        numbered = ((reader.line_num, row) for row in reader)
+        while True:
+            chunk = list(islice(numbered, chunk_size))
+            if not chunk:
+                break
+            report.rows_read += len(chunk)
+            try:
+                _import_chunk(conn, spec, chunk, report)
+            except sqlite3.Error as e:
+                conn.rollback()
+                report.error(chunk[0][0], f"database error, lines {chunk[0][0]}-{chunk[-1][0]} not imported: {e}")
+    finally:
+        if conn:
+            conn.close()
+        if isinstance(source, (str, os.PathLike)):
+            handle.close()
+        elif handle is not source:
+            handle.detach()  # leave the caller's binary file open
+
+    return report.as_dict()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Bulk import departments, invigilators, subjects, rooms, students or enrollments from CSV. "
+                    "Run from the exam_scheduler directory: python -m database.bulk_import"
+    )
+    parser.add_argument("kind", choices=sorted(IMPORT_SPECS))
+    parser.add_argument("csv_file")
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "exam_scheduler.db"))
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    report = import_csv(args.db, args.kind, args.csv_file, args.chunk_size)
+    print(f"Read {report['rows_read']} rows: {report['inserted']} inserted, {report['failed']} failed")
+    for line, message in report['errors']:
+        print(f"  line {line}: {message}")
+    if report['errors_truncated']:
+        print(f"  ... only the first {MAX_REPORTED_ERRORS} errors are shown")
+    return 0 if report['failed'] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
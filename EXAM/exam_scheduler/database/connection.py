@@ -0,0 +1,170 @@
+import atexit
+import os
+import sqlite3
+import threading
+from database.instrumentation import TimedCursor, current_recorder
+
+# Applied once to every new connection. WAL lets readers (student and
+# invigilator portals) keep reading while the admin portal writes.
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",     # 16 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",   # 256 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+)
+# Size of sqlite3's per-connection prepared statement cache
+STATEMENT_CACHE_SIZE = 256
+# Seconds a writer waits for a lock before raising "database is locked"
+BUSY_TIMEOUT = 30
+MAX_IDLE_CONNECTIONS = 8
+
+# Called with the text of every statement run on a pooled connection
+_statement_tracer = None
+
+
+class PooledConnection:
+    """Proxy around a pooled sqlite3 connection.
+
+    Behaves like a normal connection, except that close() hands it back to
+    the pool (rolling back anything left uncommitted) instead of closing it.
+    While a database.instrumentation recording is active on the calling
+    thread, cursors are wrapped so every statement is timed.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def _live(self):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return self._conn
+
+    def __getattr__(self, name):
+        return getattr(self._live(), name)
+
+    def cursor(self, *args):
+        cursor = self._live().cursor(*args)
+        recorder = current_recorder()
+        return TimedCursor(cursor, recorder) if recorder else cursor
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._conn.commit()
+        else:
+            self._conn.rollback()
+        return False
+
+
+class ConnectionPool:
+    """Reusable connections to one database file, shared across threads"""
+
+    def __init__(self, db_file, max_idle=MAX_IDLE_CONNECTIONS):
+        self.db_file = db_file
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self._wal_checked = False
+        self._closed = False
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=BUSY_TIMEOUT,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        if not self._wal_checked and self.db_file != ":memory:":
+            # journal_mode is persistent, so this only does work the first time
+            conn.execute("PRAGMA journal_mode = WAL")
+            self._wal_checked = True
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect()
+        conn.set_trace_callback(_statement_tracer)
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+        with self._lock:
+            if not self._closed and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_key(db_file):
+    return db_file if db_file == ":memory:" else os.path.abspath(db_file)
+
+
+def get_connection(db_file):
+    """Borrow a connection for db_file from its pool; close() returns it"""
+    key = _pool_key(db_file)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(db_file)
+    return pool.acquire()
+
+
+def set_statement_tracer(callback):
+    """Install callback(sql) on connections handed out from now on; None removes it"""
+    global _statement_tracer
+    _statement_tracer = callback
+
+
+def close_pool(db_file):
+    """Close idle connections for one database, e.g. before deleting the file"""
+    with _pools_lock:
+        pool = _pools.pop(_pool_key(db_file), None)
+    if pool:
+        pool.close()
+
+
+def close_all():
+    """Close every idle pooled connection; registered to run at exit"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+atexit.register(close_all)
@@ -0,0 +1,27 @@
+import sqlite3
+from database.init_db import create_connection
+
+
+def get_data_version(db_file):
+    """Return the current data version; it only ever increases"""
+    conn = create_connection(db_file)
+    if not conn:
+        return 0
+    try:
+        row = conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()
+        return row[0] if row else 0
+    except sqlite3.Error as e:
+        print(f"Error reading data version: {e}")
+        return 0
+    finally:
+        conn.close()
+
+
+def bump_data_version(conn):
+    """Advance the data version inside the caller's open transaction.
+
+    Call this from every write path that changes what the portals display,
+    before committing, so cached reads keyed on the old version are dropped
+    exactly when the write becomes visible.
+    """
+    conn.execute("UPDATE data_version SET version = version + 1 WHERE id = 1")
@@ -1,5 +1,7 @@
 import sqlite3
 import os
+from database.connection import close_pool
+from database.migrations import migrate
 
 def force_reset_database(db_path):
     """Completely wipe and recreate the database"""
@@ -8,10 +10,14 @@ def force_reset_database(db_path):
         # Ensure database directory exists
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         
-        # Close any existing connections and delete file
+        # Close any existing connections and delete file (plus WAL side files)
+        close_pool(db_path)
         if os.path.exists(db_path):
             os.remove(db_path)
             print(f"Deleted existing database file: {db_path}")
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
         
         # Recreate database
         conn = sqlite3.connect(db_path)
@@ -76,6 +82,9 @@ def force_reset_database(db_path):
                      (room, floor, 30))
         
         conn.commit()
+        
+        # Record the schema version and add indexes
+        migrate(conn)
         print("Database successfully reset with clean structure")
         
     except Exception as e:
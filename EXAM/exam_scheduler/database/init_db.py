@@ -1,15 +1,18 @@
 import sqlite3
 from sqlite3 import Error
 import os
+from database.connection import get_connection
+from database.migrations import migrate
 
 def create_connection(db_file):
-    """Create a database connection to a SQLite database"""
-    conn = None
+    """Get a pooled connection to a SQLite database.
+
+    Connections come from database.connection and are already configured
+    (WAL, foreign keys, cache pragmas); calling close() returns them to the
+    pool instead of closing them.
+    """
     try:
-        conn = sqlite3.connect(db_file)
-        # Enable foreign key constraints
-        conn.execute("PRAGMA foreign_keys = ON")
-        return conn
+        return get_connection(db_file)
     except Error as e:
         print(f"Database connection error: {e}")
         return None
@@ -21,44 +24,8 @@ def initialize_db(db_file):
         try:
             c = conn.cursor()
             
-            # Create tables if they don't exist
-            c.execute("""CREATE TABLE IF NOT EXISTS users (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                passcode TEXT NOT NULL,
-                role TEXT NOT NULL
-            )""")
-            
-            c.execute("""CREATE TABLE IF NOT EXISTS departments (
-                code TEXT PRIMARY KEY,
-                name TEXT NOT NULL
-            )""")
-            
-            c.execute("""CREATE TABLE IF NOT EXISTS subjects (
-                code TEXT PRIMARY KEY,
-                title TEXT NOT NULL,
-                semester INTEGER NOT NULL,
-                department_code TEXT NOT NULL,
-                FOREIGN KEY (department_code) REFERENCES departments(code)
-            )""")
-            
-            c.execute("""CREATE TABLE IF NOT EXISTS rooms (
-                code TEXT PRIMARY KEY,
-                floor INTEGER NOT NULL,
-                capacity INTEGER NOT NULL DEFAULT 30
-            )""")
-            
-            c.execute("""CREATE TABLE IF NOT EXISTS exam_schedule (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL,
-                session TEXT NOT NULL,
-                subject_code TEXT NOT NULL,
-                invigilator_id TEXT NOT NULL,
-                room_code TEXT NOT NULL,
-                FOREIGN KEY (subject_code) REFERENCES subjects(code),
-                FOREIGN KEY (invigilator_id) REFERENCES users(id),
-                FOREIGN KEY (room_code) REFERENCES rooms(code)
-            )""")
+            # Create tables and indexes through the versioned migrations
+            migrate(conn)
             
             # Insert default admin if not exists
             c.execute("""INSERT OR IGNORE INTO users 
@@ -0,0 +1,141 @@
+import cProfile
+import io
+import json
+import pstats
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Functions listed in a captured cProfile report
+PROFILE_LINES = 40
+
+_local = threading.local()
+
+
+class Recorder:
+    """Timings collected while a recording() block is active on one thread"""
+
+    def __init__(self):
+        self.queries = {}  # normalized SQL -> [calls, seconds]
+        self.phases = {}   # phase name -> [calls, seconds]
+        self.profile = None
+        self.started = time.perf_counter()
+        self.seconds = None
+
+    def record_query(self, sql, seconds, calls=1):
+        entry = self.queries.setdefault(" ".join(sql.split()), [0, 0.0])
+        entry[0] += calls
+        entry[1] += seconds
+
+    def record_phase(self, name, seconds):
+        entry = self.phases.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def as_dict(self):
+        queries = sorted(self.queries.items(), key=lambda item: -item[1][1])
+        return {
+            'seconds': round(self.seconds if self.seconds is not None else time.perf_counter() - self.started, 6),
+            'phases': {name: {'calls': calls, 'seconds': round(seconds, 6)}
+                       for name, (calls, seconds) in self.phases.items()},
+            'query_count': sum(calls for calls, _ in self.queries.values()),
+            'query_seconds': round(sum(seconds for _, seconds in self.queries.values()), 6),
+            'queries': [{'sql': sql, 'calls': calls, 'seconds': round(seconds, 6)}
+                        for sql, (calls, seconds) in queries],
+            'profile': self.profile,
+        }
+
+    def to_json(self):
+        return json.dumps(self.as_dict(), indent=2)
+
+
+def current_recorder():
+    """The recorder active on this thread, or None when nothing is being recorded"""
+    return getattr(_local, 'recorder', None)
+
+
+@contextmanager
+def recording(profile=False):
+    """Record query and phase timings for everything run in the block on this thread.
+
+    With profile=True the block also runs under cProfile and the top
+    functions by cumulative time are kept as text in recorder.profile.
+    """
+    recorder = Recorder()
+    previous = current_recorder()
+    _local.recorder = recorder
+    profiler = cProfile.Profile() if profile else None
+    if profiler:
+        profiler.enable()
+    try:
+        yield recorder
+    finally:
+        if profiler:
+            profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+            # Drop the absolute path prefix so the report stays readable
+            recorder.profile = re.sub(r"\S*[/\\](exam_scheduler[/\\])", r"\1", out.getvalue())
+        recorder.seconds = time.perf_counter() - recorder.started
+        _local.recorder = previous
+
+
+@contextmanager
+def phase(name):
+    """Time a named step of a request; a no-op unless recording"""
+    recorder = current_recorder()
+    if recorder is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.record_phase(name, time.perf_counter() - start)
+
+
+class TimedCursor:
+    """sqlite3 cursor proxy that reports statement and fetch time to a recorder"""
+
+    def __init__(self, cursor, recorder):
+        self._cursor = cursor
+        self._recorder = recorder
+        self._sql = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _timed(self, calls, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._recorder.record_query(self._sql or "", time.perf_counter() - start, calls)
+
+    def execute(self, sql, parameters=()):
+        self._sql = sql
+        self._timed(1, self._cursor.execute, sql, parameters)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._sql = sql
+        self._timed(1, self._cursor.executemany, sql, seq_of_parameters)
+        return self
+
+    # Fetch time is added to the statement that produced the rows
+    def fetchone(self):
+        return self._timed(0, self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._timed(0, self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._timed(0, self._cursor.fetchall)
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
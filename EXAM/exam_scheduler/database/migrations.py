@@ -0,0 +1,329 @@
+import argparse
+import os
+import sqlite3
+
+
+class MigrationError(Exception):
+    """A schema step failed; the database is left at the last good version"""
+
+
+def _set_aside_double_bookings(conn):
+    """Move rows that double-book a room or an invigilator into exam_schedule_conflicts.
+
+    Older versions could book one room or one invigilator twice in a slot,
+    which would stop the unique indexes of step 2 from being built. The
+    earliest row of each clash stays; the rest are kept for review.
+    """
+    conn.execute("""CREATE TABLE IF NOT EXISTS exam_schedule_conflicts (
+        id INTEGER PRIMARY KEY,
+        date TEXT NOT NULL,
+        session TEXT NOT NULL,
+        subject_code TEXT NOT NULL,
+        invigilator_id TEXT NOT NULL,
+        room_code TEXT NOT NULL,
+        reason TEXT NOT NULL,
+        set_aside_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )""")
+    for column, reason in (("room_code", "room double-booked"), ("invigilator_id", "invigilator double-booked")):
+        ids = [(row[0],) for row in conn.execute(f"""
+            SELECT id FROM exam_schedule
+            WHERE id NOT IN (SELECT MIN(id) FROM exam_schedule GROUP BY date, session, {column})
+        """)]
+        if not ids:
+            continue
+        conn.executemany("""
+            INSERT INTO exam_schedule_conflicts (id, date, session, subject_code, invigilator_id, room_code, reason)
+            SELECT id, date, session, subject_code, invigilator_id, room_code, ?
+            FROM exam_schedule WHERE id = ?
+        """, [(reason, row_id) for (row_id,) in ids])
+        conn.executemany("DELETE FROM exam_schedule WHERE id = ?", ids)
+        print(f"Set aside {len(ids)} exam rows ({reason}) in exam_schedule_conflicts; please review them")
+
+
+# Ordered schema steps. Each entry is (version, description, statements);
+# a statement is SQL or a function called with the connection. A database
+# at version N has had every step up to and including N applied.
+# Never edit a released step - append a new one instead.
+MIGRATIONS = [
+    (1, "Base tables", [
+        """CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            passcode TEXT NOT NULL,
+            role TEXT NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS departments (
+            code TEXT PRIMARY KEY,
+            name TEXT NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS subjects (
+            code TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            semester INTEGER NOT NULL,
+            department_code TEXT NOT NULL,
+            FOREIGN KEY (department_code) REFERENCES departments(code)
+        )""",
+        """CREATE TABLE IF NOT EXISTS rooms (
+            code TEXT PRIMARY KEY,
+            floor INTEGER NOT NULL,
+            capacity INTEGER NOT NULL DEFAULT 30
+        )""",
+        """CREATE TABLE IF NOT EXISTS exam_schedule (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            session TEXT NOT NULL,
+            subject_code TEXT NOT NULL,
+            invigilator_id TEXT NOT NULL,
+            room_code TEXT NOT NULL,
+            FOREIGN KEY (subject_code) REFERENCES subjects(code),
+            FOREIGN KEY (invigilator_id) REFERENCES users(id),
+            FOREIGN KEY (room_code) REFERENCES rooms(code)
+        )""",
+        """CREATE TABLE IF NOT EXISTS students (
+            ra_number TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            department_code TEXT NOT NULL,
+            semester INTEGER NOT NULL,
+            FOREIGN KEY (department_code) REFERENCES departments(code)
+        )""",
+    ]),
+    (2, "Hot-path indexes and double-booking guards", [
+        # Added after release; a no-op on any database that already passed
+        # this step, since the indexes below rule out double bookings
+        _set_aside_double_bookings,
+        # Room availability per slot and keyset order for schedule listings
+        """CREATE UNIQUE INDEX IF NOT EXISTS idx_exam_schedule_slot_room
+           ON exam_schedule (date, session, room_code)""",
+        # An invigilator can only be in one room per slot
+        """CREATE UNIQUE INDEX IF NOT EXISTS idx_exam_schedule_slot_invigilator
+           ON exam_schedule (date, session, invigilator_id)""",
+        # Invigilator portal: assignments for one invigilator in date order
+        """CREATE INDEX IF NOT EXISTS idx_exam_schedule_invigilator
+           ON exam_schedule (invigilator_id, date, session, subject_code, room_code)""",
+        # Joins from schedule rows to subjects, and per-subject lookups
+        """CREATE INDEX IF NOT EXISTS idx_exam_schedule_subject
+           ON exam_schedule (subject_code, date, session)""",
+        # Department-per-day checks and the student portal filter
+        """CREATE INDEX IF NOT EXISTS idx_subjects_department
+           ON subjects (department_code, semester, code)""",
+        """CREATE INDEX IF NOT EXISTS idx_users_role
+           ON users (role, id)""",
+    ]),
+    (3, "Data version counter for read caches", [
+        """CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )""",
+        "INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)",
+    ]),
+    (4, "Expected student count per subject", [
+        "ALTER TABLE subjects ADD COLUMN num_students INTEGER",
+    ]),
+    (5, "Background scheduling jobs", [
+        # params and result are JSON; progress runs from 0 to 1
+        """CREATE TABLE IF NOT EXISTS scheduling_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            params TEXT NOT NULL,
+            progress REAL NOT NULL DEFAULT 0,
+            message TEXT,
+            result TEXT,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            submitted_by TEXT,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            started_at TEXT,
+            finished_at TEXT,
+            heartbeat_at TEXT
+        )""",
+        # Workers claim the oldest queued job
+        """CREATE INDEX IF NOT EXISTS idx_scheduling_jobs_status
+           ON scheduling_jobs (status, id)""",
+    ]),
+    (6, "Student enrolments", [
+        """CREATE TABLE IF NOT EXISTS enrollments (
+            ra_number TEXT NOT NULL,
+            subject_code TEXT NOT NULL,
+            PRIMARY KEY (ra_number, subject_code),
+            FOREIGN KEY (ra_number) REFERENCES students(ra_number),
+            FOREIGN KEY (subject_code) REFERENCES subjects(code)
+        ) WITHOUT ROWID""",
+        # Students of one subject, e.g. for enrolment counts and portals
+        """CREATE INDEX IF NOT EXISTS idx_enrollments_subject
+           ON enrollments (subject_code, ra_number)""",
+    ]),
+    (7, "Precomputed portal timetables", [
+        # Student portal: one row per exam room, read by (department, semester)
+        """CREATE TABLE IF NOT EXISTS cohort_timetable (
+            department_code TEXT NOT NULL,
+            semester INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            session TEXT NOT NULL,
+            subject_code TEXT NOT NULL,
+            room_code TEXT NOT NULL,
+            department_name TEXT NOT NULL,
+            subject_title TEXT NOT NULL,
+            PRIMARY KEY (department_code, semester, date, session, subject_code, room_code)
+        ) WITHOUT ROWID""",
+        # Invigilator portal: one row per duty, read by invigilator
+        """CREATE TABLE IF NOT EXISTS invigilator_timetable (
+            invigilator_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            session TEXT NOT NULL,
+            subject_code TEXT NOT NULL,
+            room_code TEXT NOT NULL,
+            subject_title TEXT NOT NULL,
+            PRIMARY KEY (invigilator_id, date, session)
+        ) WITHOUT ROWID""",
+        # Writers refresh both tables one subject at a time
+        """CREATE INDEX IF NOT EXISTS idx_cohort_timetable_subject
+           ON cohort_timetable (subject_code)""",
+        """CREATE INDEX IF NOT EXISTS idx_invigilator_timetable_subject
+           ON invigilator_timetable (subject_code)""",
+        """INSERT OR REPLACE INTO cohort_timetable
+           SELECT s.department_code, s.semester, es.date, es.session, es.subject_code,
+                  es.room_code, d.name, s.title
+           FROM exam_schedule es
+           JOIN subjects s ON es.subject_code = s.code
+           JOIN departments d ON s.department_code = d.code""",
+        """INSERT OR REPLACE INTO invigilator_timetable
+           SELECT es.invigilator_id, es.date, es.session, es.subject_code, es.room_code, s.title
+           FROM exam_schedule es
+           JOIN subjects s ON es.subject_code = s.code""",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# Queries on the hot path, with the indexes any of which may serve them.
+# A plan passes when it names one of them and never full-scans a table.
+HOT_QUERIES = [
+    ("rooms booked in a slot",
+     "SELECT room_code FROM exam_schedule WHERE date = ? AND session = ?",
+     ("2025-05-01", "FN"),
+     ("idx_exam_schedule_slot_room",)),
+    ("department exams on a date",
+     """SELECT COUNT(*) FROM exam_schedule es
+        JOIN subjects s ON es.subject_code = s.code
+        WHERE s.department_code = ? AND es.date = ?""",
+     ("ECE", "2025-05-01"),
+     ("idx_exam_schedule_slot_room", "idx_exam_schedule_slot_invigilator",
+      "idx_subjects_department")),
+    ("invigilator assignments",
+     """SELECT date, session, subject_code, subject_title, room_code
+        FROM invigilator_timetable
+        WHERE invigilator_id = ?
+        ORDER BY date, session""",
+     ("VS12345",),
+     ("PRIMARY KEY",)),
+    ("student schedule",
+     """SELECT date, session, department_name, subject_code, subject_title, semester, room_code
+        FROM cohort_timetable
+        WHERE department_code = ? AND semester = ?
+        ORDER BY date, session, subject_code, room_code""",
+     ("ECE", 4),
+     ("PRIMARY KEY",)),
+    ("timetable refresh",
+     "DELETE FROM cohort_timetable WHERE subject_code IN (?)",
+     ("21ECE208J",),
+     ("idx_cohort_timetable_subject",)),
+]
+
+
+def get_schema_version(conn):
+    """Return the applied schema version, 0 for a database never migrated"""
+    conn.execute("""CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER NOT NULL,
+        description TEXT NOT NULL,
+        applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )""")
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def is_up_to_date(conn):
+    """True when every migration has been applied; only reads, unlike get_schema_version()"""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'").fetchone():
+        return False
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return (row[0] or 0) >= LATEST_VERSION
+
+
+def migrate(conn):
+    """Apply every pending migration, each in its own transaction.
+
+    Returns the resulting schema version. The version is re-read after
+    taking the write lock, so concurrent processes never apply a step twice.
+    A failing step is rolled back and raises MigrationError, leaving the
+    database at the last good version.
+    """
+    version = get_schema_version(conn)
+    conn.commit()
+    for step_version, description, statements in MIGRATIONS:
+        if step_version <= version:
+            continue
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] or 0
+            if step_version <= version:
+                conn.commit()
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (step_version, description)
+            )
+            conn.commit()
+            version = step_version
+        except sqlite3.Error as e:
+            conn.rollback()
+            raise MigrationError(f"Migration {step_version} ({description}) failed: {e}") from e
+    return version
+
+
+def explain_hot_queries(conn):
+    """Return {query name: (plan detail lines, uses expected index)}"""
+    report = {}
+    for name, sql, params, indexes in HOT_QUERIES:
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        uses_index = any(index in line for line in plan for index in indexes)
+        full_scan = any(line.startswith("SCAN ") for line in plan)
+        report[name] = (plan, uses_index and not full_scan)
+    return report
+
+
+def check_hot_query_plans(conn):
+    """Raise AssertionError if any hot query is not served by its index"""
+    missing = {name: plan for name, (plan, ok) in explain_hot_queries(conn).items() if not ok}
+    assert not missing, f"Hot queries not using their index: {missing}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Upgrade the schema and check the hot query plans. "
+                    "Run from the exam_scheduler directory: python -m database.migrations"
+    )
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "exam_scheduler.db"))
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        try:
+            print(f"Schema version: {migrate(conn)}")
+        except MigrationError as e:
+            print(e)
+            return 1
+        for name, (plan, ok) in explain_hot_queries(conn).items():
+            print(f"{'OK  ' if ok else 'SCAN'} {name}: {' / '.join(plan)}")
+        check_hot_query_plans(conn)
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
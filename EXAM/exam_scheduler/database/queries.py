@@ -0,0 +1,72 @@
+# Shared read queries used by both the scheduler and the portals
+
+SCHEDULE_COLUMNS = """
+    es.date, es.session, es.subject_code, s.title as subject_title,
+    d.name as department, s.semester,
+    u.name as invigilator_name, es.room_code
+"""
+
+SCHEDULE_JOINS = """
+    FROM exam_schedule es
+    JOIN subjects s ON es.subject_code = s.code
+    JOIN departments d ON s.department_code = d.code
+    JOIN users u ON es.invigilator_id = u.id
+"""
+
+
+def schedule_filter_clause(filters):
+    """Build a WHERE clause and parameters from a schedule filter dict.
+
+    Recognised keys (all optional): department (code), semester,
+    date_from, date_to (inclusive, YYYY-MM-DD) and invigilator (id).
+    """
+    clauses = []
+    params = []
+    filters = filters or {}
+    if filters.get('department'):
+        clauses.append("s.department_code = ?")
+        params.append(filters['department'])
+    if filters.get('semester'):
+        clauses.append("s.semester = ?")
+        params.append(filters['semester'])
+    if filters.get('date_from'):
+        clauses.append("es.date >= ?")
+        params.append(filters['date_from'])
+    if filters.get('date_to'):
+        clauses.append("es.date <= ?")
+        params.append(filters['date_to'])
+    if filters.get('invigilator'):
+        clauses.append("es.invigilator_id = ?")
+        params.append(filters['invigilator'])
+    return clauses, params
+
+
+def fetch_schedule_page(conn, filters=None, after=None, page_size=50):
+    """Fetch one page of the schedule in (date, session, room_code) order.
+
+    ``after`` is the keyset cursor returned with the previous page (None for
+    the first page). Returns (rows as dicts, cursor for the next page or
+    None when this is the last page).
+    """
+    clauses, params = schedule_filter_clause(filters)
+    if after:
+        clauses.append("(es.date, es.session, es.room_code) > (?, ?, ?)")
+        params.extend(after)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT {SCHEDULE_COLUMNS}
+        {SCHEDULE_JOINS}
+        {where}
+        ORDER BY es.date, es.session, es.room_code
+        LIMIT ?
+    """, (*params, page_size + 1))
+
+    columns = [col[0] for col in cur.description]
+    rows = [dict(zip(columns, row)) for row in cur.fetchall()]
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, (last['date'], last['session'], last['room_code'])
@@ -0,0 +1,133 @@
+import argparse
+import os
+import sqlite3
+
+# Precomputed portal timetables. Each row is one exam_schedule row joined
+# with its subject (and department), stored under the key the portal reads
+# by, so a portal page is one primary-key range scan. Writers that change
+# exam_schedule call refresh_subjects() in the same transaction.
+
+COHORT_COLUMNS = "department_code, semester, date, session, subject_code, room_code, department_name, subject_title"
+COHORT_SELECT = """
+    SELECT s.department_code, s.semester, es.date, es.session, es.subject_code,
+           es.room_code, d.name, s.title
+    FROM exam_schedule es
+    JOIN subjects s ON es.subject_code = s.code
+    JOIN departments d ON s.department_code = d.code
+"""
+
+INVIGILATOR_COLUMNS = "invigilator_id, date, session, subject_code, room_code, subject_title"
+INVIGILATOR_SELECT = """
+    SELECT es.invigilator_id, es.date, es.session, es.subject_code, es.room_code, s.title
+    FROM exam_schedule es
+    JOIN subjects s ON es.subject_code = s.code
+"""
+
+# Stay well below SQLite's bound-parameter limit in IN (...) lists
+REFRESH_BATCH = 500
+
+
+def refresh_subjects(conn, subject_codes):
+    """Recompute both timetables for the given subjects inside the caller's transaction"""
+    codes = sorted(set(subject_codes))
+    for start in range(0, len(codes), REFRESH_BATCH):
+        batch = codes[start:start + REFRESH_BATCH]
+        placeholders = ",".join("?" * len(batch))
+        conn.execute(f"DELETE FROM cohort_timetable WHERE subject_code IN ({placeholders})", batch)
+        conn.execute(f"DELETE FROM invigilator_timetable WHERE subject_code IN ({placeholders})", batch)
+        conn.execute(f"""
+            INSERT INTO cohort_timetable ({COHORT_COLUMNS})
+            {COHORT_SELECT} WHERE es.subject_code IN ({placeholders})
+        """, batch)
+        conn.execute(f"""
+            INSERT INTO invigilator_timetable ({INVIGILATOR_COLUMNS})
+            {INVIGILATOR_SELECT} WHERE es.subject_code IN ({placeholders})
+        """, batch)
+
+
+def rebuild_timetables(conn):
+    """Recompute both timetables from scratch inside the caller's transaction"""
+    conn.execute("DELETE FROM cohort_timetable")
+    conn.execute("DELETE FROM invigilator_timetable")
+    conn.execute(f"INSERT INTO cohort_timetable ({COHORT_COLUMNS}) {COHORT_SELECT}")
+    conn.execute(f"INSERT INTO invigilator_timetable ({INVIGILATOR_COLUMNS}) {INVIGILATOR_SELECT}")
+
+
+def check_timetables(conn, limit=20):
+    """Compare both timetables with the base tables.
+
+    Returns {table: {'missing': rows only in the base tables, 'stale': rows
+    only in the timetable}}, with up to ``limit`` example rows each; empty
+    lists everywhere mean the timetables are consistent.
+    """
+    report = {}
+    for table, columns, select in (("cohort_timetable", COHORT_COLUMNS, COHORT_SELECT),
+                                   ("invigilator_timetable", INVIGILATOR_COLUMNS, INVIGILATOR_SELECT)):
+        report[table] = {
+            'missing': conn.execute(f"{select} EXCEPT SELECT {columns} FROM {table} LIMIT ?", (limit,)).fetchall(),
+            'stale': conn.execute(f"SELECT {columns} FROM {table} EXCEPT {select} LIMIT ?", (limit,)).fetchall(),
+        }
+    return report
+
+
+def is_consistent(report):
+    return not any(rows for table in report.values() for rows in table.values())
+
+
+def fetch_cohort_timetable(conn, dept_code, semester):
+    """Exams for one department and semester, in date/session order"""
+    return conn.execute("""
+        SELECT date, session, department_name, subject_code, subject_title, semester, room_code
+        FROM cohort_timetable
+        WHERE department_code = ? AND semester = ?
+        ORDER BY date, session, subject_code, room_code
+    """, (dept_code, semester)).fetchall()
+
+
+def fetch_invigilator_timetable(conn, invigilator_id):
+    """Duties of one invigilator, in date/session order"""
+    return conn.execute("""
+        SELECT date, session, subject_code, subject_title, room_code
+        FROM invigilator_timetable
+        WHERE invigilator_id = ?
+        ORDER BY date, session
+    """, (invigilator_id,)).fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check or rebuild the portal timetables. "
+                    "Run from the exam_scheduler directory: python -m database.timetables"
+    )
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "exam_scheduler.db"))
+    parser.add_argument("--rebuild", action="store_true", help="rebuild both timetables before checking")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.rebuild:
+            conn.execute("BEGIN IMMEDIATE")
+            rebuild_timetables(conn)
+            conn.commit()
+            print("Timetables rebuilt")
+        report = check_timetables(conn)
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"Error checking timetables: {e}")
+        return 1
+    finally:
+        conn.close()
+
+    for table, problems in report.items():
+        for kind, rows in problems.items():
+            for row in rows:
+                print(f"{table} {kind}: {row}")
+    if not is_consistent(report):
+        print("Timetables are out of date; run with --rebuild")
+        return 1
+    print("Timetables match exam_schedule")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,9 +1,16 @@
 import streamlit as st
 import sqlite3
 import pandas as pd
+import json
 from datetime import datetime, timedelta
 from database.init_db import create_connection, initialize_db
-from csp.scheduler import ExamScheduler
+from database.data_version import bump_data_version, get_data_version
+from database.bulk_import import import_csv
+from database.timetables import check_timetables, is_consistent
+from csp.jobs import ACTIVE_STATUSES, FINAL_STATUSES, cancel_job, ensure_worker, get_job, list_jobs, submit_job
+from csp.repair import remove_invigilator, retire_room
+from csp.export import schedule_csv_bytes, schedule_parquet_bytes, schedule_xlsx_bytes
+from interfaces.cache import load_departments, load_invigilators, load_schedule_page
 import os 
 
 
@@ -46,11 +53,48 @@ def debug_auth(db_file):
                     exact_match = cur.fetchone()
                     st.write("Exact credential match:", exact_match)
                     
+                    # Portal timetables against exam_schedule
+                    report = check_timetables(conn)
+                    st.write("Portal timetables consistent:", is_consistent(report))
+                    for table, problems in report.items():
+                        for kind, rows in problems.items():
+                            if rows:
+                                st.write(f"{table} {kind} rows:", rows)
+                    
                 finally:
                     conn.close()
+                    
+        show_request_profile()
     except Exception as e:
         st.error(f"Debug error: {str(e)}")
 
+def show_request_profile():
+    """Show where the last scheduling request in this session spent its time"""
+    st.write("### Last Scheduling Request")
+    profile = st.session_state.get('last_schedule_profile')
+    if not profile:
+        st.info("No scheduling request recorded in this session yet")
+        return
+        
+    st.write(f"Total {profile['seconds'] * 1000:.1f} ms; "
+             f"{profile['query_count']} queries took {profile['query_seconds'] * 1000:.1f} ms")
+    st.dataframe(pd.DataFrame(
+        [(name, timing['calls'], round(timing['seconds'] * 1000, 3)) for name, timing in profile['phases'].items()],
+        columns=["Phase", "Calls", "Total ms"]
+    ))
+    st.dataframe(pd.DataFrame(
+        [(query['sql'], query['calls'], round(query['seconds'] * 1000, 3)) for query in profile['queries']],
+        columns=["Query", "Calls", "Total ms"]
+    ))
+    if profile['profile']:
+        st.text(profile['profile'])
+    st.download_button(
+        label="Download as JSON",
+        data=json.dumps(profile, indent=2),
+        file_name="schedule_profile.json",
+        mime="application/json"
+    )
+
 def authenticate_admin(admin_id, passcode, db_file):
     """Enhanced authentication with debugging"""
     conn = create_connection(db_file)
@@ -103,6 +147,7 @@ def manage_departments(db_file):
                         cur = conn.cursor()
                         cur.execute("INSERT INTO departments VALUES (?, ?)", 
                                   (dept_code, dept_name))
+                        bump_data_version(conn)
                         conn.commit()
                         st.success("Department added successfully!")
                     except sqlite3.IntegrityError:
@@ -111,15 +156,9 @@ def manage_departments(db_file):
                         conn.close()
     
     st.subheader("Current Departments")
-    conn = create_connection(db_file)
-    departments = conn.execute("SELECT code, name FROM departments").fetchall()
-    conn.close()
+    df = load_departments(db_file, get_data_version(db_file))
     
-    if departments:
-        df = pd.DataFrame(
-            [(i+1, dept[0], dept[1]) for i, dept in enumerate(departments)],
-            columns=["SNO", "Dept Code", "Dept Name"]
-        )
+    if not df.empty:
         st.table(df)
     else:
         st.info("No departments found")
@@ -143,6 +182,7 @@ def manage_invigilators(db_file):
                         cur = conn.cursor()
                         cur.execute("INSERT INTO users VALUES (?, ?, ?, ?)", 
                                   (inv_code, inv_name, passcode, "invigilator"))
+                        bump_data_version(conn)
                         conn.commit()
                         st.success("Invigilator added successfully!")
                     except sqlite3.IntegrityError:
@@ -151,35 +191,60 @@ def manage_invigilators(db_file):
                         conn.close()
     
     st.subheader("Current Invigilators")
-    conn = create_connection(db_file)
-    invigilators = conn.execute("SELECT id, name FROM users WHERE role='invigilator'").fetchall()
-    conn.close()
+    df = load_invigilators(db_file, get_data_version(db_file))
     
-    if invigilators:
-        df = pd.DataFrame(
-            [(i+1, inv[0], inv[1]) for i, inv in enumerate(invigilators)],
-            columns=["SNO", "Invigilator Code", "Invigilator Name"]
-        )
+    if not df.empty:
         st.table(df)
     else:
         st.info("No invigilators found")
 
+def manage_resource_changes(db_file):
+    st.subheader("Remove Invigilator or Room")
+    st.write("Only exams using the resource are rescheduled; every other assignment stays as published.")
+    
+    version = get_data_version(db_file)
+    invigilators = load_invigilators(db_file, version)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        invigilator = st.selectbox("Invigilator", options=invigilators["Invigilator Code"].tolist(),
+                                   key="remove_invigilator")
+        if st.button("Remove Invigilator") and invigilator:
+            show_repair_report(remove_invigilator(db_file, invigilator))
+    with col2:
+        room = st.text_input("Room Code", key="retire_room")
+        if st.button("Take Room Out of Service") and room:
+            show_repair_report(retire_room(db_file, room.strip()))
+
+def show_repair_report(report):
+    if not report['ok']:
+        st.error(f"Nothing was changed: {report['error']}")
+        return
+    st.success(f"Repaired {len(report['reassigned'])} assignments and moved {len(report['moved'])} exams "
+               f"in {report['seconds'] * 1000:.0f} ms")
+    if report['reassigned']:
+        st.dataframe(pd.DataFrame(report['reassigned']).rename(columns={
+            'subject_code': "Subject", 'date': "Date", 'session': "Session", 'old': "Was", 'new': "Now"
+        }))
+    if report['moved']:
+        st.dataframe(pd.DataFrame(
+            [(move['subject_code'], " ".join(move['from']), " ".join(move['to'])) for move in report['moved']],
+            columns=["Subject", "From", "To"]
+        ))
+
 def schedule_exams(db_file):
     st.subheader("Schedule New Exam")
     
-    conn = create_connection(db_file)
+    version = get_data_version(db_file)
     
     # Get all departments
-    departments = conn.execute("SELECT code, name FROM departments").fetchall()
+    departments = list(load_departments(db_file, version)[["Dept Code", "Dept Name"]].itertuples(index=False, name=None))
     
     # Check if invigilators exist
-    invigilators = conn.execute("SELECT id FROM users WHERE role='invigilator'").fetchall()
-    if not invigilators:
+    if load_invigilators(db_file, version).empty:
         st.error("No invigilators found. Please add invigilators first.")
         return
     
-    conn.close()
-    
     with st.form("exam_scheduling_form"):
         st.write("### Exam Details")
         
@@ -216,90 +281,302 @@ def schedule_exams(db_file):
             elif start_date >= end_date:
                 st.error("End date must be after start date")
             else:
-                scheduler = ExamScheduler(db_file)
-                schedule = scheduler.schedule_exam(
-                    subject_code=subject_code,
-                    subject_title=subject_title,
-                    semester=semester,
-                    department=department,
-                    num_students=num_students,
-                    start_date=str(start_date),
-                    end_date=str(end_date)
-                )
-                
-                if schedule:
-                    if scheduler.save_schedule(schedule):
-                        st.success("Exam scheduled successfully!")
-                        
-                        st.write("### Scheduled Exam Details")
-                        
-                        # Create a list of dictionaries for the table
-                        exam_data = []
-                        for idx, exam in enumerate(schedule):
-                            exam_data.append({
-                                "S.No": idx + 1,
-                                "Date": exam['date'],
-                                "Session": exam['session'],
-                                "Subject": f"{exam['subject_code']} - {exam['subject_title']}",
-                                "Department": department,
-                                "Semester": semester,
-                                "Invigilator": exam['invigilator_code'],
-                                "Room": exam['room_code'],
-                                "Students": exam['student_count']
-                            })
-                        
-                        # Display as table
-                        st.table(exam_data)
-                    else:
-                        st.error("Failed to save schedule to database")
+                # Runs on the background worker; progress shows under "Scheduling Jobs"
+                job_id = submit_job(db_file, "exam", {
+                    'subject_code': subject_code,
+                    'subject_title': subject_title,
+                    'semester': semester,
+                    'department': department,
+                    'num_students': int(num_students),
+                    'start_date': str(start_date),
+                    'end_date': str(end_date),
+                    'profile': st.session_state.get('profile_scheduling', False),
+                }, submitted_by=st.session_state.get('admin_id'))
+                if job_id:
+                    st.success(f"Exam queued as job #{job_id}")
                 else:
-                    st.error("Could not schedule exam with current constraints. Try adjusting dates or adding more invigilators.")
+                    st.error("Failed to queue the scheduling job")
+                    
+def schedule_term_exams(db_file):
+    st.subheader("Schedule Whole Term")
+    
+    with st.expander("Upload Subject List"):
+        st.write("CSV columns: code, title, semester, department, num_students")
+        uploaded = st.file_uploader("Subject list", type=["csv"], key="term_subjects")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            start_date = st.date_input("Earliest Exam Date", datetime(2025, 5, 1), key="term_start")
+        with col2:
+            end_date = st.date_input("Latest Exam Date", datetime(2025, 5, 31), key="term_end")
+        
+        use_portfolio = st.checkbox("Try several strategies in parallel", key="term_portfolio")
+        time_budget = st.number_input("Time budget (seconds)", min_value=1, max_value=120, value=10,
+                                      key="term_time_budget", disabled=not use_portfolio)
+        
+        if st.button("Schedule Term") and uploaded is not None:
+            if start_date >= end_date:
+                st.error("End date must be after start date")
+                return
+                
+            df = pd.read_csv(uploaded)
+            required = {'code', 'title', 'semester', 'department', 'num_students'}
+            if not required.issubset(df.columns):
+                st.error(f"Missing columns: {', '.join(sorted(required - set(df.columns)))}")
+                return
+                
+            subjects = [
+                {
+                    'code': str(row['code']),
+                    'title': str(row['title']),
+                    'semester': int(row['semester']),
+                    'department': str(row['department']),
+                    'num_students': int(row['num_students'])
+                }
+                for _, row in df.iterrows()
+            ]
+            
+            job_id = submit_job(db_file, "term", {
+                'subjects': subjects,
+                'start_date': str(start_date),
+                'end_date': str(end_date),
+                'portfolio': use_portfolio,
+                'time_budget': float(time_budget),
+                'profile': st.session_state.get('profile_scheduling', False),
+            }, submitted_by=st.session_state.get('admin_id'))
+            if job_id:
+                st.success(f"{len(subjects)} subjects queued as job #{job_id}; "
+                           "you can leave this page while it runs")
+            else:
+                st.error("Failed to queue the scheduling job")
+
+def show_job_result(job):
+    result = job['result'] or {}
+    if result.get('unscheduled'):
+        st.warning("Could not schedule: " + ", ".join(result['unscheduled']))
+    if result.get('strategy'):
+        st.info(f"Best strategy: {result['strategy']}")
+    if result.get('conflicts'):
+        st.error("; ".join(result['conflicts']))
+    if result.get('schedule'):
+        st.dataframe(pd.DataFrame([{
+            "Date": exam['date'],
+            "Session": exam['session'],
+            "Subject": f"{exam['subject_code']} - {exam['subject_title']}",
+            "Department": exam['department'],
+            "Semester": exam['semester'],
+            "Invigilator": exam['invigilator_code'],
+            "Room": exam['room_code'],
+            "Students": exam['student_count'],
+        } for exam in result['schedule']]), hide_index=True)
+    if result.get('profile'):
+        if st.button("Show timings in Debug Database", key=f"job_profile_{job['id']}"):
+            st.session_state['last_schedule_profile'] = result['profile']
+
+def show_jobs(db_file):
+    st.subheader("Scheduling Jobs")
+    show_job_list(db_file)
+    
+    # Only the chosen result is loaded, once per full rerun rather than on
+    # every refresh of the list
+    job_id = st.session_state.get('selected_job')
+    job = get_job(db_file, job_id) if job_id else None
+    if job and job['status'] in FINAL_STATUSES:
+        col1, col2 = st.columns([7, 1])
+        with col1:
+            st.markdown(f"**Result of job #{job_id}**")
+        with col2:
+            if st.button("Hide", key="hide_job_result"):
+                st.session_state['selected_job'] = None
+                st.rerun()
+        show_job_result(job)
+
+@st.fragment(run_every=2)
+def show_job_list(db_file):
+    jobs = list_jobs(db_file)
+    if not jobs:
+        st.info("No scheduling jobs yet")
+        return
+        
+    for job in jobs:
+        params = job['params']
+        if job['kind'] == "exam":
+            label = f"#{job['id']} Exam {params.get('subject_code', '')}"
+        else:
+            label = f"#{job['id']} Term ({len(params.get('subjects', []))} subjects)"
+        
+        col1, col2, col3 = st.columns([3, 4, 1])
+        with col1:
+            st.write(f"**{label}** - {job['status']}")
+            st.caption(f"Submitted {job['created_at']} by {job['submitted_by'] or 'unknown'}")
+        with col2:
+            st.progress(min(max(job['progress'], 0.0), 1.0), text=job['message'] or "")
+        with col3:
+            if job['status'] in ACTIVE_STATUSES and not job['cancel_requested']:
+                if st.button("Cancel", key=f"cancel_job_{job['id']}"):
+                    if not cancel_job(db_file, job['id']):
+                        st.error("Job already finished")
+            elif job['status'] in FINAL_STATUSES:
+                if st.button("Result", key=f"show_job_{job['id']}"):
+                    st.session_state['selected_job'] = job['id']
+                    # The result is shown outside this fragment
+                    st.rerun()
                     
 def view_schedule(db_file):
     st.subheader("Current Exam Schedule")
     
-    conn = create_connection(db_file)
+    version = get_data_version(db_file)
+    departments = load_departments(db_file, version)
+    invigilators = load_invigilators(db_file, version)
     
-    schedule = conn.execute("""
-        SELECT es.date, es.session, s.code, s.title, d.name as department, 
-               s.semester, u.name as invigilator, es.room_code
-        FROM exam_schedule es
-        JOIN subjects s ON es.subject_code = s.code
-        JOIN departments d ON s.department_code = d.code
-        JOIN users u ON es.invigilator_id = u.id
-        ORDER BY es.date, es.session, es.room_code
-    """).fetchall()
-    
-    conn.close()
-    
-    if schedule:
-        df = pd.DataFrame(
-            [(i+1, exam[0], exam[1], f"{exam[2]} - {exam[3]}", exam[4], exam[5], exam[6], exam[7]) 
-             for i, exam in enumerate(schedule)],
-            columns=["SNO", "Date", "Session", "Subject", "Department", "Semester", "Invigilator", "Room"]
-        )
+    # Filters are applied in SQL, so only the visible page is fetched
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        department = st.selectbox("Department", options=[""] + list(departments["Dept Code"]),
+                                  format_func=lambda x: x or "All", key="schedule_department")
+        semester = st.selectbox("Semester", options=[0] + list(range(1, 9)),
+                                format_func=lambda x: str(x) if x else "All", key="schedule_semester")
+    with col2:
+        invigilator = st.selectbox("Invigilator", options=[""] + list(invigilators["Invigilator Code"]),
+                                   format_func=lambda x: x or "All", key="schedule_invigilator")
+        page_size = st.selectbox("Rows per page", options=[25, 50, 100, 200], index=1, key="schedule_page_size")
+    with col3:
+        use_dates = st.checkbox("Filter by date range", key="schedule_use_dates")
+        date_from = st.date_input("From", datetime(2025, 5, 1), key="schedule_from", disabled=not use_dates)
+        date_to = st.date_input("To", datetime(2025, 5, 31), key="schedule_to", disabled=not use_dates)
+    
+    filters = {
+        'department': department,
+        'semester': semester,
+        'invigilator': invigilator,
+        'date_from': str(date_from) if use_dates else None,
+        'date_to': str(date_to) if use_dates else None,
+    }
+    
+    # Cursor stack: one keyset cursor per page visited, reset when filters change
+    state_key = (tuple(sorted(filters.items())), page_size)
+    if st.session_state.get('schedule_filter_key') != state_key:
+        st.session_state['schedule_filter_key'] = state_key
+        st.session_state['schedule_cursors'] = [None]
+    cursors = st.session_state['schedule_cursors']
+    
+    df, next_cursor = load_schedule_page(db_file, version, filters, cursors[-1], page_size)
+    
+    if not df.empty:
+        offset = (len(cursors) - 1) * page_size
+        df.insert(0, "SNO", range(offset + 1, offset + len(df) + 1))
         st.table(df)
+        
+        col1, col2, col3 = st.columns([1, 1, 4])
+        with col1:
+            if st.button("Previous", disabled=len(cursors) == 1, key="schedule_prev"):
+                cursors.pop()
+                st.rerun()
+        with col2:
+            if st.button("Next", disabled=next_cursor is None, key="schedule_next"):
+                cursors.append(next_cursor)
+                st.rerun()
+        with col3:
+            st.write(f"Page {len(cursors)}")
+        
+    elif any(filters.values()):
+        st.info("No exams match these filters")
     else:
         st.info("No exams scheduled yet")
+    
+    # Export options (whole schedule, streamed from the database)
+    st.subheader("Export Schedule")
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        if st.button("Download as CSV"):
+            csv_data = schedule_csv_bytes(db_file)
+            if csv_data:
+                st.download_button(
+                    label="Click to download",
+                    data=csv_data,
+                    file_name="exam_schedule.csv",
+                    mime="text/csv"
+                )
+    
+    with col2:
+        if st.button("Download as Excel"):
+            excel = schedule_xlsx_bytes(db_file)
+            if excel:
+                st.download_button(
+                    label="Click to download",
+                    data=excel,
+                    file_name="exam_schedule.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+            else:
+                st.error("Excel export is unavailable (is openpyxl installed?)")
+    
+    with col3:
+        if st.button("Download as Parquet"):
+            parquet = schedule_parquet_bytes(db_file)
+            if parquet:
+                st.download_button(
+                    label="Click to download",
+                    data=parquet,
+                    file_name="exam_schedule.parquet",
+                    mime="application/vnd.apache.parquet"
+                )
+            else:
+                st.error("Parquet export is unavailable (is pyarrow installed?)")
+
+def bulk_import_data(db_file):
+    st.subheader("Bulk Import")
+    
+    kind = st.selectbox("Data type", options=["departments", "invigilators", "subjects", "rooms",
+                                              "students", "enrollments"])
+    st.write({
+        "departments": "CSV columns: code, name",
+        "invigilators": "CSV columns: id, name, passcode",
+        "subjects": "CSV columns: code, title, semester, department_code, num_students (optional)",
+        "rooms": "CSV columns: code, floor, capacity",
+        "students": "CSV columns: ra_number, name, department_code, semester",
+        "enrollments": "CSV columns: ra_number, subject_code (import students and subjects first)",
+    }[kind])
+    uploaded = st.file_uploader("CSV file", type=["csv"], key="bulk_import_file")
+    
+    if st.button("Import") and uploaded is not None:
+        with st.spinner("Importing..."):
+            report = import_csv(db_file, kind, uploaded)
+        
+        st.success(f"Read {report['rows_read']} rows: {report['inserted']} inserted, {report['failed']} failed")
+        if report['errors']:
+            st.dataframe(pd.DataFrame(report['errors'], columns=["Line", "Error"]))
+            if report['errors_truncated']:
+                st.warning("Only the first errors are shown")
 
 def show_admin_dashboard(db_file):
     st.header(f"Admin Dashboard - Welcome {st.session_state['admin_id']}")
     
-    tab1, tab2, tab3, tab4 = st.tabs([
+    # Jobs keep running on this server thread after the page is closed
+    ensure_worker(db_file)
+    
+    tab1, tab2, tab3, tab4, tab5 = st.tabs([
         "Manage Departments",
         "Manage Invigilators",
         "Schedule Exams",
-        "View Schedule"
+        "View Schedule",
+        "Bulk Import"
     ])
     
     with tab1:
         manage_departments(db_file)
     with tab2:
         manage_invigilators(db_file)
+        manage_resource_changes(db_file)
     with tab3:
         schedule_exams(db_file)
+        schedule_term_exams(db_file)
+        show_jobs(db_file)
     with tab4:
         view_schedule(db_file)
+    with tab5:
+        bulk_import_data(db_file)
     
     # Logout button
     if st.sidebar.button("Logout"):
@@ -312,6 +589,7 @@ def admin_interface(db_file):
     # Debug button
     if st.sidebar.button("Debug Database"):
         debug_auth(db_file)
+    st.sidebar.checkbox("Profile scheduling (cProfile)", key="profile_scheduling")
     
     # Login section
     if not st.session_state.get('admin_logged_in', False):
@@ -335,11 +613,15 @@ def admin_interface(db_file):
 def show_admin_dashboard(db_file):
     st.header("Admin Dashboard")
     
-    tab1, tab2, tab3, tab4 = st.tabs([
+    # Jobs keep running on this server thread after the page is closed
+    ensure_worker(db_file)
+    
+    tab1, tab2, tab3, tab4, tab5 = st.tabs([
         "Manage Departments",
         "Manage Invigilators", 
         "Schedule Exams",
-        "View Schedule"
+        "View Schedule",
+        "Bulk Import"
     ])
     
     with tab1:
@@ -347,9 +629,14 @@ def show_admin_dashboard(db_file):
     
     with tab2:
         manage_invigilators(db_file)
+        manage_resource_changes(db_file)
     
     with tab3:
         schedule_exams(db_file)
+        schedule_term_exams(db_file)
+        show_jobs(db_file)
     
     with tab4:
         view_schedule(db_file)
+    with tab5:
+        bulk_import_data(db_file)
@@ -0,0 +1,136 @@
+import streamlit as st
+import pandas as pd
+from database.init_db import create_connection
+from database.queries import fetch_schedule_page
+from database.timetables import fetch_cohort_timetable, fetch_invigilator_timetable
+
+# Every loader takes the data version as an argument, so a write that bumps
+# the version makes Streamlit miss the cache and reload; until then the same
+# DataFrame is served to every session without touching SQLite.
+#
+# The cached functions raise DatabaseUnavailable when no connection can be
+# opened, because st.cache_data does not cache exceptions. The public
+# wrappers turn that into an empty result, and the next rerun tries again.
+
+DEPARTMENT_COLUMNS = ["SNO", "Dept Code", "Dept Name"]
+INVIGILATOR_COLUMNS = ["SNO", "Invigilator Code", "Invigilator Name"]
+SCHEDULE_PAGE_COLUMNS = ["Date", "Session", "Subject", "Department", "Semester", "Invigilator", "Room"]
+STUDENT_SCHEDULE_COLUMNS = ['S.No', 'Date', 'Session', 'Department', 'Subject Code',
+                            'Subject Title', 'Semester', 'Room No.']
+ASSIGNMENT_COLUMNS = ["Date", "Session", "Subject Code", "Subject Title", "Room"]
+
+
+class DatabaseUnavailable(Exception):
+    """create_connection() returned None"""
+
+
+def _connect(db_file):
+    conn = create_connection(db_file)
+    if not conn:
+        raise DatabaseUnavailable(db_file)
+    return conn
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _load_departments(db_file, version):
+    conn = _connect(db_file)
+    try:
+        departments = conn.execute("SELECT code, name FROM departments").fetchall()
+    finally:
+        conn.close()
+    return pd.DataFrame(
+        [(i+1, dept[0], dept[1]) for i, dept in enumerate(departments)],
+        columns=DEPARTMENT_COLUMNS
+    )
+
+
+def load_departments(db_file, version):
+    """Departments as displayed in the admin portal"""
+    try:
+        return _load_departments(db_file, version)
+    except DatabaseUnavailable:
+        return pd.DataFrame(columns=DEPARTMENT_COLUMNS)
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _load_invigilators(db_file, version):
+    conn = _connect(db_file)
+    try:
+        invigilators = conn.execute("SELECT id, name FROM users WHERE role='invigilator'").fetchall()
+    finally:
+        conn.close()
+    return pd.DataFrame(
+        [(i+1, inv[0], inv[1]) for i, inv in enumerate(invigilators)],
+        columns=INVIGILATOR_COLUMNS
+    )
+
+
+def load_invigilators(db_file, version):
+    """Invigilators as displayed in the admin portal"""
+    try:
+        return _load_invigilators(db_file, version)
+    except DatabaseUnavailable:
+        return pd.DataFrame(columns=INVIGILATOR_COLUMNS)
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def _load_schedule_page(db_file, version, filters, after, page_size):
+    conn = _connect(db_file)
+    try:
+        rows, next_cursor = fetch_schedule_page(conn, filters, after, page_size)
+    finally:
+        conn.close()
+    df = pd.DataFrame(
+        [(exam['date'], exam['session'], f"{exam['subject_code']} - {exam['subject_title']}",
+          exam['department'], exam['semester'], exam['invigilator_name'], exam['room_code'])
+         for exam in rows],
+        columns=SCHEDULE_PAGE_COLUMNS
+    )
+    return df, next_cursor
+
+
+def load_schedule_page(db_file, version, filters, after, page_size):
+    """One page of the exam schedule; returns (rows DataFrame, next cursor)"""
+    try:
+        return _load_schedule_page(db_file, version, filters, after, page_size)
+    except DatabaseUnavailable:
+        return pd.DataFrame(columns=SCHEDULE_PAGE_COLUMNS), None
+
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def _load_student_schedule(db_file, version, dept_code, semester):
+    conn = _connect(db_file)
+    try:
+        exams = fetch_cohort_timetable(conn, dept_code, semester)
+    finally:
+        conn.close()
+    return pd.DataFrame(
+        [(idx + 1, *exam) for idx, exam in enumerate(exams)],
+        columns=STUDENT_SCHEDULE_COLUMNS
+    )
+
+
+def load_student_schedule(db_file, version, dept_code, semester):
+    """Exam schedule for one department and semester"""
+    try:
+        return _load_student_schedule(db_file, version, dept_code, semester)
+    except DatabaseUnavailable:
+        return pd.DataFrame(columns=STUDENT_SCHEDULE_COLUMNS)
+
+
+@st.cache_data(max_entries=1024, show_spinner=False)
+def _load_invigilator_assignments(db_file, version, invigilator_id):
+    conn = _connect(db_file)
+    try:
+        assignments = fetch_invigilator_timetable(conn, invigilator_id)
+    finally:
+        conn.close()
+    return pd.DataFrame(assignments, columns=ASSIGNMENT_COLUMNS)
+
+
+def load_invigilator_assignments(db_file, version, invigilator_id):
+    """Exam assignments for one invigilator"""
+    try:
+        return _load_invigilator_assignments(db_file, version, invigilator_id)
+    except DatabaseUnavailable:
+        return pd.DataFrame(columns=ASSIGNMENT_COLUMNS)
@@ -1,6 +1,8 @@
 import streamlit as st
 import sqlite3
 from database.init_db import create_connection
+from database.data_version import get_data_version
+from interfaces.cache import load_invigilator_assignments
 
 def invigilator_interface(db_file):
     st.title("Invigilator Portal - Exam Scheduling System")
@@ -40,17 +42,9 @@ def show_invigilator_dashboard(db_file):
     # View assigned exams
     st.subheader("Your Exam Assignments")
     
-    conn = create_connection(db_file)
-    assignments = conn.execute("""
-        SELECT es.date, es.session, s.code, s.title, es.room_code
-        FROM exam_schedule es
-        JOIN subjects s ON es.subject_code = s.code
-        WHERE es.invigilator_id = ?
-        ORDER BY es.date, es.session
-    """, (invigilator_id,)).fetchall()
-    conn.close()
+    assignments = load_invigilator_assignments(db_file, get_data_version(db_file), invigilator_id)
     
-    if assignments:
+    if not assignments.empty:
         st.table(assignments)
     else:
         st.info("No exam assignments found")
\ No newline at end of file
@@ -2,6 +2,8 @@
 import streamlit as st
 import sqlite3
 from database.init_db import create_connection
+from database.data_version import get_data_version
+from interfaces.cache import load_student_schedule
 
 def student_interface(db_file):
     st.title("Student Portal - Exam Scheduling System")
@@ -79,49 +81,18 @@ def show_student_dashboard(db_file):
 
 def view_exam_schedule(db_file):
     """Display filtered exam schedule for the student's department and semester"""
-    conn = create_connection(db_file)
-    if conn:
-        try:
-            query = """
-                SELECT 
-                    es.date, 
-                    es.session,
-                    d.name as department,
-                    s.code as subject_code,
-                    s.title as subject_title,
-                    s.semester,
-                    es.room_code
-                FROM exam_schedule es
-                JOIN subjects s ON es.subject_code = s.code
-                JOIN departments d ON s.department_code = d.code
-                WHERE d.code = ? AND s.semester = ?
-                ORDER BY es.date, es.session
-            """
-            params = (st.session_state['dept_code'], st.session_state['semester'])
-            exams = conn.execute(query, params).fetchall()
+    try:
+        exams = load_student_schedule(
+            db_file, get_data_version(db_file),
+            st.session_state['dept_code'], st.session_state['semester']
+        )
+        
+        if not exams.empty:
+            st.subheader(f"Exam Schedule - Semester {st.session_state['semester']}")
             
-            if exams:
-                st.subheader(f"Exam Schedule - Semester {st.session_state['semester']}")
-                
-                # Create a list of dictionaries for the table
-                exam_data = []
-                for idx, exam in enumerate(exams):
-                    exam_data.append({
-                        'S.No': idx + 1,
-                        'Date': exam[0],
-                        'Session': exam[1],
-                        'Department': exam[2],
-                        'Subject Code': exam[3],
-                        'Subject Title': exam[4],
-                        'Semester': exam[5],
-                        'Room No.': exam[6]
-                    })
-                
-                # Display as table only
-                st.table(exam_data)
-            else:
-                st.info("No exams scheduled for your department and semester")
-        except sqlite3.Error as e:
-            st.error(f"Database error: {e}")
-        finally:
-            conn.close()
\ No newline at end of file
+            # Display as table only
+            st.table(exams)
+        else:
+            st.info("No exams scheduled for your department and semester")
+    except sqlite3.Error as e:
+        st.error(f"Database error: {e}")
\ No newline at end of file
@@ -4,6 +4,7 @@ from interfaces.invigilator import invigilator_interface
 from interfaces.student import student_interface
 import os
 from database.init_db import create_connection, initialize_db
+from database.migrations import LATEST_VERSION, MigrationError, get_schema_version
 def ensure_admin_user(db_file):
     """Ensure admin user exists in database"""
     conn = create_connection(db_file)
@@ -20,18 +21,37 @@ def ensure_admin_user(db_file):
         finally:
             conn.close()
 
+def needs_initialization(db_file):
+    """True unless the database exists and is at the latest schema version"""
+    if not os.path.exists(db_file):
+        return True
+    conn = create_connection(db_file)
+    if conn is None:
+        return True
+    try:
+        return get_schema_version(conn) < LATEST_VERSION
+    finally:
+        conn.close()
+
+@st.cache_resource(show_spinner=False)
+def bootstrap(db_file):
+    """One-time setup per server process; reruns reuse the cached result"""
+    os.makedirs(os.path.dirname(db_file), exist_ok=True)
+    if needs_initialization(db_file):
+        initialize_db(db_file)
+    ensure_admin_user(db_file)
+    return db_file
+
 def main():
     st.set_page_config(page_title="Exam Scheduling System", layout="wide")
     
-    # Database setup
-    db_dir = os.path.join(os.path.dirname(__file__), 'database')
-    os.makedirs(db_dir, exist_ok=True)
-    db_file = os.path.join(db_dir, 'exam_scheduler.db')
-    
-    # Initialize database (force recreation if doesn't exist)
-    initialize_db(db_file)
-    ensure_admin_user(db_file)
-    
+    # Database setup (runs once per process, not on every rerun)
+    try:
+        db_file = bootstrap(os.path.join(os.path.dirname(__file__), 'database', 'exam_scheduler.db'))
+    except MigrationError as e:
+        # Not cached, so the next rerun tries the upgrade again
+        st.error(f"Database upgrade failed: {e}")
+        st.stop()
 
     # Initialize session state variables
     if 'admin_logged_in' not in st.session_state:
@@ -41,15 +61,6 @@ def main():
     if 'student_logged_in' not in st.session_state:
         st.session_state['student_logged_in'] = False
 
-    # Get absolute path to database
-    db_dir = os.path.join(os.path.dirname(__file__), 'database')
-    os.makedirs(db_dir, exist_ok=True)
-    db_file = os.path.join(db_dir, 'exam_scheduler.db')
-
-    # Initialize database if not exists
-    if not os.path.exists(db_file):
-        initialize_db(db_file)
-
     # Role selection
     st.sidebar.title("Exam Scheduling System")
     role = st.sidebar.radio("Select Role", ["Student", "Invigilator", "Admin"])